@@ -1,14 +1,136 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import importlib
 import json
-import boto3
-from typing import Dict, Any
-from datetime import datetime, timedelta
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Tuple, Iterator, Callable, Optional
+from datetime import datetime
+from types import ModuleType
+from http_api import (Router, build_pipeline, respond, error_response, event_stream, parse_body, request_header,
+                      streams_responses)
+from tracing import count, propagate, span
+from artifacts import ARTIFACT_TYPES, build_artifact_store
+from bedrock_client import BedrockUnavailable, ResilientBedrockClient, build_bedrock_client
+from competitor_store import CompetitorCache, build_competitor_cache, complete_competitors, market_key, parse_competitor_text
+from comparisons import (GROUP_SIZE, JSON_INSTRUCTION, MAX_BATCH_COMPETITORS, build_comparison_store, comparison_id,
+                         default_comparison, format_competitors, parse_comparisons, stub_comparison_response)
+from chat_memory import ChatMemory, DEFAULT_TOKEN_BUDGET, build_chat_memory, estimate_tokens, normalize_history
+from generation_profiles import default_generation, generation_params, model_for_tier, render_prompt
+from idempotency import Idempotency, build_idempotency
+from jobs import JobService, build_job_service, job_request, wants_async
+from idea_parser import JSON_MODE_INSTRUCTION, iter_ideas, parse_idea_text
+from response_cache import ResponseCache, build_response_cache, make_cache_key
+from similar_cache import SimilarPromptCache, build_similar_cache
+from write_behind import DEFAULT_FLUSH_MS, WriteBehindWriter, build_post_invoke_flush, build_write_behind
+
+# Cold-start instrumentation: per-component init times, reported once per container
+COLD_START_PROFILE = os.environ.get('COLD_START_PROFILE', '').lower() in ('1', 'true', 'yes')
+cold_start_timings: Dict[str, float] = {}
+_first_request = True
+
+# Clients are created on first use and memoized per container
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.RLock()
+
+def get_client(name: str, factory: Callable[[], Any]) -> Any:
+    """Return the memoized client for `name`, creating it with `factory` on first use"""
+    if name not in _clients:
+        with _clients_lock:
+            if name not in _clients:
+                started = time.perf_counter()
+                client = factory()
+                if COLD_START_PROFILE:
+                    cold_start_timings[name] = round((time.perf_counter() - started) * 1000, 2)
+                _clients[name] = client
+    return _clients[name]
+
+def get_bedrock() -> Optional[ResilientBedrockClient]:
+    """Rate-limited, circuit-broken Bedrock runtime client, or None when it cannot be created"""
+    return get_client('bedrock', lambda: build_bedrock_client(BEDROCK_REGION, fake_responder=fake_bedrock_reply))
+
+def model_client() -> ResilientBedrockClient:
+    """The model client for a call; raises BedrockUnavailable when there is none, or when the
+    configured backend only serves stub text (so that text is reported as a fallback, never cached)"""
+    bedrock = get_bedrock()
+    if bedrock is None:
+        raise BedrockUnavailable('unavailable', 'Bedrock client could not be created')
+    if bedrock.canned:
+        raise BedrockUnavailable('stub', 'MODEL_BACKEND serves stub responses')
+    return bedrock
+
+def get_chat_memory() -> Optional[ChatMemory]:
+    """Session chat memory backed by the ChatSessions/ChatMessages tables, if configured"""
+    return get_client('chatMemory', build_chat_memory)
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Response cache; memoized so the in-memory tier survives warm invocations"""
+    return get_client('responseCache', build_response_cache)
+
+def get_similar_cache() -> Optional[SimilarPromptCache]:
+    """Near-duplicate completion cache over the profiled prompt templates; in-process only"""
+    return get_client('similarCache', lambda: build_similar_cache(PROMPTS))
+
+def get_competitor_cache() -> Optional[CompetitorCache]:
+    """Per-market competitor sets with stale-while-revalidate refresh, if configured"""
+    return get_client('competitorCache', build_competitor_cache)
+
+def get_write_behind() -> Optional[WriteBehindWriter]:
+    """Background batch writer shared by the stores that persist generated output"""
+    return get_client('writeBehind', build_write_behind)
+
+def get_comparison_store() -> Optional[Any]:
+    """Comparison results in the core stack's ComparisonsTable, if configured"""
+    return get_client('comparisonStore', lambda: build_comparison_store(get_write_behind()))
+
+def get_artifact_store() -> Optional[Any]:
+    """Latest generated artifact per campaign in the core stack's ArtifactsTable, if configured"""
+    return get_client('artifactStore', lambda: build_artifact_store(get_write_behind()))
 
-# Initialize Bedrock client
-try:
-    bedrock = boto3.client('bedrock-runtime', region_name='ap-southeast-1')
-    BEDROCK_AVAILABLE = True
-except Exception:
-    BEDROCK_AVAILABLE = False
+def get_idempotency() -> Idempotency:
+    """Idempotency-Key records and per-container single-flight for the generation endpoints"""
+    return get_client('idempotency', build_idempotency)
+
+def get_jobs() -> Optional[JobService]:
+    """Asynchronous job store and queue, if configured"""
+    return get_client('jobs', lambda: build_job_service(run_job_batch))
+
+def get_plan_engine() -> ModuleType:
+    """The NumPy plan optimizer, imported on first use to keep it out of every cold start"""
+    return get_client('planEngine', lambda: importlib.import_module('plan_engine'))
+
+# Default (fast tier) model; generation profiles may route templates to another tier
+MODEL_ID = model_for_tier('fast')
+BEDROCK_REGION = 'ap-southeast-1'
+
+# Bounded pool for independent model calls within one request
+MODEL_CALL_WORKERS = int(os.environ.get('MODEL_CALL_WORKERS', '4'))
+model_executor = ThreadPoolExecutor(max_workers=MODEL_CALL_WORKERS)
+
+# Time kept back from the Lambda deadline to build and return the response
+DEADLINE_SAFETY_MS = 2000
+DEFAULT_DEADLINE_SECONDS = 25.0
+
+# Limits for /ideas/generate:batch
+MAX_BATCH_CAMPAIGNS = 100
+DEFAULT_BATCH_CONCURRENCY = 8
+MAX_BATCH_CONCURRENCY = 16
+MAX_PACK_SIZE = 5
+PACKED_SECTION_MARKER = '### Campaign'
+
+# Limit for /plan/generate:batch; planning is local, so batches can cover a whole portfolio
+MAX_PLAN_BATCH_CAMPAIGNS = 5000
+
+# Worker-only route that regenerates a stale competitor market off the request path
+COMPETITOR_REFRESH_PATH = '/internal/competitors/refresh'
+
+# Longest the post-invoke flush waits for an invocation's queued artifact and comparison writes; 0 leaves
+# them in the background (the self-hosted server, whose process never freezes)
+WRITE_BEHIND_FLUSH_SECONDS = int(os.environ.get('WRITE_BEHIND_FLUSH_MS', DEFAULT_FLUSH_MS)) / 1000
+
+IMPORT_DURATION_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 2)
 
 # Prompt templates
 PROMPTS = {
@@ -46,58 +168,26 @@ Include:
 - Visual cues
 - Call-to-action""",
 
-    'PLAN_PROMPT': """Create a 7-14 day marketing plan for {business_name}:
-Goal: {goal}
-Budget: ${budget}
-Working Hours: {working_hours}
-Target: {target_audience}
-
-Provide:
-1. Budget allocation across platforms (percentages and amounts)
-2. Daily posting schedule aligned with working hours
-3. Content calendar with specific post times""",
-
-    'COMPETITOR_SYNTH_PROMPT': """Generate 4 realistic competitor ads for {industry} businesses in {city}:
-- Business names
-- Ad content
-- Platform (Facebook/Instagram/Google)
-- Estimated budget
-- Unique selling propositions
+    'COMPETITOR_SYNTH_PROMPT': """Generate 4 realistic competitor ads for {industry} businesses in {city}.
+Write one line per competitor in this format:
+Competitor N: Business name - "Ad content" - Platform (Facebook/Instagram/Google Ads/TikTok) - $Estimated monthly budget - Unique selling proposition
 
 Make them diverse and realistic for the local market.""",
 
-    'COMPETITOR_CRITIQUE_PROMPT': """Analyze this competitor ad and compare with our business:
-
-Competitor: {competitor_name}
-Their ad: "{competitor_content}"
-Platform: {platform}
+    'COMPARISON_BATCH_PROMPT': """Compare our campaign with each competitor ad below and plan a counter-ad against each.
 
 Our business: {business_name} ({industry})
-Our advantages: {our_advantages}
-
-Provide scores (1-10) for:
-- Clarity
-- Call-to-action effectiveness
-- Relevance to target audience
-- Design/visual appeal
-- Overall effectiveness
-
-Include detailed critique and improvement suggestions.""",
-
-    'COUNTER_AD_PROMPT': """Generate a counter-ad strategy against this competitor:
-
-Competitor: {competitor_name}
-Their message: "{competitor_content}"
-Their strength: {competitor_strength}
-
-Our business: {business_name}
+Our ad: "{ad_content}"
 Our advantages: {our_advantages}
 Our budget: ${budget}
 
-Create:
-1. Counter-ad caption (highlight our unique value)
-2. Poster concept description
-3. 30-second video script
+Competitors:
+{competitors}
+
+For every competitor:
+1. Score their ad (1-10) for clarity, call-to-action effectiveness (cta), relevance to target audience (relevance), design/visual appeal (design) and overall effectiveness (overall)
+2. Write a detailed critique compared with our business, with improvement suggestions
+3. Create a counter-ad: caption highlighting our unique value, poster concept description and 30-second video script
 
 Focus on authentic differentiation.""",
 
@@ -107,67 +197,302 @@ Be concise, actionable, and specific to their industry and location."""
 }
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Main AI Lambda handler with routing"""
-    
-    headers = {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': '*',
-        'Access-Control-Allow-Methods': '*',
-        'Content-Type': 'application/json'
-    }
-    
+    """Main AI Lambda handler; reports cold-start timings on the first request when profiling"""
+    global _first_request
     try:
-        method = event['requestContext']['http']['method']
-        path = event['requestContext']['http']['path']
-        
-        if method == 'OPTIONS':
-            return {'statusCode': 200, 'headers': headers, 'body': ''}
-        
-        # Route requests
-        if path == '/ideas/generate' and method == 'POST':
-            return handle_generate_ideas(event, headers)
-        elif path == '/creatives/generate' and method == 'POST':
-            return handle_generate_creatives(event, headers)
-        elif path == '/plan/generate' and method == 'POST':
-            return handle_generate_plan(event, headers)
-        elif path == '/competitors/generate' and method == 'GET':
-            return handle_generate_competitors(event, headers)
-        elif path == '/compare' and method == 'POST':
-            return handle_compare_ads(event, headers)
-        elif path == '/chat/complete' and method == 'POST':
-            return handle_chat_complete(event, headers)
-        else:
-            return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'success': False, 'error': 'Endpoint not found'})}
-            
-    except Exception as e:
-        return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        if not (COLD_START_PROFILE and _first_request):
+            return pipeline(event, context)
 
-def call_bedrock(prompt: str) -> str:
-    """Call Bedrock Claude 3 Haiku or return stub response"""
-    if not BEDROCK_AVAILABLE:
-        return generate_stub_response(prompt)
-    
+        _first_request = False
+        started = time.perf_counter()
+        response = pipeline(event, context)
+        report_cold_start(event, round((time.perf_counter() - started) * 1000, 2))
+        return response
+    finally:
+        finish_invocation()
+
+def finish_invocation() -> None:
+    """Hand the invocation's queued writes to the post-invoke extension, which flushes them after the
+    response is sent; without one (registration failed), wait for them here before returning"""
+    if post_invoke_flush is not None:
+        post_invoke_flush.done()
+    else:
+        flush_write_behind(WRITE_BEHIND_FLUSH_SECONDS)
+
+def flush_write_behind(timeout: float) -> None:
+    """Wait up to `timeout` for queued writes. Lambda freezes the container once an invocation ends,
+    which would leave them unwritten and invisible to other containers."""
+    writer = _clients.get('writeBehind')
+    if writer is None or not len(writer) or timeout <= 0:
+        return
+    if not writer.flush(timeout):
+        print(json.dumps({'event': 'write_behind_flush_timeout', 'pending': len(writer)}))
+
+def job_worker_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """SQS-triggered worker: runs a batch of queued jobs and reports the messages to redeliver"""
     try:
-        body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 2000,
-            "messages": [{"role": "user", "content": prompt}]
-        }
-        
+        message_ids = {json.loads(record['body'])['jobId']: record['messageId'] for record in event.get('Records', [])}
+        failed = run_job_batch(list(message_ids), context)
+        # The worker may sit idle (frozen) for a long time, so buffered artifacts are written before returning
+        flush_write_behind(remaining_seconds(context))
+        return {'batchItemFailures': [{'itemIdentifier': message_ids[job_id]} for job_id in failed]}
+    finally:
+        finish_invocation()
+
+def run_job_batch(job_ids: List[str], context: Any) -> List[str]:
+    """Replay queued requests through the pipeline; returns the job ids to retry"""
+    return get_jobs().run_batch(job_ids, execute_job, context)
+
+def execute_job(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Worker-only routes first, then the public route table"""
+    http = event['requestContext']['http']
+    handler, _, _ = worker_router.match(http['method'], http['path'])
+    return (worker_pipeline if handler is not None else pipeline)(event, context)
+
+def report_cold_start(event: Dict[str, Any], first_request_ms: float) -> None:
+    """Log import and first-request init timings as one JSON line"""
+    http = event.get('requestContext', {}).get('http', {})
+    print(json.dumps({
+        'metric': 'cold_start',
+        'handler': 'ai',
+        'route': f"{http.get('method')} {http.get('path')}",
+        'importMs': IMPORT_DURATION_MS,
+        'firstRequestMs': first_request_ms,
+        'components': cold_start_timings
+    }))
+
+def build_request_body(prompt: str, system: Optional[str] = None, history: Optional[List[Dict[str, str]]] = None,
+                       generation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Messages API request body for a prompt, with optional system prompt, prior turns and generation profile"""
+    generation = generation or default_generation()
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": generation['maxTokens'],
+        "messages": (history or []) + [{"role": "user", "content": prompt}]
+    }
+    if generation['stopSequences']:
+        body["stop_sequences"] = generation['stopSequences']
+    if system:
+        body["system"] = system
+    return body
+
+def invoke_bedrock(prompt: str, use_cache: bool = True, system: Optional[str] = None,
+                   history: Optional[List[Dict[str, str]]] = None, generation: Optional[Dict[str, Any]] = None) -> str:
+    """Call the profile's model (Claude 3 Haiku by default); identical and near-duplicate generations are
+    served from cache.
+    Raises BedrockUnavailable"""
+    bedrock = model_client()
+    
+    generation = generation or default_generation()
+    model_id = generation['modelId']
+    body = build_request_body(prompt, system, history, generation)
+    
+    cache_key = None
+    similar_cache = None
+    response_cache = get_response_cache() if use_cache else None
+    if response_cache is not None:
+        params = {k: v for k, v in body.items() if k != 'messages'}
+        if history:
+            params['history'] = history
+        cache_key = make_cache_key(model_id, prompt, params)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            count('ResponseCacheHits', 1)
+            return cached
+        count('ResponseCacheMisses', 1)
+        # Prompts that differ from an earlier one only in the business name or small wording changes
+        similar_cache = get_similar_cache() if not history and not system else None
+        if similar_cache is not None:
+            with span('similar_cache.get', profile=generation['profile']) as lookup:
+                cached = similar_cache.get(model_id, params, prompt)
+                lookup.set(hit=cached is not None)
+            if cached is not None:
+                return cached
+    
+    with span('bedrock.invoke_model', model=model_id, profile=generation['profile']) as call:
         response = bedrock.invoke_model(
-            modelId="anthropic.claude-3-haiku-20240307-v1:0",
+            modelId=model_id,
             body=json.dumps(body)
         )
-        
-        response_body = json.loads(response['body'].read())
-        return response_body['content'][0]['text']
-        
-    except Exception:
-        return generate_stub_response(prompt)
+    
+    with span('parse_response', kind='bedrock'):
+        try:
+            response_body = json.loads(response['body'].read())
+            text = response_body['content'][0]['text']
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise BedrockUnavailable('invalid_response', str(e)) from e
+    record_usage(call, response_body.get('usage') or {}, response_body.get('stop_reason'))
+    
+    if cache_key is not None:
+        response_cache.put(cache_key, text)
+    if similar_cache is not None:
+        similar_cache.put(model_id, params, prompt, text)
+    return text
+
+def call_bedrock(prompt: str, use_cache: bool = True, system: Optional[str] = None,
+                 history: Optional[List[Dict[str, str]]] = None,
+                 generation: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[str]]:
+    """Model text and fallback reason; the stub response (never cached) stands in when Bedrock fails"""
+    try:
+        return invoke_bedrock(prompt, use_cache, system, history, generation), None
+    except BedrockUnavailable as e:
+        log_fallback(e)
+        return generate_stub_response(prompt), e.reason
+
+def record_usage(call: Any, usage: Dict[str, Any], stop_reason: Optional[str] = None) -> None:
+    """Attach Bedrock token usage to the call's span and the request's token counters"""
+    input_tokens = usage.get('input_tokens', 0)
+    output_tokens = usage.get('output_tokens', 0)
+    call.set(inputTokens=input_tokens, outputTokens=output_tokens, stopReason=stop_reason)
+    count('BedrockInputTokens', input_tokens)
+    count('BedrockOutputTokens', output_tokens)
+    # Answers cut off by a profile's output cap; a rising count means the cap is too tight
+    if stop_reason == 'max_tokens':
+        count('BedrockTruncated', 1)
+
+def log_fallback(error: BedrockUnavailable) -> None:
+    print(json.dumps({'metric': 'model_fallback', 'reason': error.reason, 'error': str(error)}))
+
+def response_meta(fallbacks: List[Optional[str]], model: str = MODEL_ID) -> Dict[str, Any]:
+    """Response metadata; `fallback` is true when any generated content is stub text"""
+    reasons = sorted({reason for reason in fallbacks if reason})
+    meta: Dict[str, Any] = {'model': model, 'fallback': bool(reasons)}
+    if reasons:
+        meta['fallbackReasons'] = reasons
+    return meta
+
+def fake_bedrock_reply(body: Dict[str, Any]) -> str:
+    """Completion text for the local fake and stub model backends"""
+    return generate_stub_response(body['messages'][-1]['content'])
+
+def stream_bedrock(prompt: str, system: Optional[str] = None, history: Optional[List[Dict[str, str]]] = None,
+                   generation: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield completion text chunks as Bedrock produces them; raises BedrockUnavailable before the first"""
+    bedrock = model_client()
+    
+    generation = generation or default_generation()
+    with span('bedrock.invoke_model_with_response_stream', model=generation['modelId'],
+              profile=generation['profile']) as call:
+        response = bedrock.invoke_model_with_response_stream(
+            modelId=generation['modelId'],
+            body=json.dumps(build_request_body(prompt, system, history, generation))
+        )
+    
+    usage: Dict[str, Any] = {}
+    stop_reason = None
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        payload = json.loads(chunk['bytes'])
+        kind = payload.get('type')
+        if kind == 'content_block_delta':
+            text = payload.get('delta', {}).get('text', '')
+            if text:
+                yield text
+        elif kind == 'message_start':
+            usage.update(payload.get('message', {}).get('usage') or {})
+        elif kind == 'message_delta':
+            usage.update(payload.get('usage') or {})
+            stop_reason = payload.get('delta', {}).get('stop_reason') or stop_reason
+    record_usage(call, usage, stop_reason)
+
+def sse_frame(event_name: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event frame"""
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+def chat_stream_frames(prompt: str, system: Optional[str] = None, history: Optional[List[Dict[str, str]]] = None,
+                       on_complete: Optional[Callable[[str], None]] = None,
+                       generation: Optional[Dict[str, Any]] = None, streamed: bool = False) -> Iterator[str]:
+    """Yield SSE frames for a streamed chat completion, ending with timing metrics.
+
+    `timeToFirstTokenMs` is when the first text frame went out to the client. A
+    streaming host asks for the next frame only after sending the previous one,
+    so that is when the generator resumes; when the frames are buffered (not
+    `streamed`), the first one leaves with the whole body.
+    """
+    started = time.perf_counter()
+    model_first_token_ms = None
+    first_sent_ms = None
+    parts = []
+    fallback = None
+    
+    try:
+        for text in stream_bedrock(prompt, system, history, generation):
+            if model_first_token_ms is None:
+                model_first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            parts.append(text)
+            yield sse_frame('delta', {'text': text})
+            if first_sent_ms is None and streamed:
+                first_sent_ms = round((time.perf_counter() - started) * 1000, 1)
+    except BedrockUnavailable as e:
+        log_fallback(e)
+        fallback = e.reason
+        parts.append(generate_stub_response(prompt))
+        yield sse_frame('delta', {'text': parts[-1]})
+        if first_sent_ms is None and streamed:
+            first_sent_ms = round((time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        yield sse_frame('error', {'error': str(e)})
+    
+    total_ms = round((time.perf_counter() - started) * 1000, 1)
+    metrics = {
+        'timeToFirstTokenMs': first_sent_ms if streamed else (total_ms if parts else None),
+        'modelFirstTokenMs': model_first_token_ms,
+        'totalDurationMs': total_ms,
+        'chunks': len(parts),
+        'streamed': streamed
+    }
+    print(json.dumps({'metric': 'chat_stream', **metrics}))
+    if on_complete is not None and parts and fallback is None:
+        on_complete(''.join(parts))
+    yield sse_frame('done', {'text': ''.join(parts), **metrics, 'meta': response_meta([fallback])})
+
+def wants_stream(event: Dict[str, Any], body: Dict[str, Any]) -> bool:
+    """Streaming is requested with `"stream": true` or an `Accept: text/event-stream` header"""
+    if body.get('stream') is True:
+        return True
+    return 'text/event-stream' in (request_header(event, 'accept') or '')
+
+def remaining_seconds(context: Any) -> float:
+    """Time budget for model calls, derived from the remaining Lambda time"""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return DEFAULT_DEADLINE_SECONDS
+    return max(0.0, (context.get_remaining_time_in_millis() - DEADLINE_SAFETY_MS) / 1000.0)
+
+def call_bedrock_many(prompts: Dict[str, str], context: Any,
+                      generations: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Run independent model calls concurrently, each with its generation profile from `generations`;
+    failed calls and calls that miss the deadline degrade to stub responses and are returned with
+    their fallback reason"""
+    generations = generations or {}
+    futures = {
+        name: model_executor.submit(propagate(call_bedrock), prompt, generation=generations.get(name))
+        for name, prompt in prompts.items()
+    }
+    wait(futures.values(), timeout=remaining_seconds(context))
+    
+    results = {}
+    fallbacks = {}
+    for name, future in futures.items():
+        if future.done() and future.exception() is None:
+            results[name], reason = future.result()
+            if reason:
+                fallbacks[name] = reason
+        else:
+            # Decided before cancel(): a cancelled queued call reports done() too
+            fallbacks[name] = 'deadline' if not future.done() else 'error'
+            # A late call keeps its worker until it returns, but no longer holds up the response
+            future.cancel()
+            results[name] = generate_stub_response(prompts[name])
+    return results, fallbacks
 
 def generate_stub_response(prompt: str) -> str:
     """Generate deterministic stub responses when Bedrock is unavailable"""
-    if 'marketing ideas' in prompt.lower():
+    if 'counter-ad against each' in prompt.lower():
+        return stub_comparison_response(prompt)
+    
+    elif 'marketing ideas' in prompt.lower():
         return """1. Social Media Showcase - Share behind-the-scenes content on Instagram
 2. Local Partnership Campaign - Collaborate with nearby businesses on Facebook
 3. Customer Testimonial Series - Feature satisfied customers across platforms
@@ -208,75 +533,234 @@ Competitor 4: Expert Solutions - "Professional expertise you can trust" - TikTok
     else:
         return "I'm here to help with your marketing needs. Please let me know how I can assist you with campaigns, strategies, or business growth."
 
-def handle_generate_ideas(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Generate marketing ideas"""
+def persist_artifact(artifact_type: str, body: Dict[str, Any], data: Any, fallbacks: Any = ()) -> None:
+    """Store a generated artifact as its campaign's latest.
+
+    Only requests that name their campaign are stored, and output that fell back
+    to the stub is not. The write is queued on the write-behind writer and goes
+    out with the request's other writes, in one BatchWriteItem before the
+    invocation returns.
+    """
+    campaign_id = body.get('campaignId')
+    if not campaign_id or any(fallbacks):
+        return
+    try:
+        store = get_artifact_store()
+        if store is None:
+            return
+        with span('artifact.save', type=artifact_type):
+            if not store.save(str(campaign_id), artifact_type, data, body.get('businessId')):
+                count('ArtifactsDropped', 1)
+    except Exception as e:
+        # Persistence is best-effort; the response has already been generated
+        print(json.dumps({'event': 'artifact_store_error', 'type': artifact_type, 'error': str(e)}))
+
+def build_idea_prompt(body: Dict[str, Any]) -> str:
+    """Render IDEA_PROMPT from a campaign context, asking for JSON when `format` is 'json'"""
+    # Extract business context (would normally come from DynamoDB)
+    prompt = render_prompt(
+        PROMPTS['IDEA_PROMPT'], 'IDEA_PROMPT',
+        industry=body.get('industry', 'general'),
+        business_name=body.get('businessName', 'Your Business'),
+        city=body.get('city', 'your city'),
+        goal=body.get('goal', 'increase awareness'),
+        target_audience=body.get('targetAudience', 'local customers'),
+        budget=body.get('budget', 300)
+    )
+    if body.get('format') == 'json':
+        prompt += JSON_MODE_INSTRUCTION
+    return prompt
+
+def idea_generation(campaigns: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """IDEA_PROMPT settings for one call answering `campaigns` (several when packed)"""
+    json_mode = any(campaign.get('format') == 'json' for campaign in campaigns)
+    return generation_params('IDEA_PROMPT', items=len(campaigns), json_mode=json_mode)
+
+def build_idea_record(idea: Dict[str, str], index: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Wrap a parsed idea into the API record shape"""
+    return {
+        'id': f"idea-{index + 1}",
+        'campaignId': body.get('campaignId', 'campaign-1'),
+        'title': idea['title'],
+        'description': idea['description'] or 'AI-generated marketing strategy',
+        'platform': idea['platform'],
+        'status': 'pending',
+        'createdAt': datetime.utcnow().isoformat()
+    }
+
+def pad_ideas(ideas: List[Dict[str, Any]], body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Back-fill to at least 6 ideas and cap at 8"""
+    business_name = body.get('businessName', 'Your Business')
+    while len(ideas) < 6:
+        ideas.append(build_idea_record({
+            'title': f'Marketing Strategy {len(ideas)+1}',
+            'description': f'Targeted marketing approach for {business_name}',
+            'platform': ['Facebook', 'Instagram', 'TikTok', 'Google Ads'][len(ideas) % 4]
+        }, len(ideas), body))
+    return ideas[:8]
+
+def parse_ideas(ai_response: str, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Parse a model response into structured ideas for one campaign"""
+    with span('parse_response', kind='ideas'):
+        ideas = [build_idea_record(idea, index, body) for index, idea in enumerate(parse_idea_text(ai_response))]
+        return pad_ideas(ideas, body)
+
+def idea_stream_frames(prompt: str, body: Dict[str, Any]) -> Iterator[str]:
+    """Yield one SSE `idea` frame per idea as soon as the model finishes it"""
+    ideas: List[Dict[str, Any]] = []
+    fallback = None
+    failed = False
     try:
-        body = json.loads(event['body'])
+        for idea in iter_ideas(stream_bedrock(prompt, generation=idea_generation([body]))):
+            if len(ideas) == 8:
+                break
+            ideas.append(build_idea_record(idea, len(ideas), body))
+            yield sse_frame('idea', ideas[-1])
+    except BedrockUnavailable as e:
+        log_fallback(e)
+        fallback = e.reason
+        ideas = parse_ideas(generate_stub_response(prompt), body)
+        for idea in ideas:
+            yield sse_frame('idea', idea)
+    except Exception as e:
+        failed = True
+        yield sse_frame('error', {'error': str(e)})
+    
+    streamed = len(ideas)
+    ideas = pad_ideas(ideas, body)
+    for idea in ideas[streamed:]:
+        yield sse_frame('idea', idea)
+    if not failed:
+        persist_artifact('ideas', body, ideas, [fallback])
+    yield sse_frame('done', {'count': len(ideas), 'meta': response_meta([fallback])})
+
+def handle_generate_ideas(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Generate marketing ideas, as SSE frames when streaming is requested"""
+    try:
+        body = parse_body(event)
+        prompt = build_idea_prompt(body)
         
-        # Extract business context (would normally come from DynamoDB)
-        business_name = body.get('businessName', 'Your Business')
-        industry = body.get('industry', 'general')
-        city = body.get('city', 'your city')
-        goal = body.get('goal', 'increase awareness')
-        target_audience = body.get('targetAudience', 'local customers')
-        budget = body.get('budget', 300)
+        if wants_stream(event, body):
+            # Sent idea by idea by the self-hosted server; API Gateway buffers the whole body
+            return event_stream(idea_stream_frames(prompt, body), context)
         
-        prompt = PROMPTS['IDEA_PROMPT'].format(
-            industry=industry,
-            business_name=business_name,
-            city=city,
-            goal=goal,
-            target_audience=target_audience,
-            budget=budget
-        )
+        ai_response, fallback = call_bedrock(prompt, generation=idea_generation([body]))
+        ideas = parse_ideas(ai_response, body)
+        persist_artifact('ideas', body, ideas, [fallback])
+        
+        return respond(200, {'success': True, 'data': ideas, 'meta': response_meta([fallback])})
+        
+    except Exception as e:
+        return error_response(400, str(e))
+
+def build_packed_idea_prompt(campaigns: List[Dict[str, Any]]) -> str:
+    """Render several campaigns into one prompt whose answer is split per campaign"""
+    sections = [
+        f"{PACKED_SECTION_MARKER} {index + 1}\n{build_idea_prompt(campaign)}"
+        for index, campaign in enumerate(campaigns)
+    ]
+    return (
+        f"Answer each of the following {len(campaigns)} independent requests for marketing ideas. "
+        f"Begin the answer to each request with its header line exactly as given "
+        f"(e.g. '{PACKED_SECTION_MARKER} 1') and keep the same numbered-list format.\n\n"
+        + '\n\n'.join(sections)
+    )
+
+def split_packed_response(ai_response: str, count: int) -> List[Any]:
+    """Split a packed response into per-campaign sections; missing sections are None"""
+    sections = [None] * count
+    current = None
+    buffer = []
+    for line in ai_response.split('\n') + [f'{PACKED_SECTION_MARKER} 0']:
+        stripped = line.strip()
+        if stripped.startswith(PACKED_SECTION_MARKER):
+            if current is not None and 0 <= current < count:
+                sections[current] = '\n'.join(buffer)
+            number = stripped[len(PACKED_SECTION_MARKER):].strip().rstrip(':')
+            current = int(number) - 1 if number.isdigit() else None
+            buffer = []
+        elif current is not None:
+            buffer.append(line)
+    return sections
+
+def generate_idea_group(campaigns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Generate ideas for a group of campaigns, packing them into one model call when there are several"""
+    if len(campaigns) == 1:
+        ai_response, fallback = call_bedrock(build_idea_prompt(campaigns[0]), generation=idea_generation(campaigns))
+        return [{'ideas': parse_ideas(ai_response, campaigns[0]), 'fallback': fallback}]
+    
+    packed_response, packed_fallback = call_bedrock(build_packed_idea_prompt(campaigns),
+                                                    generation=idea_generation(campaigns))
+    if packed_fallback:
+        # The stub can't be split per campaign; each campaign gets the stub ideas
+        return [
+            {'ideas': parse_ideas(generate_stub_response(build_idea_prompt(c)), c), 'fallback': packed_fallback}
+            for c in campaigns
+        ]
+    
+    sections = split_packed_response(packed_response, len(campaigns))
+    results = []
+    for campaign, section in zip(campaigns, sections):
+        fallback = None
+        # A section the model dropped is regenerated on its own
+        if section is None:
+            section, fallback = call_bedrock(build_idea_prompt(campaign), generation=idea_generation([campaign]))
+        results.append({'ideas': parse_ideas(section, campaign), 'fallback': fallback})
+    return results
+
+def handle_generate_ideas_batch(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Generate ideas for many campaigns in one request with per-campaign results"""
+    try:
+        body = parse_body(event)
+        campaigns = body.get('campaigns')
+        if not isinstance(campaigns, list) or not campaigns:
+            raise ValueError('campaigns must be a non-empty list')
+        if len(campaigns) > MAX_BATCH_CAMPAIGNS:
+            raise ValueError(f'At most {MAX_BATCH_CAMPAIGNS} campaigns per batch')
         
-        ai_response = call_bedrock(prompt)
-        
-        # Parse response into structured ideas
-        ideas = []
-        lines = ai_response.split('\n')
-        current_idea = {}
-        
-        for i, line in enumerate(lines):
-            if line.strip() and (line[0].isdigit() or line.startswith('-')):
-                if current_idea:
-                    ideas.append({
-                        'id': f"idea-{len(ideas)+1}",
-                        'campaignId': body.get('campaignId', 'campaign-1'),
-                        'title': current_idea.get('title', f'Marketing Idea {len(ideas)+1}'),
-                        'description': current_idea.get('description', 'AI-generated marketing strategy'),
-                        'platform': current_idea.get('platform', 'Facebook'),
-                        'status': 'pending',
-                        'createdAt': datetime.utcnow().isoformat()
-                    })
-                current_idea = {'title': line.strip()}
-            elif 'description:' in line.lower() or 'platform:' in line.lower():
-                if 'description:' in line.lower():
-                    current_idea['description'] = line.split(':', 1)[1].strip()
-                elif 'platform:' in line.lower():
-                    current_idea['platform'] = line.split(':', 1)[1].strip()
-        
-        # Ensure we have at least 6 ideas
-        while len(ideas) < 6:
-            ideas.append({
-                'id': f"idea-{len(ideas)+1}",
-                'campaignId': body.get('campaignId', 'campaign-1'),
-                'title': f'Marketing Strategy {len(ideas)+1}',
-                'description': f'Targeted marketing approach for {business_name}',
-                'platform': ['Facebook', 'Instagram', 'TikTok', 'Google Ads'][len(ideas) % 4],
-                'status': 'pending',
-                'createdAt': datetime.utcnow().isoformat()
-            })
-        
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': ideas[:8]})}
+        concurrency = max(1, min(int(body.get('concurrency', DEFAULT_BATCH_CONCURRENCY)), MAX_BATCH_CONCURRENCY))
+        pack_size = max(1, min(int(body.get('packSize', 1)), MAX_PACK_SIZE))
+        
+        groups = [list(range(i, min(i + pack_size, len(campaigns)))) for i in range(0, len(campaigns), pack_size)]
+        results: List[Dict[str, Any]] = [None] * len(campaigns)
+        fallbacks: List[Optional[str]] = []
+        
+        executor = ThreadPoolExecutor(max_workers=min(concurrency, len(groups)))
+        try:
+            futures = {
+                executor.submit(propagate(generate_idea_group), [campaigns[i] for i in group]): group
+                for group in groups
+            }
+            done, not_done = wait(futures.keys(), timeout=remaining_seconds(context))
+            
+            for future, group in futures.items():
+                if future in done and future.exception() is None:
+                    outcomes = [
+                        {'success': True, 'data': r['ideas'], 'meta': response_meta([r['fallback']])}
+                        for r in future.result()
+                    ]
+                    fallbacks.extend(r['fallback'] for r in future.result())
+                    for index, r in zip(group, future.result()):
+                        persist_artifact('ideas', campaigns[index], r['ideas'], [r['fallback']])
+                elif future in done:
+                    outcomes = [{'success': False, 'error': str(future.exception())}] * len(group)
+                else:
+                    outcomes = [{'success': False, 'error': 'Generation timed out'}] * len(group)
+                for index, outcome in zip(group, outcomes):
+                    results[index] = {'campaignId': campaigns[index].get('campaignId'), **outcome}
+        finally:
+            # Don't block the response on calls that already missed the deadline
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return respond(200, {'success': True, 'data': results, 'meta': response_meta(fallbacks)})
         
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(400, str(e))
 
-def handle_generate_creatives(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_generate_creatives(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Generate creative content"""
     try:
-        body = json.loads(event['body'])
+        body = parse_body(event)
         
         business_name = body.get('businessName', 'Your Business')
         industry = body.get('industry', 'general')
@@ -291,13 +775,13 @@ def handle_generate_creatives(event: Dict[str, Any], headers: Dict[str, str]) ->
         ]
         
         # Generate poster prompts
-        poster_prompt = PROMPTS['CREATIVE_POSTER_PROMPT'].format(
+        poster_prompt = render_prompt(
+            PROMPTS['CREATIVE_POSTER_PROMPT'], 'CREATIVE_POSTER_PROMPT',
             business_name=business_name,
             industry=industry,
             goal=goal,
             target_audience=target_audience
         )
-        poster_response = call_bedrock(poster_prompt)
         
         poster_prompts = [
             f"Professional {industry} business storefront with '{business_name}' signage, modern interior, customers engaged, quality service atmosphere",
@@ -305,14 +789,21 @@ def handle_generate_creatives(event: Dict[str, Any], headers: Dict[str, str]) ->
         ]
         
         # Generate video script
-        video_prompt = PROMPTS['VIDEO_SCRIPT_PROMPT'].format(
+        video_prompt = render_prompt(
+            PROMPTS['VIDEO_SCRIPT_PROMPT'], 'VIDEO_SCRIPT_PROMPT',
             business_name=business_name,
             industry=industry,
             goal=goal,
             target_audience=target_audience,
             budget=body.get('budget', 300)
         )
-        video_script = call_bedrock(video_prompt)
+        
+        # Poster and script generations are independent, so they run side by side
+        responses, fallbacks = call_bedrock_many(
+            {'poster': poster_prompt, 'videoScript': video_prompt}, context,
+            {'poster': generation_params('CREATIVE_POSTER_PROMPT'), 'videoScript': generation_params('VIDEO_SCRIPT_PROMPT')}
+        )
+        video_script = responses['videoScript']
         
         creative = {
             'id': f"creative-{datetime.now().timestamp()}",
@@ -322,147 +813,297 @@ def handle_generate_creatives(event: Dict[str, Any], headers: Dict[str, str]) ->
             'videoScript': video_script,
             'createdAt': datetime.utcnow().isoformat()
         }
+        if fallbacks:
+            creative['degraded'] = sorted(fallbacks)
+        persist_artifact('creatives', body, creative, fallbacks.values())
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': creative})}
+        return respond(200, {'success': True, 'data': creative, 'meta': response_meta(list(fallbacks.values()))})
         
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(400, str(e))
+
+def plan_start_date(body: Dict[str, Any]) -> Any:
+    """First day of the schedule: `startDate` (YYYY-MM-DD) or today"""
+    if body.get('startDate'):
+        return datetime.strptime(body['startDate'], '%Y-%m-%d').date()
+    return datetime.now().date()
+
+def build_plan_record(campaign_id: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': f"plan-{datetime.now().timestamp()}",
+        'campaignId': campaign_id,
+        **plan,
+        'createdAt': datetime.utcnow().isoformat()
+    }
 
-def handle_generate_plan(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Generate marketing plan"""
+def handle_generate_plan(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Generate marketing plan: reach-optimal budget split and a posting schedule within working hours"""
     try:
-        body = json.loads(event['body'])
+        body = parse_body(event)
+        engine = get_plan_engine()
         
-        business_name = body.get('businessName', 'Your Business')
-        goal = body.get('goal', 'increase awareness')
-        budget = body.get('budget', 300)
-        working_hours = body.get('workingHours', {'start': '09:00', 'end': '17:00'})
-        target_audience = body.get('targetAudience', 'local customers')
+        campaign = engine.normalize_campaign(body)
+        plan = engine.plan_campaigns([campaign], plan_start_date(body))[0]
+        record = build_plan_record(campaign['campaignId'], plan)
+        persist_artifact('plan', body, record)
         
-        # Generate budget allocation
-        budget_allocation = [
-            {'platform': 'Facebook', 'amount': int(budget * 0.4), 'percentage': 40},
-            {'platform': 'Instagram', 'amount': int(budget * 0.3), 'percentage': 30},
-            {'platform': 'Google Ads', 'amount': int(budget * 0.2), 'percentage': 20},
-            {'platform': 'TikTok', 'amount': int(budget * 0.1), 'percentage': 10}
-        ]
+        return respond(200, {'success': True, 'data': record})
         
-        # Generate 14-day schedule
-        start_date = datetime.now()
-        schedule = []
+    except Exception as e:
+        return error_response(400, str(e))
+
+def handle_generate_plan_batch(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Plan many campaigns in one vectorized pass with per-campaign results"""
+    try:
+        body = parse_body(event)
+        campaigns = body.get('campaigns')
+        if not isinstance(campaigns, list) or not campaigns:
+            raise ValueError('campaigns must be a non-empty list')
+        if len(campaigns) > MAX_PLAN_BATCH_CAMPAIGNS:
+            raise ValueError(f'At most {MAX_PLAN_BATCH_CAMPAIGNS} campaigns per batch')
         
-        for i in range(14):
-            current_date = start_date + timedelta(days=i)
-            posts = []
-            
-            # Add posts based on day pattern
-            if i % 2 == 0:  # Even days
-                posts.append({
-                    'platform': 'Facebook',
-                    'content': f'Quality service at {business_name}',
-                    'time': '10:00'
-                })
-            if i % 3 == 0:  # Every 3rd day
-                posts.append({
-                    'platform': 'Instagram',
-                    'content': f'Behind the scenes at {business_name}',
-                    'time': '14:00'
-                })
-            
-            schedule.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'posts': posts
-            })
+        engine = get_plan_engine()
+        start_date = plan_start_date(body)
         
-        plan = {
-            'id': f"plan-{datetime.now().timestamp()}",
-            'campaignId': body.get('campaignId', 'campaign-1'),
-            'budgetAllocation': budget_allocation,
-            'schedule': schedule,
-            'createdAt': datetime.utcnow().isoformat()
-        }
+        results: List[Dict[str, Any]] = [None] * len(campaigns)
+        valid: List[Tuple[int, Dict[str, Any]]] = []
+        for index, campaign in enumerate(campaigns):
+            try:
+                valid.append((index, engine.normalize_campaign(campaign)))
+            except Exception as e:
+                results[index] = {'campaignId': campaign.get('campaignId') if isinstance(campaign, dict) else None,
+                                  'success': False, 'error': str(e)}
+        
+        with span('plan.optimize', campaigns=len(valid)):
+            plans = engine.plan_campaigns([normalized for _, normalized in valid], start_date,
+                                          deadline=time.monotonic() + remaining_seconds(context))
+        for (index, normalized), plan in zip(valid, plans):
+            if plan is None:
+                results[index] = {'campaignId': normalized['campaignId'], 'success': False, 'error': 'Planning timed out'}
+            else:
+                results[index] = {'campaignId': normalized['campaignId'], 'success': True,
+                                  'data': build_plan_record(normalized['campaignId'], plan)}
+                persist_artifact('plan', campaigns[index], results[index]['data'])
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': plan})}
+        return respond(200, {'success': True, 'data': results})
         
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(400, str(e))
+
+def synthesize_competitors(industry: str, city: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Generate and parse one market's competitor set; returns (competitors, fallback reason)"""
+    prompt = render_prompt(PROMPTS['COMPETITOR_SYNTH_PROMPT'], 'COMPETITOR_SYNTH_PROMPT', industry=industry, city=city)
+    # The competitor cache decides when a market is regenerated, so the response cache is bypassed
+    ai_response, fallback = call_bedrock(prompt, use_cache=False, generation=generation_params('COMPETITOR_SYNTH_PROMPT'))
+    with span('parse_response', kind='competitors'):
+        return complete_competitors(parse_competitor_text(ai_response), industry, city), fallback
 
-def handle_generate_competitors(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Generate synthetic competitor ads"""
+def competitor_refresh(industry: str, city: str) -> Callable[[], None]:
+    """Queue a stale market's refresh as a worker job"""
+    def schedule() -> None:
+        jobs = get_jobs()
+        if jobs is None:
+            raise RuntimeError('Asynchronous jobs are not configured')
+        request = {'method': 'POST', 'path': COMPETITOR_REFRESH_PATH, 'headers': {'content-type': 'application/json'},
+                   'body': json.dumps({'industry': industry, 'city': city})}
+        jobs.submit(request, f'POST {COMPETITOR_REFRESH_PATH}')
+    return schedule
+
+def handle_refresh_competitors(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Worker job: regenerate a stale market under the lease its request took"""
+    cache = get_competitor_cache()
+    if cache is None:
+        return error_response(501, 'Competitor cache is not configured')
+    body = parse_body(event)
+    industry, city = body.get('industry', 'general'), body.get('city', 'local area')
+    entry = cache.refresh(market_key(industry, city), lambda: synthesize_competitors(industry, city))
+    if entry is None:
+        return error_response(502, 'Competitor refresh fell back; the stale set is kept')
+    return respond(200, {'success': True, 'data': {'market': market_key(industry, city),
+                                                   'refreshedAt': entry['refreshedAt']}})
+
+def handle_generate_competitors(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Serve synthetic competitor ads for a market from the competitor cache"""
     try:
-        params = event.get('queryStringParameters', {})
+        params = event.get('queryStringParameters') or {}
         business_id = params.get('businessId', 'demo')
         industry = params.get('industry', 'general')
         city = params.get('city', 'local area')
         
-        prompt = PROMPTS['COMPETITOR_SYNTH_PROMPT'].format(
-            industry=industry,
-            city=city
-        )
-        
-        ai_response = call_bedrock(prompt)
+        generate = lambda: synthesize_competitors(industry, city)
+        cache = get_competitor_cache()
+        if cache is not None:
+            entry, status = cache.get(market_key(industry, city), generate, competitor_refresh(industry, city))
+        else:
+            competitors, fallback = generate()
+            entry, status = {'competitors': competitors, 'refreshedAt': time.time(), 'fallback': fallback}, 'miss'
         
-        # Parse into structured competitors
+        refreshed_at = datetime.utcfromtimestamp(entry['refreshedAt']).isoformat()
         competitors = [
-            {
-                'id': f'comp-{i+1}',
-                'businessId': business_id,
-                'name': f'Competitor {i+1}',
-                'industry': industry,
-                'adContent': f'Professional {industry} services in {city}. Quality and reliability guaranteed.',
-                'platform': ['Facebook', 'Instagram', 'Google Ads', 'TikTok'][i % 4],
-                'location': city,
-                'estimatedBudget': [500, 300, 400, 200][i % 4],
-                'createdAt': datetime.utcnow().isoformat()
-            }
-            for i in range(4)
+            {**competitor, 'businessId': business_id, 'createdAt': refreshed_at}
+            for competitor in entry['competitors']
         ]
+        meta = {**response_meta([entry.get('fallback')]), 'cache': status, 'refreshedAt': refreshed_at}
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': competitors})}
+        return respond(200, {'success': True, 'data': competitors, 'meta': meta})
         
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(400, str(e))
+
+def comparison_business(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Our side of a comparison, from the request body"""
+    return {
+        'businessId': body.get('businessId', 'demo'),
+        'campaignId': body.get('campaignId', 'campaign-1'),
+        'businessName': body.get('businessName', 'Your Business'),
+        'industry': body.get('industry', 'general'),
+        'advantages': body.get('advantages', 'local expertise, personal service'),
+        'budget': body.get('budget', 300),
+        'adContent': body.get('adContent', ''),
+    }
+
+def resolve_competitors(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Competitors from the body, or the stored set for the body's (industry, city) market"""
+    competitors = body.get('competitors')
+    if competitors is None:
+        industry, city = body.get('industry', 'general'), body.get('city', 'local area')
+        cache = get_competitor_cache()
+        if cache is not None:
+            entry, _ = cache.get(market_key(industry, city), lambda: synthesize_competitors(industry, city),
+                                 competitor_refresh(industry, city))
+            competitors = entry['competitors']
+        else:
+            competitors, _ = synthesize_competitors(industry, city)
+    if not isinstance(competitors, list) or not all(isinstance(c, dict) and c.get('id') for c in competitors):
+        raise ValueError('competitors must be a list of objects with an id')
+    
+    wanted = body.get('competitorIds')
+    if wanted is not None:
+        by_id = {str(c['id']): c for c in competitors}
+        missing = [str(i) for i in wanted if str(i) not in by_id]
+        if missing:
+            raise ValueError(f"Unknown competitor: {', '.join(missing)}")
+        competitors = [by_id[str(i)] for i in wanted]
+    if not competitors:
+        raise ValueError('No competitors to compare')
+    if len(competitors) > MAX_BATCH_COMPETITORS:
+        raise ValueError(f'At most {MAX_BATCH_COMPETITORS} competitors per comparison')
+    return competitors
 
-def handle_compare_ads(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Compare ads and generate counter-strategy"""
+def build_comparison_prompt(business: Dict[str, Any], competitors: List[Dict[str, Any]]) -> str:
+    return render_prompt(
+        PROMPTS['COMPARISON_BATCH_PROMPT'], 'COMPARISON_BATCH_PROMPT',
+        business_name=business['businessName'],
+        industry=business['industry'],
+        ad_content=business['adContent'] or 'not provided',
+        our_advantages=business['advantages'],
+        budget=business['budget'],
+        competitors=format_competitors(competitors)
+    ) + JSON_INSTRUCTION
+
+def comparison_generation(competitors: int) -> Dict[str, Any]:
+    """COMPARISON_BATCH_PROMPT settings for a call scoring `competitors` competitors"""
+    return generation_params('COMPARISON_BATCH_PROMPT', items=competitors, json_mode=True)
+
+def compare_competitors(business: Dict[str, Any], competitors: List[Dict[str, Any]],
+                        context: Any) -> Tuple[List[Dict[str, Any]], List[Optional[str]]]:
+    """Compare our campaign with every competitor; returns (records, fallback reason per generated record).
+
+    Results whose inputs hash to a comparison already in the store are re-served.
+    The rest are scored GROUP_SIZE competitors per model call, with the calls
+    fanned out in parallel, and persisted unless they fell back to the stub.
+    """
+    store = get_comparison_store()
+    model_id = comparison_generation(1)['modelId']
+    hashes = {str(c['id']): comparison_id(model_id, business, c) for c in competitors}
+    stored: Dict[str, Dict[str, Any]] = {}
+    if store is not None:
+        try:
+            stored = store.get_many(list(hashes.values()))
+        except Exception:
+            # Stored results are an optimization; comparisons are regenerated without them
+            stored = {}
+    
+    pending = [c for c in competitors if hashes[str(c['id'])] not in stored]
+    groups = [pending[i:i + GROUP_SIZE] for i in range(0, len(pending), GROUP_SIZE)]
+    responses, fallbacks = call_bedrock_many(
+        {str(index): build_comparison_prompt(business, group) for index, group in enumerate(groups)}, context,
+        {str(index): comparison_generation(len(group)) for index, group in enumerate(groups)}
+    ) if groups else ({}, {})
+    
+    generated: Dict[str, Dict[str, Any]] = {}
+    reasons: List[Optional[str]] = []
+    fresh: List[Dict[str, Any]] = []
+    created_at = datetime.utcnow().isoformat()
+    for index, group in enumerate(groups):
+        with span('parse_response', kind='comparisons'):
+            parsed = parse_comparisons(responses[str(index)])
+        for competitor in group:
+            result = parsed.get(str(competitor['id']))
+            reason = fallbacks.get(str(index)) or (None if result else 'invalid_response')
+            record = {
+                'comparisonId': hashes[str(competitor['id'])],
+                'businessId': business['businessId'],
+                'campaignId': business['campaignId'],
+                'competitorId': str(competitor['id']),
+                'competitorName': competitor.get('name', ''),
+                **(result or default_comparison(business)),
+                'createdAt': created_at
+            }
+            generated[str(competitor['id'])] = record
+            reasons.append(reason)
+            if reason is None:
+                fresh.append(record)
+    if store is not None and fresh:
+        try:
+            store.save(fresh)
+        except Exception as e:
+            print(json.dumps({'event': 'comparison_store_error', 'error': str(e)}))
+    
+    records = [
+        {**stored[hashes[str(c['id'])]], 'stored': True} if str(c['id']) not in generated
+        else {**generated[str(c['id'])], 'stored': False}
+        for c in competitors
+    ]
+    return records, reasons
+
+def handle_compare_ads(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Compare our campaign with one competitor and generate a counter-strategy"""
     try:
-        body = json.loads(event['body'])
+        body = parse_body(event)
         
-        business_id = body.get('businessId', 'demo')
-        campaign_id = body.get('campaignId', 'campaign-1')
         competitor_id = body.get('competitorId', 'comp-1')
+        competitor = body.get('competitor')
+        competitors = resolve_competitors({**body, 'competitors': [competitor]} if competitor
+                                          else {**body, 'competitorIds': [competitor_id]})
         
-        # Mock comparison data
-        comparison = {
-            'comparisonId': f"comparison-{datetime.now().timestamp()}",
-            'businessId': business_id,
-            'campaignId': campaign_id,
-            'competitorId': competitor_id,
-            'scores': {
-                'clarity': 8.5,
-                'cta': 7.0,
-                'relevance': 9.0,
-                'design': 8.0,
-                'overall': 8.1
-            },
-            'critique': 'Your ad has excellent local relevance and clear messaging. The authentic approach is strong. However, the call-to-action could be more urgent. The community-focused approach is your key differentiator.',
-            'counterAd': {
-                'caption': '🌟 While others talk premium, we deliver VALUE daily! Community-focused for years, serving locals with dedication. Experience our authentic approach - quality service, fair prices. Free consultation today! #AuthenticService #CommunityFirst',
-                'posterPrompt': 'Warm, inviting business interior, team working together, satisfied customers, affordable pricing displayed, professional lighting',
-                'videoScript': 'OPEN: Early morning - Team preparing for the day. VOICEOVER: "While others charge premium prices..." CUT TO: Fair pricing. "...we believe great service should be accessible." MONTAGE: Happy diverse customers. END: "Your Business - Real service, real value, real community."'
-            },
-            'createdAt': datetime.utcnow().isoformat()
-        }
+        records, reasons = compare_competitors(comparison_business(body), competitors, context)
+        
+        return respond(200, {'success': True, 'data': records[0], 'meta': response_meta(reasons, comparison_generation(1)['modelId'])})
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': comparison})}
+    except Exception as e:
+        return error_response(400, str(e))
+
+def handle_compare_batch(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Compare our campaign with every competitor in its market (or the given ones) in one request"""
+    try:
+        body = parse_body(event)
+        
+        competitors = resolve_competitors(body)
+        records, reasons = compare_competitors(comparison_business(body), competitors, context)
+        
+        meta = {**response_meta(reasons, comparison_generation(1)['modelId']),
+                'stored': sum(1 for r in records if r['stored']), 'generated': len(reasons)}
+        persist_artifact('comparisons', body, records, reasons)
+        return respond(200, {'success': True, 'data': records, 'meta': meta})
         
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(400, str(e))
 
-def handle_chat_complete(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Handle chatbot conversation"""
+def handle_chat_complete(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Handle chatbot conversation with session memory, as SSE frames when streaming is requested"""
     try:
-        body = json.loads(event['body'])
+        body = parse_body(event)
         
         business_id = body.get('businessId', 'demo')
         session_id = body.get('sessionId', 'session-1')
@@ -470,14 +1111,151 @@ def handle_chat_complete(event: Dict[str, Any], headers: Dict[str, str]) -> Dict
         
         # Get last user message
         user_message = messages[-1]['content'] if messages else "Hello"
+        system = render_prompt(
+            PROMPTS['CHAT_SYSTEM_PROMPT'], 'CHAT_SYSTEM_PROMPT',
+            business_name=body.get('businessName', 'Your Business'),
+            industry=body.get('industry', 'general'),
+            city=body.get('city', 'your city')
+        )
         
-        # Generate response
-        response_text = call_bedrock(f"As a marketing assistant, respond to: {user_message}")
+        memory = get_chat_memory()
+        if memory is not None:
+            chat_context = memory.build_context(session_id, system, user_message)
+            # Folding old messages into the summary runs alongside the reply
+            fold = model_executor.submit(
+                propagate(memory.fold_summary), session_id, business_id, chat_context.fold,
+                lambda prompt: invoke_bedrock(prompt, use_cache=False, generation=generation_params('SUMMARY_PROMPT'))
+            ) if chat_context.fold else None
+            if fold is not None:
+                fold.add_done_callback(log_fold_failure)
+            system, history = chat_context.system, chat_context.history
+        else:
+            # No session store: budget the history the client sent instead
+            client_history = [
+                {'role': m.get('role', 'user'), 'content': m.get('content', '')}
+                for m in messages[:-1]
+            ]
+            history = budget_history(client_history, estimate_tokens(system) + estimate_tokens(user_message))
+            fold = None
+        
+        def record(reply: str) -> None:
+            if memory is not None:
+                memory.record_turn(session_id, business_id, user_message, reply, chat_context.last_ts)
+            if fold is not None:
+                wait([fold], timeout=remaining_seconds(context))
+        
+        if wants_stream(event, body):
+            # Sent frame by frame by the self-hosted server; API Gateway buffers the whole body
+            frames = chat_stream_frames(user_message, system, history, on_complete=record,
+                                        generation=generation_params('CHAT_SYSTEM_PROMPT'),
+                                        streamed=streams_responses(context))
+            return event_stream(frames, context)
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({
+        # Generate response; stub replies are not stored, so they never reach the session summary
+        response_text, fallback = call_bedrock(user_message, use_cache=False, system=system, history=history,
+                                               generation=generation_params('CHAT_SYSTEM_PROMPT'))
+        if fallback is None:
+            record(response_text)
+        
+        return respond(200, {
             'success': True,
-            'data': {'text': response_text}
-        })}
+            'data': {'text': response_text},
+            'meta': response_meta([fallback])
+        })
         
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
\ No newline at end of file
+        return error_response(400, str(e))
+
+def log_fold_failure(future: Any) -> None:
+    """A failed summary fold is logged; its messages stay unsummarized and a later turn folds them"""
+    if not future.cancelled() and future.exception() is not None:
+        print(json.dumps({'event': 'chat_summary_error', 'error': str(future.exception())}))
+
+def budget_history(messages: List[Dict[str, Any]], used_tokens: int) -> List[Dict[str, str]]:
+    """Keep the newest client-sent messages that fit in the chat token budget"""
+    budget = int(os.environ.get('CHAT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET))
+    selected = []
+    for message in reversed(messages):
+        used_tokens += estimate_tokens(message['content'])
+        if used_tokens > budget:
+            break
+        selected.append(message)
+    return normalize_history(list(reversed(selected)))
+
+def idempotent(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    """Route handler whose duplicate submissions replay or share one response instead of re-running"""
+    def handle(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        return get_idempotency().handle(event, context, handler)
+    return handle
+
+def accepts_jobs(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    """Route handler that queues the request as a job (202 + job id) when async mode is requested"""
+    def handle(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        if not wants_async(event):
+            return handler(event, context)
+        jobs = get_jobs()
+        if jobs is None:
+            return error_response(501, 'Asynchronous jobs are not configured')
+        http = event['requestContext']['http']
+        try:
+            job = jobs.submit(job_request(event), f"{http['method']} {event.get('routeTemplate') or http['path']}")
+        except Exception as e:
+            return error_response(503, str(e))
+        return respond(202, {'success': True, 'data': job}, {'Location': job['statusUrl']})
+    return handle
+
+def handle_get_job(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Job status and, once finished, its result; `?wait=N` long-polls up to N seconds for completion"""
+    jobs = get_jobs()
+    if jobs is None:
+        return error_response(501, 'Asynchronous jobs are not configured')
+    try:
+        params = event.get('queryStringParameters') or {}
+        wait_seconds = min(float(params.get('wait', 0)), remaining_seconds(context))
+        job = jobs.get(event['pathParameters']['jobId'], wait_seconds)
+    except ValueError as e:
+        return error_response(400, str(e))
+    if job is None:
+        return error_response(404, 'Job not found')
+    return respond(200, {'success': True, 'data': job})
+
+def handle_get_artifact(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Latest stored artifact of one type (ideas, creatives, plan, comparisons) for a campaign"""
+    store = get_artifact_store()
+    if store is None:
+        return error_response(501, 'Artifact storage is not configured')
+    params = event['pathParameters']
+    if params['artifactType'] not in ARTIFACT_TYPES:
+        return error_response(400, f"artifactType must be one of: {', '.join(ARTIFACT_TYPES)}")
+    try:
+        artifact = store.latest(params['campaignId'], params['artifactType'])
+    except Exception as e:
+        return error_response(500, str(e))
+    if artifact is None:
+        return error_response(404, 'No stored artifact')
+    return respond(200, {'success': True, 'data': artifact})
+
+# Route table
+router = Router()
+router.add('POST', '/ideas/generate', idempotent(accepts_jobs(handle_generate_ideas)))
+router.add('POST', '/ideas/generate:batch', accepts_jobs(handle_generate_ideas_batch))
+router.add('POST', '/creatives/generate', idempotent(accepts_jobs(handle_generate_creatives)))
+router.add('POST', '/plan/generate', idempotent(accepts_jobs(handle_generate_plan)))
+router.add('POST', '/plan/generate:batch', handle_generate_plan_batch)
+router.add('GET', '/competitors/generate', handle_generate_competitors)
+router.add('POST', '/compare', accepts_jobs(handle_compare_ads))
+router.add('POST', '/compare:batch', accepts_jobs(handle_compare_batch))
+router.add('POST', '/chat/complete', handle_chat_complete)
+router.add('GET', '/jobs/{jobId}', handle_get_job)
+router.add('GET', '/campaigns/{campaignId}/artifacts/{artifactType}', handle_get_artifact)
+
+pipeline = build_pipeline(router)
+
+# Routes only the job worker runs; API Gateway forwards every path to `router`, so they are kept off it
+worker_router = Router()
+worker_router.add('POST', COMPETITOR_REFRESH_PATH, handle_refresh_competitors)
+
+worker_pipeline = build_pipeline(worker_router)
+
+# Registered at import, during Lambda init; None outside Lambda
+post_invoke_flush = build_post_invoke_flush(flush_write_behind, WRITE_BEHIND_FLUSH_SECONDS)
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+from tracing import traced
+from write_behind import MAX_ITEM_BYTES, WriteBehindWriter
+
+# Generated outputs kept per campaign; each type holds the campaign's latest result
+ARTIFACT_TYPES = ('ideas', 'creatives', 'plan', 'comparisons')
+
+def artifact_key(campaign_id: str, artifact_type: str) -> str:
+    """ArtifactsTable partition key of a campaign's latest artifact of one type"""
+    return f'artifact#{campaign_id}#{artifact_type}'
+
+def to_item(campaign_id: str, artifact_type: str, data: Any, business_id: Optional[str] = None) -> Dict[str, Any]:
+    """ArtifactsTable item for an artifact; the payload is stored as a JSON string, so floats need no Decimal conversion"""
+    item = {
+        'pk': artifact_key(campaign_id, artifact_type),
+        'kind': 'artifact',
+        'artifactType': artifact_type,
+        'campaignId': campaign_id,
+        'data': json.dumps(data, separators=(',', ':'), default=str),
+        'createdAt': datetime.utcnow().isoformat()
+    }
+    if business_id:
+        item['businessId'] = str(business_id)
+    return item
+
+def from_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    artifact = {key: item[key] for key in ('campaignId', 'artifactType', 'businessId', 'createdAt') if key in item}
+    artifact['data'] = json.loads(item['data'])
+    return artifact
+
+class DynamoDBArtifactStore:
+    """Latest artifact per (campaign, type) in the core stack's ArtifactsTable.
+
+    Saves go through the write-behind writer when there is one, and reads check
+    its buffer first so a campaign's newest artifact is served before it lands.
+    Without a writer, saves are synchronous puts.
+    """
+
+    def __init__(self, table: Any, writer: Optional[WriteBehindWriter] = None):
+        self.table = table
+        self.writer = writer
+
+    def save(self, campaign_id: str, artifact_type: str, data: Any, business_id: Optional[str] = None) -> bool:
+        item = to_item(campaign_id, artifact_type, data, business_id)
+        size = len(item['data'].encode('utf-8'))
+        if self.writer is not None:
+            return self.writer.put(self.table.name, 'pk', item, size)
+        if size > MAX_ITEM_BYTES:
+            return False
+        self.table.put_item(Item=item)
+        return True
+
+    def latest(self, campaign_id: str, artifact_type: str) -> Optional[Dict[str, Any]]:
+        key = artifact_key(campaign_id, artifact_type)
+        item = self.writer.pending(self.table.name, key) if self.writer is not None else None
+        if item is None:
+            item = self.table.get_item(Key={'pk': key}).get('Item')
+        return from_item(item) if item else None
+
+class InMemoryArtifactStore:
+    """Local stand-in for the artifact store"""
+
+    def __init__(self):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def save(self, campaign_id: str, artifact_type: str, data: Any, business_id: Optional[str] = None) -> bool:
+        item = to_item(campaign_id, artifact_type, data, business_id)
+        with self._lock:
+            self.items[item['pk']] = item
+        return True
+
+    def latest(self, campaign_id: str, artifact_type: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self.items.get(artifact_key(campaign_id, artifact_type))
+        return from_item(item) if item else None
+
+def build_artifact_store(writer: Optional[WriteBehindWriter] = None) -> Optional[Any]:
+    """Build the artifact store from environment configuration; None when no store is configured"""
+    table_name = os.environ.get('ARTIFACTS_TABLE')
+    if table_name:
+        import boto3
+        return DynamoDBArtifactStore(traced(boto3.resource('dynamodb').Table(table_name), 'dynamodb', table=table_name),
+                                     writer)
+    if os.environ.get('ARTIFACTS_LOCAL', '').lower() in ('1', 'true', 'yes'):
+        return InMemoryArtifactStore()
+    return None
@@ -0,0 +1,417 @@
+import io
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, Iterator, Tuple
+
+# Defaults, overridable through the Lambda environment
+DEFAULT_RATE_LIMIT = 10.0
+DEFAULT_BURST = 10
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 0.2
+DEFAULT_MAX_DELAY = 2.0
+DEFAULT_ACQUIRE_TIMEOUT = 2.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_SECONDS = 30.0
+
+# Retry quota, as in the AWS SDK's standard retry mode: retries draw from it, successes refill it
+RETRY_QUOTA_CAPACITY = 50
+RETRY_COST = 5
+RETRY_REFUND = 1
+
+# Error codes retried with backoff; everything else fails the call immediately
+THROTTLING_CODES = {'ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException'}
+# Server-side errors that count towards opening the circuit
+SERVER_ERROR_CODES = {
+    'InternalServerException', 'ServiceUnavailableException', 'ModelTimeoutException',
+    'ModelNotReadyException', 'ModelErrorException'
+}
+
+class BedrockUnavailable(Exception):
+    """A model call that did not produce a response.
+
+    `reason` is reported in response metadata when a handler falls back:
+    unavailable (no client), circuit_open, rate_limited, throttled, error or invalid_response.
+    """
+
+    def __init__(self, reason: str, message: str = ''):
+        super().__init__(message or reason)
+        self.reason = reason
+
+def error_code(error: Exception) -> Optional[str]:
+    """AWS error code of a botocore ClientError (or anything shaped like one)"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+class TokenBucket:
+    """Client-side rate limiter whose refill rate adapts to throttling.
+
+    The rate is halved on every throttle and grows additively on success (AIMD),
+    so a container settles just under the share of the account quota it can get.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE_LIMIT, burst: int = DEFAULT_BURST,
+                 min_rate: Optional[float] = None, max_rate: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else max(rate / 20, 0.1)
+        self.max_rate = max_rate if max_rate is not None else rate
+        self._tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = DEFAULT_ACQUIRE_TIMEOUT) -> bool:
+        """Take one token, waiting up to `timeout` seconds; False when none became available"""
+        deadline = self._clock() + timeout
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_for = (1 - self._tokens) / self.rate
+            if now + wait_for > deadline:
+                return False
+            self._sleep(wait_for)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls are
+    rejected without touching Bedrock. After `reset_seconds` one probe call is let
+    through (half-open); its success closes the circuit and its failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+                 reset_seconds: float = DEFAULT_BREAKER_RESET_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+    def release(self) -> None:
+        """End an allowed call that says nothing about service health (e.g. a validation error)"""
+        with self._lock:
+            self._probing = False
+
+class ResilientBedrockClient:
+    """Wraps a bedrock-runtime client with rate limiting, throttling retries and a circuit breaker.
+
+    Only throttling is retried, with full-jitter exponential backoff and a shared
+    retry quota so a degraded service doesn't trigger a retry storm. Every failure
+    surfaces as BedrockUnavailable; callers decide how to fall back.
+    """
+
+    def __init__(self, client: Any, limiter: Optional[TokenBucket] = None, breaker: Optional[CircuitBreaker] = None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+                 sleep: Callable[[float], None] = time.sleep, canned: bool = False):
+        self.client = client
+        # The backend answers with stub text; callers report its answers as a fallback
+        self.canned = canned
+        self.limiter = limiter or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self._sleep = sleep
+        self._retry_quota = RETRY_QUOTA_CAPACITY
+        self._lock = threading.Lock()
+        self.counters = {
+            'calls': 0, 'successes': 0, 'throttles': 0, 'retries': 0,
+            'circuitOpen': 0, 'rateLimited': 0, 'failures': 0
+        }
+
+    def invoke_model(self, **kwargs) -> Dict[str, Any]:
+        return self._call(self.client.invoke_model, kwargs)
+
+    def invoke_model_with_response_stream(self, **kwargs) -> Dict[str, Any]:
+        # Retries cover opening the stream; errors while reading it reach the caller
+        return self._call(self.client.invoke_model_with_response_stream, kwargs)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _take_retry(self) -> bool:
+        with self._lock:
+            if self._retry_quota < RETRY_COST:
+                return False
+            self._retry_quota -= RETRY_COST
+            return True
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _call(self, operation: Callable[..., Dict[str, Any]], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('circuitOpen')
+            raise BedrockUnavailable('circuit_open', 'Bedrock circuit is open')
+
+        for attempt in range(self.max_attempts):
+            if not self.limiter.acquire(self.acquire_timeout):
+                self.breaker.release()
+                self._count('rateLimited')
+                raise BedrockUnavailable('rate_limited', 'Client-side Bedrock rate limit reached')
+            try:
+                response = operation(**kwargs)
+            except Exception as e:
+                code = error_code(e)
+                if code in THROTTLING_CODES:
+                    self._count('throttles')
+                    self.limiter.on_throttle()
+                    if attempt + 1 < self.max_attempts and self._take_retry():
+                        self._count('retries')
+                        self._sleep(self._backoff(attempt))
+                        continue
+                    self.breaker.record_failure()
+                    self._count('failures')
+                    raise BedrockUnavailable('throttled', str(e)) from e
+                if code is None or code in SERVER_ERROR_CODES:
+                    # Timeouts, connection errors and 5xx mean the service is degrading
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                self._count('failures')
+                raise BedrockUnavailable('error', str(e)) from e
+
+            self.limiter.on_success()
+            self.breaker.record_success()
+            with self._lock:
+                self.counters['successes'] += 1
+                self._retry_quota = min(RETRY_QUOTA_CAPACITY, self._retry_quota + RETRY_REFUND)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, 'rate': round(self.limiter.rate, 2), 'circuit': self.breaker.state}
+
+class FakeClientError(Exception):
+    """Error shaped like botocore's ClientError, raised by FakeBedrockRuntime"""
+
+    def __init__(self, code: str):
+        super().__init__(f'An error occurred ({code}) when calling the Bedrock API')
+        self.response = {'Error': {'Code': code}}
+
+class FakeBedrockRuntime:
+    """Local stand-in for the bedrock-runtime client that injects throttles, errors and latency.
+
+    `quota_rps` simulates the account quota (calls above it are throttled);
+    `throttle_rate` and `error_rate` throttle or fail that fraction of calls at random.
+    `latency_ms` (plus up to `jitter_ms`) is the time to first token and
+    `tokens_per_second` paces the rest of the output (~4 characters per token).
+    `responder` turns the request body into completion text.
+    """
+
+    def __init__(self, responder: Optional[Callable[[Dict[str, Any]], str]] = None, throttle_rate: float = 0.0,
+                 error_rate: float = 0.0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 quota_rps: Optional[float] = None, seed: Optional[int] = None,
+                 tokens_per_second: Optional[float] = None):
+        self.responder = responder or (lambda body: 'Fake Bedrock response.')
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.quota = TokenBucket(quota_rps, max(1, int(quota_rps))) if quota_rps else None
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _usage(body: str, text: str) -> Dict[str, int]:
+        return {'input_tokens': len(body) // 4 + 1, 'output_tokens': len(text) // 4 + 1}
+
+    def _complete(self, body: str) -> Tuple[str, str]:
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+        if self.quota is not None and not self.quota.acquire(0):
+            raise FakeClientError('ThrottlingException')
+        if roll < self.throttle_rate:
+            raise FakeClientError('ThrottlingException')
+        if roll < self.throttle_rate + self.error_rate:
+            raise FakeClientError('ServiceUnavailableException')
+        if delay:
+            time.sleep(delay / 1000)
+        request = json.loads(body)
+        return self._limit(self.responder(request), request)
+
+    @staticmethod
+    def _limit(text: str, request: Dict[str, Any]) -> Tuple[str, str]:
+        """Apply the request's stop sequences and max_tokens the way the model does"""
+        stop_reason = 'end_turn'
+        hits = [text.find(sequence) for sequence in request.get('stop_sequences') or [] if sequence in text]
+        if hits:
+            text, stop_reason = text[:min(hits)], 'stop_sequence'
+        max_tokens = request.get('max_tokens')
+        if max_tokens and len(text) // 4 + 1 > max_tokens:
+            text, stop_reason = text[:max_tokens * 4], 'max_tokens'
+        return text, stop_reason
+
+    def _generation_time(self, text: str) -> float:
+        return (len(text) / 4) / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def invoke_model(self, modelId: str, body: str, **kwargs) -> Dict[str, Any]:
+        text, stop_reason = self._complete(body)
+        if self.tokens_per_second:
+            time.sleep(self._generation_time(text))
+        payload = {'content': [{'type': 'text', 'text': text}], 'stop_reason': stop_reason,
+                   'usage': self._usage(body, text)}
+        return {'body': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, **kwargs) -> Dict[str, Any]:
+        text, stop_reason = self._complete(body)
+        return {'body': self._events(text, stop_reason, self._usage(body, text))}
+
+    def _events(self, text: str, stop_reason: str, usage: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+        start_event = {'type': 'message_start', 'message': {'usage': {'input_tokens': usage['input_tokens']}}}
+        yield {'chunk': {'bytes': json.dumps(start_event).encode('utf-8')}}
+        for start in range(0, len(text), 32):
+            if self.tokens_per_second and start:
+                time.sleep(self._generation_time(text[start:start + 32]))
+            delta = {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': text[start:start + 32]}}
+            yield {'chunk': {'bytes': json.dumps(delta).encode('utf-8')}}
+        end_event = {'type': 'message_delta', 'delta': {'stop_reason': stop_reason},
+                     'usage': {'output_tokens': usage['output_tokens']}}
+        yield {'chunk': {'bytes': json.dumps(end_event).encode('utf-8')}}
+
+Responder = Callable[[Dict[str, Any]], str]
+
+def bedrock_runtime(region: str, responder: Optional[Responder]) -> Any:
+    import boto3
+    from botocore.config import Config
+    # Retries happen in ResilientBedrockClient, so botocore's own retry loop is switched off
+    return boto3.client('bedrock-runtime', region_name=region,
+                        config=Config(retries={'mode': 'standard', 'total_max_attempts': 1}))
+
+def fake_runtime(region: str, responder: Optional[Responder]) -> Any:
+    quota = os.environ.get('BEDROCK_FAKE_QUOTA_RPS')
+    tokens_per_second = os.environ.get('BEDROCK_FAKE_TOKENS_PER_SECOND')
+    return FakeBedrockRuntime(
+        responder,
+        throttle_rate=float(os.environ.get('BEDROCK_FAKE_THROTTLE_RATE', 0)),
+        error_rate=float(os.environ.get('BEDROCK_FAKE_ERROR_RATE', 0)),
+        latency_ms=float(os.environ.get('BEDROCK_FAKE_LATENCY_MS', 0)),
+        quota_rps=float(quota) if quota else None,
+        tokens_per_second=float(tokens_per_second) if tokens_per_second else None
+    )
+
+def stub_runtime(region: str, responder: Optional[Responder]) -> Any:
+    return FakeBedrockRuntime(responder)
+
+# Model backends by MODEL_BACKEND name. A backend factory takes (region, stub responder) and returns
+# an object with bedrock-runtime's invoke_model(modelId, body) and
+# invoke_model_with_response_stream(modelId, body), answering in the Anthropic Messages format.
+MODEL_BACKENDS: Dict[str, Callable[[str, Optional[Responder]], Any]] = {
+    'bedrock': bedrock_runtime,
+    'fake': fake_runtime,
+    'stub': stub_runtime,
+}
+# Backends that answer in-process; the client-side rate limit is not applied to them
+UNLIMITED_BACKENDS = {'stub'}
+# Backends whose answers are the stub responses, never real model output
+CANNED_BACKENDS = {'stub'}
+
+def register_backend(name: str, factory: Callable[[str, Optional[Responder]], Any]) -> None:
+    """Make a model backend selectable through MODEL_BACKEND"""
+    MODEL_BACKENDS[name] = factory
+
+def backend_name() -> str:
+    """MODEL_BACKEND, defaulting to `fake` when the older BEDROCK_FAKE switch is set and `bedrock` otherwise"""
+    if os.environ.get('MODEL_BACKEND'):
+        return os.environ['MODEL_BACKEND'].lower()
+    return 'fake' if os.environ.get('BEDROCK_FAKE', '').lower() in ('1', 'true', 'yes') else 'bedrock'
+
+def build_bedrock_client(region: str, fake_responder: Optional[Responder] = None
+                         ) -> Optional[ResilientBedrockClient]:
+    """Build the resilient client around the configured model backend; None when it cannot be created.
+
+    MODEL_BACKEND selects the backend: `bedrock` (default), `fake` (FakeBedrockRuntime tuned by
+    BEDROCK_FAKE_THROTTLE_RATE, BEDROCK_FAKE_ERROR_RATE, BEDROCK_FAKE_LATENCY_MS,
+    BEDROCK_FAKE_TOKENS_PER_SECOND and BEDROCK_FAKE_QUOTA_RPS; also selected by BEDROCK_FAKE=true)
+    or `stub` (the deterministic stub responses, with no latency, faults or rate limit, reported to
+    callers as the `stub` fallback so they are never cached or stored). An unknown
+    name is logged as an error and builds no client, so every call reports the `unavailable`
+    fallback instead of serving canned text as model output.
+    """
+    name = backend_name()
+    if name not in MODEL_BACKENDS:
+        print(json.dumps({'event': 'model_backend_unknown', 'backend': name, 'expected': sorted(MODEL_BACKENDS)}))
+        return None
+    try:
+        client = MODEL_BACKENDS[name](region, fake_responder)
+    except Exception:
+        return None
+
+    if name in UNLIMITED_BACKENDS:
+        return ResilientBedrockClient(client, TokenBucket(1e6, 10 ** 6), canned=name in CANNED_BACKENDS)
+    rate = float(os.environ.get('BEDROCK_RATE_LIMIT', DEFAULT_RATE_LIMIT))
+    return ResilientBedrockClient(
+        client,
+        limiter=TokenBucket(rate, int(os.environ.get('BEDROCK_BURST', DEFAULT_BURST))),
+        breaker=CircuitBreaker(
+            int(os.environ.get('BEDROCK_BREAKER_THRESHOLD', DEFAULT_BREAKER_THRESHOLD)),
+            float(os.environ.get('BEDROCK_BREAKER_RESET_SECONDS', DEFAULT_BREAKER_RESET_SECONDS))
+        ),
+        max_attempts=int(os.environ.get('BEDROCK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+        canned=name in CANNED_BACKENDS
+    )
@@ -0,0 +1,287 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from tracing import traced
+
+# Defaults, overridable through the Lambda environment
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_RECENT_WINDOW = 12
+DEFAULT_SUMMARY_EVERY = 6
+SUMMARY_CACHE_SIZE = 256
+# Unsummarized messages read per turn; only reached when folds have been failing
+MAX_BACKLOG_READ = 200
+# Messages folded into the summary in one model call, so a backlog is caught up in steps
+MAX_FOLD_MESSAGES = 48
+
+SUMMARY_PROMPT = """Update the running summary of a marketing-assistant conversation.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Write the updated summary in at most 150 words. Keep facts about the business, its goals,
+decisions made and open questions; drop small talk."""
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+def format_transcript(messages: List[Dict[str, Any]]) -> str:
+    return '\n'.join(f"{m['role']}: {m['content']}" for m in messages)
+
+class DynamoDBChatStore:
+    """ChatSessions (summary per session) and ChatMessages (sessionId + ts) tables"""
+
+    def __init__(self, sessions_table: Any, messages_table: Any):
+        self.sessions_table = sessions_table
+        self.messages_table = messages_table
+
+    def recent_messages(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        from boto3.dynamodb.conditions import Key
+        response = self.messages_table.query(
+            KeyConditionExpression=Key('sessionId').eq(session_id),
+            ScanIndexForward=False,
+            Limit=limit,
+            ProjectionExpression='#ts, #role, content',
+            ExpressionAttributeNames={'#ts': 'ts', '#role': 'role'}
+        )
+        return [
+            {'ts': int(m['ts']), 'role': m['role'], 'content': m['content']}
+            for m in reversed(response.get('Items', []))
+        ]
+
+    def messages_after(self, session_id: str, after_ts: int, limit: int) -> List[Dict[str, Any]]:
+        """Oldest `limit` messages with ts > `after_ts`, in order"""
+        from boto3.dynamodb.conditions import Key
+        response = self.messages_table.query(
+            KeyConditionExpression=Key('sessionId').eq(session_id) & Key('ts').gt(after_ts),
+            Limit=limit,
+            ProjectionExpression='#ts, #role, content',
+            ExpressionAttributeNames={'#ts': 'ts', '#role': 'role'}
+        )
+        return [{'ts': int(m['ts']), 'role': m['role'], 'content': m['content']} for m in response.get('Items', [])]
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        with self.messages_table.batch_writer() as batch:
+            for message in messages:
+                batch.put_item(Item={'sessionId': session_id, **message})
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        item = self.sessions_table.get_item(Key={'sessionId': session_id}).get('Item')
+        if item and 'summarizedThrough' in item:
+            item['summarizedThrough'] = int(item['summarizedThrough'])
+        return item
+
+    def touch_session(self, session_id: str, business_id: str) -> None:
+        """Create or refresh the session row (businessId, updatedAt), leaving its summary alone"""
+        self.sessions_table.update_item(
+            Key={'sessionId': session_id},
+            UpdateExpression='SET businessId = :b, updatedAt = :u',
+            ExpressionAttributeValues={':b': business_id, ':u': int(time.time() * 1000)}
+        )
+
+    def save_session(self, session_id: str, business_id: str, summary: str, summarized_through: int) -> None:
+        self.sessions_table.update_item(
+            Key={'sessionId': session_id},
+            UpdateExpression='SET businessId = :b, summary = :s, summarizedThrough = :t, updatedAt = :u',
+            ExpressionAttributeValues={
+                ':b': business_id,
+                ':s': summary,
+                ':t': summarized_through,
+                ':u': int(time.time() * 1000)
+            }
+        )
+
+class InMemoryChatStore:
+    """Local stand-in for the chat tables"""
+
+    def __init__(self):
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.messages: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def recent_messages(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.messages.get(session_id, [])[-limit:])
+
+    def messages_after(self, session_id: str, after_ts: int, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [m for m in self.messages.get(session_id, []) if m['ts'] > after_ts][:limit]
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            stored = self.messages.setdefault(session_id, [])
+            stored.extend(dict(m) for m in messages)
+            stored.sort(key=lambda m: m['ts'])
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self.sessions.get(session_id)
+            return dict(session) if session else None
+
+    def touch_session(self, session_id: str, business_id: str) -> None:
+        with self._lock:
+            session = self.sessions.setdefault(session_id, {'sessionId': session_id})
+            session.update(businessId=business_id, updatedAt=int(time.time() * 1000))
+
+    def save_session(self, session_id: str, business_id: str, summary: str, summarized_through: int) -> None:
+        with self._lock:
+            self.sessions.setdefault(session_id, {'sessionId': session_id}).update(
+                businessId=business_id,
+                summary=summary,
+                summarizedThrough=summarized_through,
+                updatedAt=int(time.time() * 1000)
+            )
+
+class ChatContext:
+    """Prompt inputs for one chat turn"""
+
+    def __init__(self, system: str, history: List[Dict[str, str]], prompt_tokens: int,
+                 fold: List[Dict[str, Any]], last_ts: int):
+        self.system = system
+        self.history = history
+        self.prompt_tokens = prompt_tokens
+        self.fold = fold
+        self.last_ts = last_ts
+
+class ChatMemory:
+    """Session memory: a bounded recent window plus an incrementally updated running summary.
+
+    Each turn reads the messages after the summary's `summarizedThrough`, which is
+    fewer than `recent_window + summary_every` while folds succeed, so prompt size and
+    read cost stay flat however long the conversation gets. Messages that fall out of the
+    window are folded into the summary `summary_every` at a time, and the summary is cached
+    per session (in process and on the session row) instead of being rebuilt every turn.
+    If a fold fails, its messages stay unsummarized and a later turn folds them (at most
+    MAX_FOLD_MESSAGES per call) rather than letting them drop out of the prompt.
+    """
+
+    def __init__(self, store: Any, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 recent_window: int = DEFAULT_RECENT_WINDOW, summary_every: int = DEFAULT_SUMMARY_EVERY):
+        self.store = store
+        self.token_budget = token_budget
+        self.recent_window = recent_window
+        self.summary_every = summary_every
+        self._summaries: 'OrderedDict[str, Tuple[str, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_summary(self, session_id: str) -> Tuple[str, int]:
+        """Running summary and the ts of the last message folded into it"""
+        with self._lock:
+            cached = self._summaries.get(session_id)
+            if cached is not None:
+                self._summaries.move_to_end(session_id)
+                return cached
+        session = self.store.get_session(session_id) or {}
+        summary = (session.get('summary', ''), session.get('summarizedThrough', 0))
+        self._remember(session_id, summary)
+        return summary
+
+    def _remember(self, session_id: str, summary: Tuple[str, int]) -> None:
+        with self._lock:
+            self._summaries[session_id] = summary
+            self._summaries.move_to_end(session_id)
+            while len(self._summaries) > SUMMARY_CACHE_SIZE:
+                self._summaries.popitem(last=False)
+
+    def build_context(self, session_id: str, system_prompt: str, user_message: str) -> ChatContext:
+        """Assemble system prompt and history for the next turn within the token budget"""
+        summary, summarized_through = self.get_summary(session_id)
+        unsummarized = self.store.messages_after(session_id, summarized_through, MAX_BACKLOG_READ)
+        if len(unsummarized) < MAX_BACKLOG_READ:
+            overflow = unsummarized[:-self.recent_window] if len(unsummarized) > self.recent_window else []
+        else:
+            # A backlog longer than one read: fold from its oldest end, prompt from the newest messages
+            overflow = unsummarized
+            unsummarized = self.store.recent_messages(session_id, self.recent_window)
+            overflow = [m for m in overflow if m['ts'] < unsummarized[0]['ts']]
+
+        # Once enough messages have left the recent window they are folded into the summary
+        fold = overflow[:MAX_FOLD_MESSAGES] if len(overflow) >= self.summary_every else []
+
+        system = system_prompt
+        if summary:
+            system += f"\n\nSummary of the conversation so far:\n{summary}"
+
+        # Newest messages first until the budget is spent
+        used = estimate_tokens(system) + estimate_tokens(user_message)
+        selected: List[Dict[str, Any]] = []
+        for message in reversed(unsummarized):
+            cost = estimate_tokens(message['content'])
+            if used + cost > self.token_budget:
+                break
+            selected.append(message)
+            used += cost
+        selected.reverse()
+
+        last_ts = unsummarized[-1]['ts'] if unsummarized else summarized_through
+        return ChatContext(system, normalize_history(selected), used, fold, last_ts)
+
+    def fold_summary(self, session_id: str, business_id: str, fold: List[Dict[str, Any]],
+                     summarize: Callable[[str], str]) -> None:
+        """Fold messages into the running summary and persist it"""
+        if not fold:
+            return
+        summary, _ = self.get_summary(session_id)
+        updated = summarize(SUMMARY_PROMPT.format(
+            summary=summary or '(none yet)',
+            messages=format_transcript(fold)
+        )).strip()
+        through = fold[-1]['ts']
+        self.store.save_session(session_id, business_id, updated, through)
+        self._remember(session_id, (updated, through))
+
+    def record_turn(self, session_id: str, business_id: str, user_message: str, reply: str,
+                    after_ts: int = 0) -> None:
+        """Persist the user message and the assistant reply, ordered after `after_ts`, and
+        refresh the session row so the session is listed (by businessId and updatedAt) from its first turn"""
+        # ts is the sort key, so it must not collide with the previous turn
+        now = max(int(time.time() * 1000), after_ts + 1)
+        self.store.append_messages(session_id, [
+            {'ts': now, 'role': 'user', 'content': user_message},
+            {'ts': now + 1, 'role': 'assistant', 'content': reply}
+        ])
+        self.store.touch_session(session_id, business_id)
+
+def normalize_history(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Messages API history: starts with a user turn and alternates roles"""
+    history: List[Dict[str, str]] = []
+    for message in messages:
+        role = 'assistant' if message['role'] == 'assistant' else 'user'
+        if not history and role == 'assistant':
+            continue
+        if history and history[-1]['role'] == role:
+            history[-1]['content'] += '\n' + message['content']
+        else:
+            history.append({'role': role, 'content': message['content']})
+    # The new user message follows, so history must end on an assistant turn
+    if history and history[-1]['role'] == 'user':
+        history.pop()
+    return history
+
+def build_chat_memory() -> Optional[ChatMemory]:
+    """Build chat memory from environment configuration; None when no store is configured"""
+    sessions_table = os.environ.get('CHAT_SESSIONS_TABLE')
+    messages_table = os.environ.get('CHAT_MESSAGES_TABLE')
+    if sessions_table and messages_table:
+        import boto3
+        dynamodb = boto3.resource('dynamodb')
+        store = DynamoDBChatStore(
+            traced(dynamodb.Table(sessions_table), 'dynamodb', table=sessions_table),
+            traced(dynamodb.Table(messages_table), 'dynamodb', table=messages_table)
+        )
+    elif os.environ.get('CHAT_MEMORY_LOCAL', '').lower() in ('1', 'true', 'yes'):
+        store = InMemoryChatStore()
+    else:
+        return None
+
+    return ChatMemory(
+        store,
+        token_budget=int(os.environ.get('CHAT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)),
+        recent_window=int(os.environ.get('CHAT_RECENT_WINDOW', DEFAULT_RECENT_WINDOW)),
+        summary_every=int(os.environ.get('CHAT_SUMMARY_EVERY', DEFAULT_SUMMARY_EVERY))
+    )
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import threading
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+from tracing import traced
+
+SCORE_KEYS = ['clarity', 'cta', 'relevance', 'design', 'overall']
+# Competitors scored per model call: a whole market set in one call, within the 2000-token answer limit
+GROUP_SIZE = 4
+MAX_BATCH_COMPETITORS = 50
+# BatchGetItem takes at most 100 keys; unprocessed keys are retried this many times, then regenerated
+BATCH_GET_SIZE = 100
+BATCH_GET_ATTEMPTS = 3
+
+# Appended to COMPARISON_BATCH_PROMPT; every competitor's answer is keyed by its id
+JSON_INSTRUCTION = (
+    '\n\nRespond with JSON only, in the form {"comparisons": [{"competitorId": "...", '
+    '"scores": {"clarity": 0, "cta": 0, "relevance": 0, "design": 0, "overall": 0}, '
+    '"critique": "...", "counterAd": {"caption": "...", "posterPrompt": "...", "videoScript": "..."}}]}.'
+)
+
+def comparison_id(model_id: str, business: Dict[str, Any], competitor: Dict[str, Any]) -> str:
+    """Content hash over everything that shapes a comparison; unchanged inputs map to the stored result"""
+    payload = json.dumps({
+        'model': model_id,
+        'business': {key: business.get(key) for key in
+                     ('businessId', 'campaignId', 'businessName', 'industry', 'advantages', 'budget', 'adContent')},
+        'competitor': {key: competitor.get(key) for key in ('id', 'name', 'adContent', 'platform', 'usp')},
+    }, sort_keys=True, separators=(',', ':'), default=str)
+    return 'cmp-' + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+def format_competitors(competitors: List[Dict[str, Any]]) -> str:
+    return '\n'.join(
+        f"- id: {c['id']} | {c.get('name', '')} | {c.get('platform', '')} | \"{c.get('adContent', '')}\""
+        + (f" | strength: {c['usp']}" if c.get('usp') else '')
+        for c in competitors
+    )
+
+def stub_comparison_response(prompt: str) -> str:
+    """Deterministic batch answer covering every competitor id listed in the prompt"""
+    ids = [line[len('- id: '):].split(' | ', 1)[0] for line in prompt.splitlines() if line.startswith('- id: ')]
+    name = prompt.split('Our business: ', 1)[-1].split(' (', 1)[0] if 'Our business: ' in prompt else None
+    fallback = default_comparison({'businessName': name})
+    return json.dumps({'comparisons': [{'competitorId': competitor_id, **fallback} for competitor_id in ids]})
+
+def _score(value: Any) -> Optional[float]:
+    try:
+        return round(min(10.0, max(1.0, float(value))), 1)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_entry(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    raw_scores = entry.get('scores') if isinstance(entry.get('scores'), dict) else {}
+    scores = {key: _score(raw_scores.get(key)) for key in SCORE_KEYS}
+    parts = [scores[key] for key in SCORE_KEYS[:-1] if scores[key] is not None]
+    if not parts:
+        return None
+    if scores['overall'] is None:
+        scores['overall'] = round(sum(parts) / len(parts), 1)
+    for key in SCORE_KEYS:
+        if scores[key] is None:
+            scores[key] = scores['overall']
+    counter_ad = entry.get('counterAd') if isinstance(entry.get('counterAd'), dict) else {}
+    return {
+        'scores': scores,
+        'critique': str(entry.get('critique') or ''),
+        'counterAd': {key: str(counter_ad.get(key) or '') for key in ('caption', 'posterPrompt', 'videoScript')},
+    }
+
+def parse_comparisons(text: str) -> Dict[str, Dict[str, Any]]:
+    """Parse a batch answer into {competitorId: {scores, critique, counterAd}}; unusable entries are left out.
+
+    Entries are decoded one at a time, so an answer cut off by the token limit keeps
+    every competitor that was complete before the cut.
+    """
+    key = text.find('"comparisons"')
+    index = text.find('[', key) + 1 if key >= 0 else 0
+    if index <= 0:
+        return {}
+    decoder = json.JSONDecoder()
+    results = {}
+    while True:
+        while index < len(text) and text[index] in ' \t\r\n,':
+            index += 1
+        if index >= len(text) or text[index] != '{':
+            break
+        try:
+            entry, index = decoder.raw_decode(text, index)
+        except ValueError:
+            break
+        if isinstance(entry, dict) and entry.get('competitorId') is not None:
+            parsed = _parse_entry(entry)
+            if parsed:
+                results[str(entry['competitorId'])] = parsed
+    return results
+
+def default_comparison(business: Dict[str, Any]) -> Dict[str, Any]:
+    """Deterministic comparison used when the model is unavailable or skips a competitor"""
+    name = business.get('businessName') or 'Your Business'
+    return {
+        'scores': {'clarity': 8.5, 'cta': 7.0, 'relevance': 9.0, 'design': 8.0, 'overall': 8.1},
+        'critique': 'Your ad has excellent local relevance and clear messaging. The authentic approach is strong. '
+                    'However, the call-to-action could be more urgent. The community-focused approach is your key '
+                    'differentiator.',
+        'counterAd': {
+            'caption': '🌟 While others talk premium, we deliver VALUE daily! Community-focused for years, serving '
+                       'locals with dedication. Experience our authentic approach - quality service, fair prices. '
+                       'Free consultation today! #AuthenticService #CommunityFirst',
+            'posterPrompt': 'Warm, inviting business interior, team working together, satisfied customers, '
+                            'affordable pricing displayed, professional lighting',
+            'videoScript': 'OPEN: Early morning - Team preparing for the day. VOICEOVER: "While others charge premium '
+                           'prices..." CUT TO: Fair pricing. "...we believe great service should be accessible." '
+                           f'MONTAGE: Happy diverse customers. END: "{name} - Real service, real value, real community."'
+        },
+    }
+
+def to_item(record: Dict[str, Any]) -> Dict[str, Any]:
+    """DynamoDB item for a comparison record (scores as Decimal)"""
+    return {**record, 'scores': {key: Decimal(str(value)) for key, value in record['scores'].items()}}
+
+def from_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {**item, 'scores': {key: float(value) for key, value in item.get('scores', {}).items()}}
+
+class DynamoDBComparisonStore:
+    """Comparisons in the core stack's ComparisonsTable, read back by comparisonId with BatchGetItem;
+    saved through the write-behind writer when there is one"""
+
+    def __init__(self, table: Any, dynamodb: Any, writer: Optional[Any] = None):
+        self.table = table
+        self.dynamodb = dynamodb
+        self.writer = writer
+
+    def get_many(self, comparison_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored comparisons among `comparison_ids`, keyed by comparisonId; cost follows the request, not the history"""
+        stored: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for key in dict.fromkeys(comparison_ids):
+            # Saved comparisons that haven't been written yet
+            item = self.writer.pending(self.table.name, key) if self.writer is not None else None
+            if item is not None:
+                stored[key] = from_item(item)
+            else:
+                missing.append(key)
+        for start in range(0, len(missing), BATCH_GET_SIZE):
+            keys = [{'comparisonId': key} for key in missing[start:start + BATCH_GET_SIZE]]
+            for _ in range(BATCH_GET_ATTEMPTS):
+                response = self.dynamodb.batch_get_item(RequestItems={self.table.name: {'Keys': keys}})
+                for item in response.get('Responses', {}).get(self.table.name, []):
+                    stored[item['comparisonId']] = from_item(item)
+                keys = response.get('UnprocessedKeys', {}).get(self.table.name, {}).get('Keys', [])
+                if not keys:
+                    break
+        return stored
+
+    def save(self, records: List[Dict[str, Any]]) -> None:
+        if self.writer is not None:
+            for record in records:
+                self.writer.put(self.table.name, 'comparisonId', to_item(record))
+            return
+        with self.table.batch_writer() as batch:
+            for record in records:
+                batch.put_item(Item=to_item(record))
+
+class InMemoryComparisonStore:
+    """Local stand-in for the comparisons table"""
+
+    def __init__(self):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, comparison_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {key: dict(self.items[key]) for key in comparison_ids if key in self.items}
+
+    def save(self, records: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for record in records:
+                self.items[record['comparisonId']] = dict(record)
+
+def build_comparison_store(writer: Optional[Any] = None) -> Optional[Any]:
+    """Build the comparison store from environment configuration; None when no store is configured"""
+    table_name = os.environ.get('COMPARISONS_TABLE')
+    if table_name:
+        import boto3
+        dynamodb = boto3.resource('dynamodb')
+        return DynamoDBComparisonStore(traced(dynamodb.Table(table_name), 'dynamodb', table=table_name),
+                                       traced(dynamodb, 'dynamodb'), writer)
+    if os.environ.get('COMPARISONS_LOCAL', '').lower() in ('1', 'true', 'yes'):
+        return InMemoryComparisonStore()
+    return None
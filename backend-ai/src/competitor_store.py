@@ -0,0 +1,384 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from tracing import traced
+
+# Defaults, overridable through the Lambda environment
+DEFAULT_FRESH_SECONDS = 24 * 3600
+DEFAULT_MAX_STALE_SECONDS = 7 * 24 * 3600
+DEFAULT_REFRESH_LEASE_SECONDS = 120
+# Markets held in process memory per container, least recently used evicted first
+DEFAULT_MEMORY_ENTRIES = 1024
+COMPETITORS_PER_MARKET = 4
+
+PLATFORMS = ['Facebook', 'Instagram', 'Google Ads', 'TikTok']
+DEFAULT_BUDGETS = [500, 300, 400, 200]
+
+_LEADER = re.compile(r'^(?:[-*•]\s*|\d+[.)]\s*|competitor\s*\d+\s*[:.)-]\s*)', re.IGNORECASE)
+_FIELD = re.compile(r'^(name|business(?: name)?|ad(?: content)?|platform|(?:estimated )?budget|usp|'
+                    r'unique selling propositions?)\s*:\s*(.*)$', re.IGNORECASE)
+_QUOTED = re.compile(r'^["“\'](.*)["”\']$')
+_AMOUNT = re.compile(r'\$\s*([\d,]+)')
+_MARKUP = re.compile(r'[*_#`]+')
+_PLATFORM = re.compile('|'.join(re.escape(platform) for platform in PLATFORMS) + '|google', re.IGNORECASE)
+
+def market_key(industry: str, city: str) -> str:
+    """Normalized (industry, city) key, so 'Bakery ' / 'bakery' and 'New  York' / 'new york' share a set"""
+    return '|'.join(' '.join(part.lower().split()) for part in (industry, city))
+
+def _platform(text: str) -> Optional[str]:
+    match = _PLATFORM.search(text)
+    if not match:
+        return None
+    name = match.group(0).lower()
+    return 'Google Ads' if name.startswith('google') else next(p for p in PLATFORMS if p.lower() == name)
+
+def _budget(text: str) -> Optional[int]:
+    match = _AMOUNT.search(text)
+    return int(match.group(1).replace(',', '')) if match else None
+
+def _from_fields(fields: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not fields.get('name'):
+        return None
+    return {
+        'name': fields['name'],
+        'adContent': fields.get('adContent', ''),
+        'platform': _platform(fields.get('platform', '')),
+        'estimatedBudget': _budget(fields.get('budget', '')),
+        'usp': fields.get('usp', ''),
+    }
+
+def _parse_line(line: str) -> Optional[Dict[str, Any]]:
+    """`Competitor 1: Name - "Ad content" - Platform - $500 budget - USP`"""
+    parts = [part.strip() for part in line.split(' - ') if part.strip()]
+    if len(parts) < 2:
+        return None
+    fields: Dict[str, str] = {'name': parts[0]}
+    for part in parts[1:]:
+        quoted = _QUOTED.match(part)
+        if quoted and 'adContent' not in fields:
+            fields['adContent'] = quoted.group(1)
+        elif 'platform' not in fields and _platform(part) and len(part) <= 24:
+            fields['platform'] = part
+        elif 'budget' not in fields and _budget(part) is not None:
+            fields['budget'] = part
+        elif 'adContent' not in fields:
+            fields['adContent'] = part
+        else:
+            fields['usp'] = f"{fields['usp']} - {part}" if 'usp' in fields else part
+    return _from_fields(fields)
+
+def _parse_json(text: str) -> List[Dict[str, Any]]:
+    text = text.strip().strip('`')
+    if text.lower().startswith('json'):
+        text = text[4:]
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get('competitors', [])
+    competitors = []
+    for entry in data if isinstance(data, list) else []:
+        if isinstance(entry, dict):
+            parsed = _from_fields({
+                'name': str(entry.get('name') or entry.get('businessName') or ''),
+                'adContent': str(entry.get('adContent') or entry.get('ad') or ''),
+                'platform': str(entry.get('platform') or ''),
+                'budget': f"${entry.get('estimatedBudget') or entry.get('budget') or ''}",
+                'usp': str(entry.get('usp') or ''),
+            })
+            if parsed:
+                competitors.append(parsed)
+    return competitors
+
+def parse_competitor_text(text: str) -> List[Dict[str, Any]]:
+    """Parse COMPETITOR_SYNTH_PROMPT output into {name, adContent, platform, estimatedBudget, usp} records.
+
+    Understands one competitor per line (`Name - "Ad" - Platform - $budget - USP`),
+    `Name:` / `Ad:` / `Platform:` / `Budget:` blocks and JSON. Fields the model
+    left out come back as None or ''.
+    """
+    stripped = text.lstrip()
+    if stripped[:1] in ('{', '[') or stripped.startswith('```'):
+        try:
+            return _parse_json(stripped)
+        except ValueError:
+            pass
+
+    competitors: List[Dict[str, Any]] = []
+    block: Dict[str, str] = {}
+    for raw in text.splitlines():
+        line = _MARKUP.sub('', raw).strip()
+        if not line:
+            continue
+        body = _LEADER.sub('', line).strip()
+        field = _FIELD.match(body)
+        if field:
+            name, value = field.group(1).lower(), field.group(2).strip()
+            key = ('name' if name.startswith(('name', 'business')) else
+                   'adContent' if name.startswith('ad') else
+                   'platform' if name == 'platform' else
+                   'budget' if 'budget' in name else 'usp')
+            if key == 'name' and block.get('name'):
+                competitors.append(_from_fields(block))
+                block = {}
+            block[key] = _QUOTED.sub(r'\1', value)
+            continue
+        parsed = _parse_line(body) if body != line or ' - ' in body else None
+        if parsed:
+            if block.get('name'):
+                competitors.append(_from_fields(block))
+                block = {}
+            competitors.append(parsed)
+    if block.get('name'):
+        competitors.append(_from_fields(block))
+    return [competitor for competitor in competitors if competitor]
+
+def complete_competitors(parsed: List[Dict[str, Any]], industry: str, city: str) -> List[Dict[str, Any]]:
+    """Fill missing fields and back-fill to COMPETITORS_PER_MARKET records"""
+    competitors = []
+    for index in range(max(COMPETITORS_PER_MARKET, len(parsed))):
+        competitor = parsed[index] if index < len(parsed) else {}
+        competitors.append({
+            'id': f'comp-{index + 1}',
+            'name': competitor.get('name') or f'Competitor {index + 1}',
+            'industry': industry,
+            'adContent': competitor.get('adContent') or
+                         f'Professional {industry} services in {city}. Quality and reliability guaranteed.',
+            'platform': competitor.get('platform') or PLATFORMS[index % 4],
+            'location': city,
+            'estimatedBudget': competitor.get('estimatedBudget') or DEFAULT_BUDGETS[index % 4],
+            'usp': competitor.get('usp') or '',
+        })
+    return competitors
+
+class DynamoDBCompetitorStore:
+    """Competitor sets keyed by `marketKey`; `refreshingUntil` is a lease so one container refreshes a market"""
+
+    def __init__(self, table: Any):
+        self.table = table
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self.table.get_item(Key={'marketKey': key}).get('Item')
+        # An item holding only a refresh lease has no competitor set yet
+        if not item or 'competitors' not in item:
+            return None
+        return {'competitors': json.loads(item['competitors']), 'refreshedAt': float(item['refreshedAt'])}
+
+    def put(self, key: str, competitors: List[Dict[str, Any]], refreshed_at: float, expires_at: float) -> None:
+        self.table.put_item(Item={
+            'marketKey': key,
+            'competitors': json.dumps(competitors),
+            'refreshedAt': int(refreshed_at),
+            'expiresAt': int(expires_at)
+        })
+
+    def try_lease(self, key: str, now: float, lease_seconds: int) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.table.update_item(
+                Key={'marketKey': key},
+                # A lease on a market with no stored set creates a lease-only item; it expires with the lease
+                UpdateExpression='SET refreshingUntil = :until, expiresAt = if_not_exists(expiresAt, :until)',
+                ConditionExpression='attribute_not_exists(refreshingUntil) OR refreshingUntil < :now',
+                ExpressionAttributeValues={':until': int(now + lease_seconds), ':now': int(now)}
+            )
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+class InMemoryCompetitorStore:
+    """Local stand-in for the competitor table"""
+
+    def __init__(self):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.leases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self.items.get(key)
+            return dict(item) if item else None
+
+    def put(self, key: str, competitors: List[Dict[str, Any]], refreshed_at: float, expires_at: float) -> None:
+        with self._lock:
+            self.items[key] = {'competitors': competitors, 'refreshedAt': refreshed_at}
+
+    def try_lease(self, key: str, now: float, lease_seconds: int) -> bool:
+        with self._lock:
+            if self.leases.get(key, 0) >= now:
+                return False
+            self.leases[key] = now + lease_seconds
+            return True
+
+class CompetitorCache:
+    """Stale-while-revalidate competitor sets per market.
+
+    Entries younger than `fresh_seconds` are served as they are. Older entries,
+    up to `max_stale_seconds`, are served too; the request that wins the
+    market's store lease hands the refresh to `schedule_refresh` (the job
+    queue) and still answers from the stale set, so no request waits on the
+    model. Only a market with no usable entry generates on the request path.
+    Up to `memory_entries` markets are also kept in process memory (LRU), so a
+    warm container answers without a store round trip.
+    """
+
+    def __init__(self, store: Any, fresh_seconds: int = DEFAULT_FRESH_SECONDS,
+                 max_stale_seconds: int = DEFAULT_MAX_STALE_SECONDS,
+                 lease_seconds: int = DEFAULT_REFRESH_LEASE_SECONDS,
+                 memory_entries: int = DEFAULT_MEMORY_ENTRIES):
+        self.store = store
+        self.fresh_seconds = fresh_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.lease_seconds = lease_seconds
+        self.memory_entries = memory_entries
+        self.memory: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.counters = {'fresh': 0, 'stale': 0, 'miss': 0, 'refreshesQueued': 0, 'refreshes': 0,
+                         'storeErrors': 0}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _recall(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+            return entry
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.memory[key] = entry
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def _load(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._recall(key)
+        if entry is not None and now - entry['refreshedAt'] < self.fresh_seconds:
+            return entry
+        try:
+            stored = self.store.get(key)
+        except Exception:
+            # The store is best-effort on reads; fall back to whatever this container holds
+            self._count('storeErrors')
+            return entry
+        if stored is not None and (entry is None or stored['refreshedAt'] > entry['refreshedAt']):
+            self._remember(key, stored)
+            entry = stored
+        return entry
+
+    def save(self, key: str, competitors: List[Dict[str, Any]]) -> Dict[str, Any]:
+        now = time.time()
+        entry = {'competitors': competitors, 'refreshedAt': now}
+        self._remember(key, entry)
+        try:
+            self.store.put(key, competitors, now, now + self.max_stale_seconds)
+        except Exception:
+            self._count('storeErrors')
+        return entry
+
+    def _claim_refresh(self, key: str, now: float) -> bool:
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+        try:
+            claimed = self.store.try_lease(key, now, self.lease_seconds)
+        except Exception:
+            self._count('storeErrors')
+            claimed = True
+        if not claimed:
+            with self._lock:
+                self._refreshing.discard(key)
+        return claimed
+
+    def refresh(self, key: str, generate: Callable[[], Tuple[List[Dict[str, Any]], Optional[str]]]
+                ) -> Optional[Dict[str, Any]]:
+        """Regenerate a market, under the lease taken by get(); returns the new entry, or None when
+        generation fell back or failed (the current entry is kept, and the lease holds off retries until it expires)"""
+        try:
+            competitors, fallback = generate()
+            if fallback:
+                return None
+            self._count('refreshes')
+            return self.save(key, competitors)
+        except Exception as e:
+            print(json.dumps({'event': 'competitor_refresh_error', 'market': key, 'error': str(e)}))
+            return None
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule(self, key: str, schedule_refresh: Callable[[], None]) -> None:
+        try:
+            schedule_refresh()
+            self._count('refreshesQueued')
+        except Exception as e:
+            # The store lease stays taken, so the market is retried once it expires
+            print(json.dumps({'event': 'competitor_refresh_error', 'market': key, 'error': str(e)}))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key: str, generate: Callable[[], Tuple[List[Dict[str, Any]], Optional[str]]],
+            schedule_refresh: Optional[Callable[[], None]] = None) -> Tuple[Dict[str, Any], str]:
+        """Return (entry, status) with status 'fresh', 'stale' or 'miss'.
+
+        `generate` returns (competitors, fallback reason); fallback results are
+        returned (with the reason under 'fallback') but never stored, so a stub
+        can't replace a real set. `schedule_refresh` queues `refresh()` for a
+        stale market elsewhere; without it stale sets are served until they expire.
+        """
+        now = time.time()
+        entry = self._load(key, now)
+        age = now - entry['refreshedAt'] if entry else None
+
+        if age is not None and age < self.fresh_seconds:
+            self._count('fresh')
+            return entry, 'fresh'
+
+        if age is not None and age < self.max_stale_seconds:
+            if schedule_refresh is not None and self._claim_refresh(key, now):
+                self._schedule(key, schedule_refresh)
+            self._count('stale')
+            return entry, 'stale'
+
+        self._count('miss')
+        competitors, fallback = generate()
+        if fallback:
+            return {'competitors': competitors, 'refreshedAt': now, 'fallback': fallback}, 'miss'
+        return self.save(key, competitors), 'miss'
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        stats['memoryEntries'] = len(self.memory)
+        return stats
+
+def build_competitor_cache() -> Optional[CompetitorCache]:
+    """Build the competitor cache from environment configuration; None when no store is configured"""
+    table_name = os.environ.get('COMPETITORS_TABLE')
+    if table_name:
+        import boto3
+        store = DynamoDBCompetitorStore(traced(boto3.resource('dynamodb').Table(table_name), 'dynamodb',
+                                               table=table_name))
+    elif os.environ.get('COMPETITORS_LOCAL', '').lower() in ('1', 'true', 'yes'):
+        store = InMemoryCompetitorStore()
+    else:
+        return None
+
+    return CompetitorCache(
+        store,
+        fresh_seconds=int(os.environ.get('COMPETITORS_FRESH_SECONDS', DEFAULT_FRESH_SECONDS)),
+        max_stale_seconds=int(os.environ.get('COMPETITORS_MAX_STALE_SECONDS', DEFAULT_MAX_STALE_SECONDS)),
+        lease_seconds=int(os.environ.get('COMPETITORS_REFRESH_LEASE_SECONDS', DEFAULT_REFRESH_LEASE_SECONDS)),
+        memory_entries=int(os.environ.get('COMPETITORS_MEMORY_ENTRIES', DEFAULT_MEMORY_ENTRIES))
+    )
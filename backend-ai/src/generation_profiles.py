@@ -0,0 +1,105 @@
+import os
+from typing import Dict, Any, List
+from chat_memory import estimate_tokens
+
+# Model id per tier; MODEL_ID_<TIER> in the environment re-points a tier. Both default to the fast
+# model; set MODEL_ID_QUALITY to opt comparisons into a larger one
+DEFAULT_MODEL_TIERS = {
+    'fast': 'anthropic.claude-3-haiku-20240307-v1:0',
+    'quality': 'anthropic.claude-3-haiku-20240307-v1:0',
+}
+DEFAULT_TIER = 'fast'
+# Claude 3 models return at most 4096 output tokens
+MAX_OUTPUT_TOKENS = 4096
+# Calls made without a profile keep the original limit
+DEFAULT_MAX_TOKENS = 2000
+# A trimmed slot keeps at least this many characters
+MIN_SLOT_CHARS = 40
+TRIM_MARKER = '…'
+
+# Generation settings per prompt template.
+#   tier            model tier the template runs on
+#   maxTokens       output cap for one answer, sized from the requested format with ~30% headroom
+#   jsonMaxTokens   output cap when the JSON form of the answer is requested
+#   perItemTokens   extra output per additional item when one call answers several (packed ideas,
+#                   grouped comparisons)
+#   stopSequences   end the answer once the requested format is complete (single-item calls only)
+#   maxInputTokens  budget for the rendered prompt; `trimSlots` are shortened to fit, longest first
+#   entitySlots     names that a near-duplicate cache hit swaps for the requester's (see similar_cache)
+#   similarSlots    free-text slots compared by similarity; every other slot must match exactly.
+#                   Templates without them are only served from the exact response cache
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # 8 ideas x (title, 2-3 sentence description, platform) ~ 600 tokens; a 9th item is cut off
+    'IDEA_PROMPT': {'tier': 'fast', 'maxTokens': 800, 'jsonMaxTokens': 1000, 'perItemTokens': 800,
+                    'stopSequences': ['\n9.'], 'maxInputTokens': 600,
+                    'trimSlots': ['goal', 'target_audience', 'business_name', 'industry', 'city'],
+                    'entitySlots': ['business_name'], 'similarSlots': ['goal', 'target_audience']},
+    # Two detailed visual descriptions
+    'CREATIVE_POSTER_PROMPT': {'tier': 'fast', 'maxTokens': 600, 'stopSequences': ['\nPoster 3'],
+                               'maxInputTokens': 600, 'trimSlots': ['goal', 'target_audience', 'business_name'],
+                               'entitySlots': ['business_name'], 'similarSlots': ['goal', 'target_audience']},
+    # A 30-second script is ~75 spoken words plus scene and visual cues
+    'VIDEO_SCRIPT_PROMPT': {'tier': 'fast', 'maxTokens': 500, 'stopSequences': [], 'maxInputTokens': 600,
+                            'trimSlots': ['goal', 'target_audience', 'business_name'],
+                            'entitySlots': ['business_name'], 'similarSlots': ['goal', 'target_audience']},
+    # Four one-line competitors
+    'COMPETITOR_SYNTH_PROMPT': {'tier': 'fast', 'maxTokens': 400, 'stopSequences': ['\nCompetitor 5'],
+                                'maxInputTokens': 300, 'trimSlots': ['industry', 'city']},
+    # Per competitor: scores, critique and a counter-ad (caption, poster concept, script) in JSON ~ 380 tokens
+    'COMPARISON_BATCH_PROMPT': {'tier': 'quality', 'maxTokens': 500, 'jsonMaxTokens': 500, 'perItemTokens': 450,
+                                'stopSequences': [], 'maxInputTokens': 3000,
+                                'trimSlots': ['ad_content', 'our_advantages', 'business_name']},
+    # Replies are asked to be concise
+    'CHAT_SYSTEM_PROMPT': {'tier': 'fast', 'maxTokens': 600, 'stopSequences': [], 'maxInputTokens': 300,
+                           'trimSlots': ['business_name', 'industry', 'city']},
+    # chat_memory.SUMMARY_PROMPT asks for at most 150 words
+    'SUMMARY_PROMPT': {'tier': 'fast', 'maxTokens': 350, 'stopSequences': [], 'maxInputTokens': 4000,
+                       'trimSlots': []},
+}
+
+def model_for_tier(tier: str) -> str:
+    return os.environ.get(f'MODEL_ID_{tier.upper()}') or DEFAULT_MODEL_TIERS[tier]
+
+def generation_params(profile_name: str, items: int = 1, json_mode: bool = False) -> Dict[str, Any]:
+    """Model id, output cap and stop sequences for one call rendered from `profile_name`'s template.
+
+    `items` is how many answers the call packs together; the cap grows by `perItemTokens` per extra
+    item, up to the model maximum. Stop sequences only apply when the call answers a single item.
+    """
+    profile = PROFILES[profile_name]
+    base = profile.get('jsonMaxTokens', profile['maxTokens']) if json_mode else profile['maxTokens']
+    max_tokens = base + profile.get('perItemTokens', 0) * max(0, items - 1)
+    return {
+        'profile': profile_name,
+        'modelId': model_for_tier(profile['tier']),
+        'maxTokens': min(MAX_OUTPUT_TOKENS, max_tokens),
+        'stopSequences': list(profile['stopSequences']) if items == 1 and not json_mode else [],
+    }
+
+def default_generation() -> Dict[str, Any]:
+    """Settings for a call made without a profile"""
+    return {'profile': None, 'modelId': model_for_tier(DEFAULT_TIER), 'maxTokens': DEFAULT_MAX_TOKENS,
+            'stopSequences': []}
+
+def trim_slots(slots: Dict[str, Any], names: List[str], excess_tokens: int) -> Dict[str, Any]:
+    """Shorten the named slot values, longest first, by about `excess_tokens` in total"""
+    trimmed = dict(slots)
+    excess_chars = excess_tokens * 4
+    for name in sorted((n for n in names if n in trimmed), key=lambda n: -len(str(trimmed[n]))):
+        value = str(trimmed[name])
+        keep = max(MIN_SLOT_CHARS, len(value) - excess_chars)
+        if keep < len(value):
+            trimmed[name] = value[:keep].rstrip() + TRIM_MARKER
+            excess_chars -= len(value) - keep
+        if excess_chars <= 0:
+            break
+    return trimmed
+
+def render_prompt(template: str, profile_name: str, **slots: Any) -> str:
+    """Render a prompt template, trimming oversized input slots to the profile's input budget"""
+    prompt = template.format(**slots)
+    profile = PROFILES[profile_name]
+    excess = estimate_tokens(prompt) - profile['maxInputTokens']
+    if excess <= 0 or not profile['trimSlots']:
+        return prompt
+    return template.format(**trim_slots(slots, profile['trimSlots'], excess))
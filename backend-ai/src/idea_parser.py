@@ -0,0 +1,211 @@
+import json
+import re
+from typing import Dict, List, Iterator, Iterable, Optional
+
+PLATFORMS = ['Facebook', 'Instagram', 'TikTok', 'Google Ads', 'Google My Business', 'LinkedIn', 'YouTube']
+DEFAULT_PLATFORM = 'Facebook'
+
+# Appended to IDEA_PROMPT when the caller asks for JSON output
+JSON_MODE_INSTRUCTION = (
+    '\n\nRespond with JSON only, in the form '
+    '{"ideas": [{"title": "...", "description": "...", "platform": "..."}]}.'
+)
+
+_NUMBERED = re.compile(r'^(\d+)[.):]\s*(.*)$')
+_BULLET = re.compile(r'^[-*•]\s+(.*)$')
+_FIELD = re.compile(r'^(title|description|(?:recommended )?platform)\s*:\s*(.*)$', re.IGNORECASE)
+_MARKUP = re.compile(r'[*_#`]+')
+_HEADING = re.compile(r'^(idea|option|concept)\s*\d+\s*:?$', re.IGNORECASE)
+
+def _clean(text: str) -> str:
+    return _MARKUP.sub('', text).strip()
+
+_PLATFORM_NAMES = {platform.lower(): platform for platform in PLATFORMS}
+# Matched against lower-cased text: an IGNORECASE alternation is several times slower
+_PLATFORM = re.compile('|'.join(re.escape(name) for name in _PLATFORM_NAMES))
+
+def _infer_platform(text: str) -> Optional[str]:
+    match = _PLATFORM.search(text.lower())
+    return _PLATFORM_NAMES[match.group(0)] if match else None
+
+class IdeaStreamParser:
+    """Incremental parser for IDEA_PROMPT output.
+
+    Feed text chunks as they arrive; each idea is yielded as soon as the next one
+    starts (or on close()). Every line is classified once, and a chunk without a
+    newline is only set aside, so text is never re-scanned as chunks arrive. A
+    response that starts with `{`, `[` or a code fence is treated as JSON mode
+    and parsed on close(); so is the rest of a response whose first code fence
+    comes before any idea (a sentence of preamble, then a ```json block).
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        # Chunks of the line in progress, joined once its newline arrives
+        self._partial: List[str] = []
+        self._current: Optional[Dict[str, str]] = None
+        self._numbered = False
+        self._json_mode: Optional[bool] = None
+        self._json_parts: List[str] = []
+        # Set once JSON parsing failed, so the line-parser fallback doesn't switch back
+        self._json_failed = False
+        self._gap = False
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        """Ideas completed by this chunk; a list, since most chunks complete none"""
+        if self._json_mode is None:
+            stripped = (self._buffer + chunk).lstrip()
+            if not stripped:
+                self._buffer += chunk
+                return []
+            self._json_mode = stripped[0] in '{[' or stripped.startswith('```')
+            if self._json_mode:
+                self._json_parts.append(self._buffer)
+                self._buffer = ''
+
+        if self._json_mode:
+            self._json_parts.append(chunk)
+            return []
+
+        if self._buffer:
+            chunk, self._buffer = self._buffer + chunk, ''
+        if '\n' not in chunk:
+            self._partial.append(chunk)
+            return []
+        lines = chunk.split('\n')
+        if self._partial:
+            self._partial.append(lines[0])
+            lines[0] = ''.join(self._partial)
+        self._partial = [lines.pop()]
+        ideas = []
+        for index, line in enumerate(lines):
+            if self._current is None and not self._json_failed and line.lstrip().startswith('```'):
+                # Preamble, then a fenced block: the rest of the response is JSON
+                self._json_mode = True
+                self._json_parts = ['\n'.join(lines[index:] + self._partial)]
+                self._partial = []
+                return ideas
+            idea = self._consume_line(line)
+            if idea is not None:
+                ideas.append(idea)
+        return ideas
+
+    def close(self) -> Iterator[Dict[str, str]]:
+        if self._json_mode:
+            yield from self._parse_json(''.join(self._json_parts))
+            return
+
+        rest = self._buffer + ''.join(self._partial)
+        self._buffer, self._partial = '', []
+        if rest:
+            idea = self._consume_line(rest)
+            if idea is not None:
+                yield idea
+        if self._current is not None and self._current.get('title'):
+            yield self._finish(self._current)
+        self._current = None
+
+    def _consume_line(self, line: str) -> Optional[Dict[str, str]]:
+        """Apply one line; returns the previous idea when this line starts a new one"""
+        text = line.strip()
+        if not text:
+            self._gap = True
+            return None
+
+        # Cheap first-character checks keep the regexes off most lines
+        first = text[0]
+        numbered = _NUMBERED.match(text) if first.isdigit() else None
+        bullet = _BULLET.match(text) if first in '-*•' else None
+        body = numbered.group(2) if numbered else bullet.group(1) if bullet else text
+        if '*' in body or '_' in body or '#' in body or '`' in body:
+            body = _clean(body)
+        if not body or (len(body) < 16 and _HEADING.match(body)):
+            return None
+
+        field = _FIELD.match(body) if ':' in body else None
+        if field:
+            self._gap = False
+            name, value = field.group(1).lower(), field.group(2).strip()
+            if name == 'title':
+                if numbered or self._current is None or self._current.get('title'):
+                    self._numbered = self._numbered or bool(numbered)
+                    return self._start({'title': value})
+                self._current['title'] = value
+                return None
+            if self._current is None:
+                self._current = {}
+            self._current['platform' if name.endswith('platform') else name] = value
+            return None
+
+        # Numbered lines always start an idea; bullets only when the list isn't numbered
+        if numbered or (bullet and not self._numbered):
+            self._gap = False
+            self._numbered = self._numbered or bool(numbered)
+            return self._start(self._split_title(body))
+
+        # Continuation text belongs to the current idea unless a blank line separated them
+        if self._current is not None and not self._gap:
+            existing = self._current.get('description')
+            self._current['description'] = f'{existing} {body}' if existing else body
+        return None
+
+    def _start(self, idea: Dict[str, str]) -> Optional[Dict[str, str]]:
+        previous = self._current
+        self._current = idea
+        return self._finish(previous) if previous and previous.get('title') else None
+
+    @staticmethod
+    def _split_title(body: str) -> Dict[str, str]:
+        # "Title - Description" / "Title: Description" on one line
+        for separator in (' - ', ' – ', ': '):
+            if separator in body:
+                title, description = body.split(separator, 1)
+                return {'title': title.strip(), 'description': description.strip()}
+        return {'title': body}
+
+    @staticmethod
+    def _finish(idea: Dict[str, str]) -> Dict[str, str]:
+        title = idea.get('title', '')
+        description = idea.get('description', '')
+        platform = idea.get('platform')
+        if platform:
+            platform = _infer_platform(platform) or platform
+        else:
+            # One search over both: a platform named in the title comes first, so it still wins
+            platform = _infer_platform(f'{title}\n{description}') or DEFAULT_PLATFORM
+        return {'title': title, 'description': description, 'platform': platform}
+
+    def _parse_json(self, text: str) -> Iterator[Dict[str, str]]:
+        payload = text.strip()
+        if payload.startswith('```'):
+            # Fenced block: drop the opening ```json line and the closing fence
+            payload = payload.split('\n', 1)[-1].rsplit('```', 1)[0]
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            # Not valid JSON after all; fall back to the line parser
+            self._json_mode = False
+            self._json_failed = True
+            yield from self.feed(text)
+            yield from self.close()
+            return
+
+        records = data.get('ideas', []) if isinstance(data, dict) else data
+        for record in records if isinstance(records, list) else []:
+            if isinstance(record, dict) and record.get('title'):
+                yield self._finish({
+                    'title': str(record['title']),
+                    'description': str(record.get('description', '')),
+                    'platform': str(record.get('platform', ''))
+                })
+
+def iter_ideas(chunks: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """Parse a stream of text chunks, yielding ideas as they complete"""
+    parser = IdeaStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+def parse_idea_text(text: str) -> List[Dict[str, str]]:
+    """Parse a complete response"""
+    return list(iter_ideas([text]))
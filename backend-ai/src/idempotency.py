@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, Tuple
+from http_api import error_response, request_header, respond
+from tracing import traced
+
+# Defaults, overridable through the Lambda environment
+DEFAULT_TTL_SECONDS = 24 * 3600
+# Longer than the 60 s function timeout, so a running request keeps its claim
+DEFAULT_LOCK_SECONDS = 90
+MAX_KEY_LENGTH = 255
+# DynamoDB items are capped at 400 KB; larger responses are not kept
+MAX_STORED_BODY_BYTES = 350 * 1024
+IDEMPOTENCY_HEADER = 'idempotency-key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+# Frames of a generation stream (ai_handler.sse_frame) that decide whether it can be replayed
+SSE_DONE_FRAME = 'event: done\ndata: '
+SSE_ERROR_EVENT = 'event: error\n'
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+def request_fingerprint(event: Dict[str, Any]) -> str:
+    """Hash over method, path, query, `Prefer` header, SSE `Accept` and raw body; requests with equal
+    fingerprints produce the same response (a `Prefer: respond-async` submission differs from the same
+    request run inline, and an event-stream request from one answered with JSON)"""
+    http = event['requestContext']['http']
+    query = sorted((event.get('queryStringParameters') or {}).items())
+    event_stream = 'text/event-stream' in (request_header(event, 'accept') or '')
+    digest = hashlib.sha256(json.dumps([http['method'], http['path'], query, request_header(event, 'prefer'),
+                                        event_stream]).encode('utf-8'))
+    digest.update((event.get('body') or '').encode('utf-8'))
+    return digest.hexdigest()
+
+def copy_response(response: Dict[str, Any], extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Shallow copy a caller can decorate (middleware adds headers) without touching the shared original"""
+    return {**response, 'headers': {**(response.get('headers') or {}), **(extra_headers or {})}}
+
+def is_fallback(response: Dict[str, Any]) -> bool:
+    """Whether a response was served from the stub; those are never kept for replay.
+
+    JSON bodies carry `meta.fallback`. A buffered SSE body carries it in its final `done`
+    frame; a stream that reported an error or never reached `done` counts as a fallback too.
+    """
+    content_type = (response.get('headers') or {}).get('Content-Type', '')
+    body = response.get('body') or ''
+    if content_type.startswith('text/event-stream'):
+        if f'\n{SSE_ERROR_EVENT}' in '\n' + body:
+            return True
+        last = body.rstrip('\n').rsplit('\n\n', 1)[-1]
+        if not last.startswith(SSE_DONE_FRAME):
+            return True
+        data = last[len(SSE_DONE_FRAME):]
+    elif content_type.startswith('application/json'):
+        data = body or '{}'
+    else:
+        return False
+    try:
+        meta = json.loads(data).get('meta')
+    except (ValueError, AttributeError):
+        return content_type.startswith('text/event-stream')
+    return isinstance(meta, dict) and bool(meta.get('fallback'))
+
+class DynamoDBIdempotencyStore:
+    """Idempotency records keyed by `idempotencyKey`.
+
+    A conditional put claims a key (status `in_progress` until `expiresAt`); the
+    finished response replaces the claim and lives until its own `expiresAt`,
+    which is also the table TTL attribute.
+    """
+
+    def __init__(self, table: Any):
+        self.table = table
+
+    def claim(self, key: str, fingerprint: str, now: float, lock_seconds: int) -> Optional[Dict[str, Any]]:
+        """Claim a key; returns None when claimed, otherwise the record holding it"""
+        from botocore.exceptions import ClientError
+        try:
+            self.table.put_item(
+                Item={'idempotencyKey': key, 'fingerprint': fingerprint, 'status': 'in_progress',
+                      'expiresAt': int(now + lock_seconds)},
+                ConditionExpression='attribute_not_exists(idempotencyKey) OR expiresAt < :now',
+                ExpressionAttributeValues={':now': int(now)},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return None
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            # The resource layer leaves this item in DynamoDB's wire format ({'S': ...})
+            item = e.response.get('Item')
+            if item is not None:
+                from boto3.dynamodb.types import TypeDeserializer
+                deserializer = TypeDeserializer()
+                item = {name: deserializer.deserialize(value) for name, value in item.items()}
+            else:
+                item = self.table.get_item(Key={'idempotencyKey': key}, ConsistentRead=True).get('Item') or {}
+        return {
+            'fingerprint': item.get('fingerprint'),
+            'status': item.get('status'),
+            'response': json.loads(item['response']) if item.get('response') else None,
+        }
+
+    def complete(self, key: str, fingerprint: str, response: Dict[str, Any], expires_at: float) -> None:
+        self.table.put_item(Item={
+            'idempotencyKey': key,
+            'fingerprint': fingerprint,
+            'status': 'completed',
+            'response': json.dumps(response),
+            'expiresAt': int(expires_at)
+        })
+
+    def release(self, key: str) -> None:
+        self.table.delete_item(Key={'idempotencyKey': key})
+
+class InMemoryIdempotencyStore:
+    """Local stand-in for the idempotency table"""
+
+    def __init__(self):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, fingerprint: str, now: float, lock_seconds: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self.items.get(key)
+            if item is not None and item['expiresAt'] >= now:
+                return dict(item)
+            self.items[key] = {'fingerprint': fingerprint, 'status': 'in_progress', 'response': None,
+                               'expiresAt': now + lock_seconds}
+            return None
+
+    def complete(self, key: str, fingerprint: str, response: Dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            self.items[key] = {'fingerprint': fingerprint, 'status': 'completed', 'response': dict(response),
+                               'expiresAt': expires_at}
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self.items.pop(key, None)
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution whose result they all share"""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Result of fn() and whether it was shared from a call already in flight"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+class Idempotency:
+    """`Idempotency-Key` handling plus in-process single-flight for generation endpoints.
+
+    Concurrent identical requests in one container (same method, path and body,
+    and same key when one is sent) share a single handler run. With a key and a
+    store, the first successful response is kept for `ttl_seconds` and replayed
+    for every retry; a retry while the original is still running gets 409, and
+    reusing a key for a different request gets 422. Error and fallback responses
+    release the key so the client can retry. The store is best-effort: when it
+    fails the request runs as if no key had been sent.
+    """
+
+    def __init__(self, store: Optional[Any], ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 lock_seconds: int = DEFAULT_LOCK_SECONDS):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self.flights = SingleFlight()
+        self.counters = {'executed': 0, 'collapsed': 0, 'replayed': 0, 'inProgress': 0, 'mismatched': 0,
+                         'stored': 0, 'storeErrors': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def handle(self, event: Dict[str, Any], context: Any, handler: Handler) -> Dict[str, Any]:
+        key = request_header(event, IDEMPOTENCY_HEADER)
+        if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+            return error_response(400, f'Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters')
+        fingerprint = request_fingerprint(event)
+        flight_key = f'{fingerprint}#{key}' if key else fingerprint
+        response, shared = self.flights.do(flight_key, lambda: self._execute(event, context, handler, key, fingerprint))
+        if shared and not isinstance(response.get('body'), str):
+            # A streamed body can only be sent once, so this request runs on its own
+            self._count('executed')
+            return handler(event, context)
+        if shared:
+            self._count('collapsed')
+            return copy_response(response, {REPLAYED_HEADER: 'true'})
+        return copy_response(response)
+
+    def _execute(self, event: Dict[str, Any], context: Any, handler: Handler, key: Optional[str],
+                 fingerprint: str) -> Dict[str, Any]:
+        if not key or self.store is None:
+            self._count('executed')
+            return handler(event, context)
+
+        http = event['requestContext']['http']
+        record_key = f"{http['method']} {http['path']}#{key}"
+        try:
+            existing = self.store.claim(record_key, fingerprint, time.time(), self.lock_seconds)
+        except Exception:
+            self._count('storeErrors')
+            self._count('executed')
+            return handler(event, context)
+
+        if existing is not None:
+            if existing.get('fingerprint') != fingerprint:
+                self._count('mismatched')
+                return error_response(422, 'Idempotency-Key was already used for a different request')
+            if existing.get('status') == 'completed' and existing.get('response'):
+                self._count('replayed')
+                return copy_response(existing['response'], {REPLAYED_HEADER: 'true'})
+            self._count('inProgress')
+            return respond(409, {'success': False, 'error': 'A request with this Idempotency-Key is in progress'},
+                           {'Retry-After': '1'})
+
+        self._count('executed')
+        try:
+            response = handler(event, context)
+        except BaseException:
+            self._release(record_key)
+            raise
+        # Streamed bodies are produced while they are sent, so there is nothing to keep
+        keep = (200 <= response.get('statusCode', 500) < 300 and isinstance(response.get('body'), str)
+                and not is_fallback(response) and len(response['body']) <= MAX_STORED_BODY_BYTES)
+        if not keep:
+            self._release(record_key)
+            return response
+        try:
+            self.store.complete(record_key, fingerprint, response, time.time() + self.ttl_seconds)
+            self._count('stored')
+        except Exception:
+            self._count('storeErrors')
+        return response
+
+    def _release(self, record_key: str) -> None:
+        try:
+            self.store.release(record_key)
+        except Exception:
+            self._count('storeErrors')
+
+def build_idempotency() -> Idempotency:
+    """Build idempotency handling from environment configuration; without a table only single-flight applies"""
+    store = None
+    table_name = os.environ.get('IDEMPOTENCY_TABLE')
+    if table_name:
+        import boto3
+        store = DynamoDBIdempotencyStore(traced(boto3.resource('dynamodb').Table(table_name), 'dynamodb',
+                                                table=table_name))
+    elif os.environ.get('IDEMPOTENCY_LOCAL', '').lower() in ('1', 'true', 'yes'):
+        store = InMemoryIdempotencyStore()
+    return Idempotency(
+        store,
+        ttl_seconds=int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', DEFAULT_TTL_SECONDS)),
+        lock_seconds=int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', DEFAULT_LOCK_SECONDS))
+    )
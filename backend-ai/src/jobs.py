@@ -0,0 +1,364 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Callable
+from tracing import traced
+
+# Defaults, overridable through the Lambda environment
+DEFAULT_JOB_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_WAIT_SECONDS = 20
+# Matches the worker function timeout; a job running longer than this is assumed lost and may be retried
+DEFAULT_RUN_LEASE_SECONDS = 300
+DEFAULT_WORKER_CONCURRENCY = 4
+DEFAULT_LOCAL_BATCH_SIZE = 10
+LOCAL_MAX_RECEIVES = 3
+# DynamoDB items are capped at 400 KB; larger results fail the job rather than the write
+MAX_RESULT_BYTES = 350 * 1024
+
+TERMINAL_STATUSES = ('succeeded', 'failed')
+# Request parts the worker needs to replay a request; async markers and idempotency keys are dropped,
+# as are the negotiation headers, so stored results are plain JSON rather than an encoded or 304 response
+DROPPED_HEADERS = ('prefer', 'idempotency-key', 'accept-encoding', 'if-none-match')
+
+Execute = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+def wants_async(event: Dict[str, Any]) -> bool:
+    """Async mode is requested with `Prefer: respond-async` or `?async=true`"""
+    prefer = next((value for key, value in (event.get('headers') or {}).items() if key.lower() == 'prefer'), '')
+    if 'respond-async' in prefer.lower():
+        return True
+    return str((event.get('queryStringParameters') or {}).get('async', '')).lower() in ('1', 'true', 'yes')
+
+def job_request(event: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of an API Gateway event a worker replays, minus the async markers"""
+    http = event['requestContext']['http']
+    query = {key: value for key, value in (event.get('queryStringParameters') or {}).items() if key != 'async'}
+    return {
+        'method': http['method'],
+        'path': http['path'],
+        'headers': {key: value for key, value in (event.get('headers') or {}).items()
+                    if key.lower() not in DROPPED_HEADERS},
+        'queryStringParameters': query,
+        'body': event.get('body'),
+        'isBase64Encoded': bool(event.get('isBase64Encoded')),
+    }
+
+def job_event(job_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """API Gateway v2 event for a queued request"""
+    return {
+        'version': '2.0',
+        'rawPath': request['path'],
+        'headers': dict(request.get('headers') or {}),
+        'queryStringParameters': dict(request.get('queryStringParameters') or {}),
+        'requestContext': {'http': {'method': request['method'], 'path': request['path']}, 'requestId': job_id},
+        'body': request.get('body'),
+        'isBase64Encoded': request.get('isBase64Encoded', False),
+    }
+
+def public_job(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Client view of a job: status, timestamps and, once finished, the handler's status code and result"""
+    job = {
+        'jobId': record['jobId'],
+        'status': record['status'],
+        'route': record.get('route'),
+        'statusUrl': f"/jobs/{record['jobId']}",
+        'createdAt': record.get('createdAt'),
+    }
+    for key in ('startedAt', 'finishedAt', 'statusCode', 'error'):
+        if record.get(key) is not None:
+            job[key] = record[key]
+    response = record.get('response')
+    if response is not None:
+        body = response.get('body') or ''
+        try:
+            job['result'] = json.loads(body) if response.get('headers', {}).get('Content-Type', '').startswith(
+                'application/json') else body
+        except ValueError:
+            job['result'] = body
+    return job
+
+class LocalContext:
+    """Lambda-style context giving a local worker the same time budget as the worker function"""
+
+    def __init__(self, timeout_seconds: float):
+        self.deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+class DynamoDBJobStore:
+    """Jobs keyed by `jobId`; `expiresAt` is the table TTL attribute"""
+
+    def __init__(self, table: Any):
+        self.table = table
+
+    def create(self, record: Dict[str, Any]) -> None:
+        self.table.put_item(Item={**record, 'request': json.dumps(record['request'])},
+                            ConditionExpression='attribute_not_exists(jobId)')
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        item = self.table.get_item(Key={'jobId': job_id}, ConsistentRead=True).get('Item')
+        if not item:
+            return None
+        record = dict(item)
+        for key in ('createdAt', 'startedAt', 'finishedAt', 'statusCode', 'leaseUntil', 'expiresAt'):
+            if record.get(key) is not None:
+                record[key] = int(record[key])
+        for key in ('request', 'response'):
+            record[key] = json.loads(record[key]) if record.get(key) else None
+        record['error'] = record.get('error') or None
+        return record
+
+    def start(self, job_id: str, now: float, lease_seconds: int) -> bool:
+        """Move a queued job (or one whose run lease expired) to running; False when another run owns it"""
+        from botocore.exceptions import ClientError
+        try:
+            self.table.update_item(
+                Key={'jobId': job_id},
+                UpdateExpression='SET #status = :running, startedAt = :now, leaseUntil = :until',
+                ConditionExpression='#status = :queued OR #status = :running AND leaseUntil < :now',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':running': 'running', ':queued': 'queued', ':now': int(now),
+                                           ':until': int(now + lease_seconds)}
+            )
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def finish(self, job_id: str, status: str, response: Optional[Dict[str, Any]], error: Optional[str],
+               now: float, expires_at: float) -> None:
+        values = {':status': status, ':now': int(now), ':expires': int(expires_at),
+                  ':code': response['statusCode'] if response else 500,
+                  ':response': json.dumps(response) if response else '', ':error': error or ''}
+        self.table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression='SET #status = :status, finishedAt = :now, expiresAt = :expires, statusCode = :code, '
+                             '#response = :response, #error = :error',
+            ExpressionAttributeNames={'#status': 'status', '#response': 'response', '#error': 'error'},
+            ExpressionAttributeValues=values
+        )
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Poll until the job finishes or `timeout` passes"""
+        deadline = time.monotonic() + timeout
+        interval = 0.2
+        while True:
+            record = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if record is None or record['status'] in TERMINAL_STATUSES or remaining <= 0:
+                return record
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, 1.0)
+
+class InMemoryJobStore:
+    """Local stand-in for the jobs table; waiters are woken when a job finishes"""
+
+    def __init__(self):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._changed = threading.Condition()
+
+    def create(self, record: Dict[str, Any]) -> None:
+        with self._changed:
+            if record['jobId'] in self.items:
+                raise ValueError(f"Job {record['jobId']} already exists")
+            self.items[record['jobId']] = dict(record)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._changed:
+            record = self.items.get(job_id)
+            return dict(record) if record else None
+
+    def start(self, job_id: str, now: float, lease_seconds: int) -> bool:
+        with self._changed:
+            record = self.items.get(job_id)
+            if record is None or not (record['status'] == 'queued' or
+                                      (record['status'] == 'running' and record.get('leaseUntil', 0) < now)):
+                return False
+            record.update(status='running', startedAt=int(now), leaseUntil=int(now + lease_seconds))
+            return True
+
+    def finish(self, job_id: str, status: str, response: Optional[Dict[str, Any]], error: Optional[str],
+               now: float, expires_at: float) -> None:
+        with self._changed:
+            self.items[job_id].update(status=status, finishedAt=int(now), expiresAt=int(expires_at),
+                                      statusCode=response['statusCode'] if response else 500,
+                                      response=response, error=error or None)
+            self._changed.notify_all()
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                record = self.items.get(job_id)
+                remaining = deadline - time.monotonic()
+                if record is None or record['status'] in TERMINAL_STATUSES or remaining <= 0:
+                    return dict(record) if record else None
+                self._changed.wait(remaining)
+
+class SQSJobQueue:
+    """Job ids sent to the SQS queue that triggers the worker function"""
+
+    def __init__(self, client: Any, queue_url: str):
+        self.client = client
+        self.queue_url = queue_url
+
+    def send(self, job_id: str) -> None:
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps({'jobId': job_id}))
+
+class LocalJobQueue:
+    """In-process queue for local runs: worker threads take up to `batch_size` job ids at a time
+    and hand them to `consume(job_ids, context)`, which returns the ids to retry"""
+
+    def __init__(self, consume: Callable[[List[str], Any], List[str]], workers: int = 1,
+                 batch_size: int = DEFAULT_LOCAL_BATCH_SIZE, timeout_seconds: float = DEFAULT_RUN_LEASE_SECONDS):
+        self.consume = consume
+        self.workers = workers
+        self.batch_size = batch_size
+        self.timeout_seconds = timeout_seconds
+        self.pending: 'queue.Queue[str]' = queue.Queue()
+        self.receives: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def send(self, job_id: str) -> None:
+        self._start()
+        self.pending.put(job_id)
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'job-worker-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                retry = self.consume(batch, LocalContext(self.timeout_seconds))
+            except Exception:
+                retry = batch
+            for job_id in retry:
+                self.receives[job_id] = self.receives.get(job_id, 1) + 1
+                if self.receives[job_id] <= LOCAL_MAX_RECEIVES:
+                    self.pending.put(job_id)
+
+class JobService:
+    """Asynchronous requests: `submit` records a queued job and enqueues its id, the worker side
+    (`run_batch`) replays the stored request through the handler and records the response.
+
+    A job is started at most once per run lease, so a redelivered message for a job that is
+    running or finished is acknowledged without running it again.
+    """
+
+    def __init__(self, store: Any, queue: Any, ttl_seconds: int = DEFAULT_JOB_TTL_SECONDS,
+                 max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+                 lease_seconds: int = DEFAULT_RUN_LEASE_SECONDS,
+                 concurrency: int = DEFAULT_WORKER_CONCURRENCY):
+        self.store = store
+        self.queue = queue
+        self.ttl_seconds = ttl_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.lease_seconds = lease_seconds
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+        self.counters = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'skipped': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def submit(self, request: Dict[str, Any], route: str) -> Dict[str, Any]:
+        now = time.time()
+        record = {
+            'jobId': 'job-' + uuid.uuid4().hex,
+            'status': 'queued',
+            'route': route,
+            'request': request,
+            'createdAt': int(now),
+            'expiresAt': int(now + self.ttl_seconds),
+        }
+        self.store.create(record)
+        try:
+            self.queue.send(record['jobId'])
+        except Exception as e:
+            self.store.finish(record['jobId'], 'failed', None, f'Could not queue job: {e}', now, record['expiresAt'])
+            raise
+        self._count('submitted')
+        return public_job(record)
+
+    def get(self, job_id: str, wait_seconds: float = 0) -> Optional[Dict[str, Any]]:
+        wait_seconds = min(max(0.0, wait_seconds), self.max_wait_seconds)
+        record = self.store.wait(job_id, wait_seconds) if wait_seconds else self.store.get(job_id)
+        return public_job(record) if record else None
+
+    def run(self, job_id: str, execute: Execute, context: Any) -> None:
+        """Run one job; raises only when the job should be retried"""
+        now = time.time()
+        if not self.store.start(job_id, now, self.lease_seconds):
+            self._count('skipped')
+            return
+        record = self.store.get(job_id)
+        try:
+            response = execute(job_event(job_id, record['request']), context)
+        except Exception as e:
+            response, error = None, str(e)
+        else:
+            error = None
+            if len(response.get('body') or '') > MAX_RESULT_BYTES:
+                response, error = None, 'Result too large for an asynchronous job; use the synchronous endpoint'
+        status = 'succeeded' if response is not None and 200 <= response['statusCode'] < 300 else 'failed'
+        finished = time.time()
+        self.store.finish(job_id, status, response, error, finished, finished + self.ttl_seconds)
+        self._count(status)
+
+    def run_batch(self, job_ids: List[str], execute: Execute, context: Any) -> List[str]:
+        """Run a batch of jobs concurrently; returns the ids whose runs could not be recorded"""
+        futures = {job_id: self.executor.submit(self.run, job_id, execute, context) for job_id in job_ids}
+        wait(futures.values())
+        failed = [job_id for job_id, future in futures.items() if future.exception() is not None]
+        for _ in failed:
+            self._count('errors')
+        return failed
+
+def build_job_service(consume: Callable[[List[str], Any], List[str]]) -> Optional[JobService]:
+    """Build the job service from environment configuration; None when no job store is configured.
+    `consume` runs job batches for the in-process queue used when no SQS queue is set."""
+    lease_seconds = int(os.environ.get('JOBS_RUN_LEASE_SECONDS', DEFAULT_RUN_LEASE_SECONDS))
+    table_name = os.environ.get('JOBS_TABLE')
+    if table_name:
+        import boto3
+        store = DynamoDBJobStore(traced(boto3.resource('dynamodb').Table(table_name), 'dynamodb', table=table_name))
+    elif os.environ.get('JOBS_LOCAL', '').lower() in ('1', 'true', 'yes'):
+        store = InMemoryJobStore()
+    else:
+        return None
+
+    queue_url = os.environ.get('JOBS_QUEUE_URL')
+    if queue_url:
+        import boto3
+        job_queue: Any = SQSJobQueue(traced(boto3.client('sqs'), 'sqs'), queue_url)
+    else:
+        job_queue = LocalJobQueue(consume, workers=int(os.environ.get('JOBS_LOCAL_WORKERS', '1')),
+                                  batch_size=int(os.environ.get('JOBS_BATCH_SIZE', DEFAULT_LOCAL_BATCH_SIZE)),
+                                  timeout_seconds=lease_seconds)
+    return JobService(
+        store, job_queue,
+        ttl_seconds=int(os.environ.get('JOBS_TTL_SECONDS', DEFAULT_JOB_TTL_SECONDS)),
+        max_wait_seconds=float(os.environ.get('JOBS_MAX_WAIT_SECONDS', DEFAULT_MAX_WAIT_SECONDS)),
+        lease_seconds=lease_seconds,
+        concurrency=int(os.environ.get('JOBS_WORKER_CONCURRENCY', DEFAULT_WORKER_CONCURRENCY))
+    )
@@ -0,0 +1,227 @@
+import time
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+PLATFORMS = ['Facebook', 'Instagram', 'Google Ads', 'TikTok']
+
+# Per-platform planning parameters; any of them can be overridden per campaign.
+#   cpm       cost per 1000 impressions
+#   audience  reachable local audience; reach saturates as impressions approach it
+#   weight    value of one reached person relative to Facebook
+#   minShare / maxShare  bounds on the platform's share of the budget
+#   postCost  budget that funds one scheduled post (boosting, creative)
+#   postHour  preferred posting hour, clamped into the working-hours window
+DEFAULT_PLATFORM_PARAMS: Dict[str, Dict[str, float]] = {
+    'Facebook': {'cpm': 8.0, 'audience': 60000, 'weight': 1.0, 'minShare': 0.1, 'maxShare': 0.6,
+                 'postCost': 20.0, 'postHour': 10.0},
+    'Instagram': {'cpm': 9.0, 'audience': 45000, 'weight': 1.1, 'minShare': 0.1, 'maxShare': 0.6,
+                  'postCost': 20.0, 'postHour': 14.0},
+    'Google Ads': {'cpm': 15.0, 'audience': 25000, 'weight': 1.6, 'minShare': 0.05, 'maxShare': 0.5,
+                   'postCost': 40.0, 'postHour': 9.0},
+    'TikTok': {'cpm': 6.0, 'audience': 30000, 'weight': 0.8, 'minShare': 0.0, 'maxShare': 0.4,
+               'postCost': 15.0, 'postHour': 18.0},
+}
+PARAM_NAMES = ['cpm', 'audience', 'weight', 'minShare', 'maxShare', 'postCost', 'postHour']
+
+DEFAULT_DAYS = 14
+MAX_DAYS = 90
+MAX_POSTS_PER_DAY = 2
+DEFAULT_WORKING_HOURS = {'start': '09:00', 'end': '17:00'}
+BISECTION_STEPS = 60
+# Campaigns planned per vectorized pass; the deadline is checked between passes
+PLAN_CHUNK_SIZE = 1000
+
+CONTENT_THEMES = [
+    'Quality service at {name}',
+    'Behind the scenes at {name}',
+    'Customer spotlight: why locals choose {name}',
+    'Limited-time offer from {name}',
+    'Tips from the {name} team',
+]
+
+def parse_minutes(value: str) -> int:
+    """'HH:MM' -> minutes after midnight"""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+def format_minutes(minutes: int) -> str:
+    minutes %= 24 * 60
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+# 'HH:MM' label for every minute of the day; schedules reference hundreds of thousands of slots
+TIME_LABELS = [format_minutes(minute) for minute in range(24 * 60)]
+
+def normalize_campaign(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate one campaign's planning inputs; raises ValueError on bad input"""
+    if not isinstance(body, dict):
+        raise ValueError('campaign must be an object')
+    budget = float(body.get('budget', 300))
+    if not budget > 0:
+        raise ValueError('budget must be positive')
+    days = int(body.get('days', DEFAULT_DAYS))
+    if not 1 <= days <= MAX_DAYS:
+        raise ValueError(f'days must be between 1 and {MAX_DAYS}')
+
+    hours = body.get('workingHours') or DEFAULT_WORKING_HOURS
+    start, end = parse_minutes(hours.get('start', '09:00')), parse_minutes(hours.get('end', '17:00'))
+    if end <= start:
+        # Overnight window, e.g. 18:00-02:00
+        end += 24 * 60
+
+    overrides = {entry['platform']: entry for entry in body.get('platforms') or [] if isinstance(entry, dict)}
+    unknown = set(overrides) - set(PLATFORMS)
+    if unknown:
+        raise ValueError(f"Unknown platform: {', '.join(sorted(unknown))}")
+    params = [
+        [float(overrides.get(platform, {}).get(name, DEFAULT_PLATFORM_PARAMS[platform][name])) for name in PARAM_NAMES]
+        for platform in PLATFORMS
+    ]
+    return {
+        'campaignId': body.get('campaignId', 'campaign-1'),
+        'businessName': body.get('businessName', 'Your Business'),
+        'budget': budget,
+        'days': days,
+        'start': start,
+        'end': end,
+        'params': params,
+    }
+
+def allocate_budgets(budgets: np.ndarray, cpm: np.ndarray, audience: np.ndarray, weight: np.ndarray,
+                     low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Maximize weighted reach per campaign subject to sum(spend) == budget and low <= spend <= high.
+
+    Reach on a platform saturates with spend: audience * (1 - exp(-spend / s)) with
+    s = cpm * audience / 1000. The objective is concave and separable, so the optimum
+    equalizes marginal reach (a water level `lam`) across platforms that are not at a
+    bound. The level is found by bisection on log(lam) for every campaign at once.
+    Arrays are (campaigns, platforms); budgets is (campaigns,).
+    """
+    scale = cpm * audience / 1000.0
+    gain = weight * 1000.0 / cpm  # marginal weighted reach at zero spend
+
+    def spend_at(log_lam: np.ndarray) -> np.ndarray:
+        return np.clip(scale * (np.log(gain) - log_lam[:, None]), low, high)
+
+    # Marginal values at the bounds bracket the water level
+    log_hi = np.max(np.log(gain) - low / scale, axis=1) + 1.0
+    log_lo = np.min(np.log(gain) - high / scale, axis=1) - 1.0
+    for _ in range(BISECTION_STEPS):
+        mid = (log_lo + log_hi) / 2
+        over = spend_at(mid).sum(axis=1) > budgets
+        log_lo = np.where(over, mid, log_lo)
+        log_hi = np.where(over, log_hi, mid)
+    return spend_at((log_lo + log_hi) / 2)
+
+def feasible_bounds(budgets: np.ndarray, min_share: np.ndarray, max_share: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Spend bounds from share bounds, relaxed where they can't add up to the budget"""
+    low = min_share * budgets[:, None]
+    high = np.maximum(max_share, min_share) * budgets[:, None]
+    low_total = low.sum(axis=1, keepdims=True)
+    low = np.where(low_total > budgets[:, None], low * budgets[:, None] / low_total, low)
+    high_total = high.sum(axis=1, keepdims=True)
+    high = np.where(high_total < budgets[:, None], high * budgets[:, None] / np.maximum(high_total, 1e-9), high)
+    return low, high
+
+def round_amounts(spend: np.ndarray, budgets: np.ndarray) -> np.ndarray:
+    """Whole-unit amounts that add up to floor(budget), by largest remainder"""
+    floors = np.floor(spend)
+    shortfall = (np.floor(budgets) - floors.sum(axis=1)).astype(int)
+    order = np.argsort(-(spend - floors), axis=1)
+    ranks = np.argsort(order, axis=1)
+    return (floors + (ranks < shortfall[:, None])).astype(int)
+
+def expected_reach(spend: np.ndarray, cpm: np.ndarray, audience: np.ndarray) -> np.ndarray:
+    return audience * (1 - np.exp(-spend * 1000.0 / (cpm * audience)))
+
+def build_posts(amounts: np.ndarray, post_cost: np.ndarray, post_hour: np.ndarray, days: np.ndarray,
+                start: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Posting slots for every campaign as flat arrays (campaign, platform, day, minute, sequence).
+
+    Each funded platform gets amount / postCost posts (at least one, at most
+    MAX_POSTS_PER_DAY a day) spread evenly over the horizon at the platform's
+    preferred hour, clamped into the working-hours window. A second post on the
+    same day goes half a window later.
+    """
+    campaigns, platforms = amounts.shape
+    counts = np.where(amounts > 0, np.maximum(1, np.round(amounts / post_cost)), 0)
+    counts = np.minimum(counts, days[:, None] * MAX_POSTS_PER_DAY).astype(int).ravel()
+
+    pair = np.repeat(np.arange(campaigns * platforms), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    sequence = np.arange(len(pair)) - first
+    campaign = pair // platforms
+    platform = pair % platforms
+    n = counts[pair]
+    day = ((sequence + 0.5) * days[campaign] / n).astype(int)
+
+    window_start, window_end = start[campaign], end[campaign]
+    last_slot = np.maximum(window_start, window_end - 30)
+    preferred = post_hour.ravel()[pair] * 60
+    # Overnight windows run past midnight, so early hours belong to the next calendar day
+    preferred = np.where(preferred < window_start, preferred + 24 * 60, preferred)
+    # A preferred hour outside the window maps to the same relative point of the day inside it
+    spread = window_start + (preferred % (24 * 60)) / (24 * 60) * (last_slot - window_start)
+    base = np.where(preferred <= last_slot, preferred, spread) // 15 * 15
+    repeat = np.concatenate([[False], (day[1:] == day[:-1]) & (pair[1:] == pair[:-1])])
+    half_window = (window_end - window_start) // 2
+    later = window_start + (base - window_start + half_window) % np.maximum(last_slot - window_start, 1)
+    minute = (np.where(repeat, later, base).astype(int)) % (24 * 60)
+    return campaign, platform, day, minute, sequence
+
+def plan_chunk(campaigns: List[Dict[str, Any]], start_date: date) -> List[Dict[str, Any]]:
+    """Plan normalized campaigns in one vectorized pass"""
+    budgets = np.array([c['budget'] for c in campaigns])
+    params = np.array([c['params'] for c in campaigns])  # (campaigns, platforms, PARAM_NAMES)
+    cpm, audience, weight, min_share, max_share, post_cost, post_hour = (
+        params[:, :, index] for index in range(len(PARAM_NAMES))
+    )
+    days = np.array([c['days'] for c in campaigns])
+    start = np.array([c['start'] for c in campaigns])
+    end = np.array([c['end'] for c in campaigns])
+
+    low, high = feasible_bounds(budgets, min_share, max_share)
+    spend = allocate_budgets(budgets, cpm, audience, weight, low, high)
+    amounts = round_amounts(spend, budgets)
+    reach = np.round(expected_reach(amounts, cpm, audience)).astype(int)
+    campaign_index, platform_index, day, minute, sequence = build_posts(amounts, post_cost, post_hour, days, start, end)
+
+    # Posts are ordered by wall-clock time within each day; overnight slots sort after the evening ones
+    local_minute = minute + np.where(minute < start[campaign_index], 24 * 60, 0)
+    order = np.lexsort((local_minute, day, campaign_index))
+    dates = [(start_date + timedelta(days=offset)).isoformat() for offset in range(int(days.max()))]
+    schedules: List[List[Dict[str, Any]]] = [
+        [{'date': dates[offset], 'posts': []} for offset in range(c['days'])] for c in campaigns
+    ]
+    themes = [[theme.format(name=c['businessName']) for theme in CONTENT_THEMES] for c in campaigns]
+    for c, p, d, m, k in zip(campaign_index[order].tolist(), platform_index[order].tolist(), day[order].tolist(),
+                             minute[order].tolist(), (sequence[order] % len(CONTENT_THEMES)).tolist()):
+        schedules[c][d]['posts'].append({'platform': PLATFORMS[p], 'content': themes[c][k], 'time': TIME_LABELS[m]})
+
+    totals = np.maximum(amounts.sum(axis=1, keepdims=True), 1)
+    percentages = np.round(amounts * 100 / totals).astype(int).tolist()
+    amounts_list, reach_list = amounts.tolist(), reach.tolist()
+    return [
+        {
+            'budgetAllocation': [
+                {'platform': platform, 'amount': amounts_list[i][j], 'percentage': percentages[i][j],
+                 'expectedReach': reach_list[i][j]}
+                for j, platform in enumerate(PLATFORMS)
+            ],
+            'expectedReach': sum(reach_list[i]),
+            'schedule': schedules[i],
+        }
+        for i in range(len(campaigns))
+    ]
+
+def plan_campaigns(campaigns: List[Dict[str, Any]], start_date: date,
+                   deadline: Optional[float] = None) -> List[Optional[Dict[str, Any]]]:
+    """Plan normalized campaigns in chunks; campaigns left when `deadline` (time.monotonic) passes are None"""
+    plans: List[Optional[Dict[str, Any]]] = [None] * len(campaigns)
+    for offset in range(0, len(campaigns), PLAN_CHUNK_SIZE):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        chunk = campaigns[offset:offset + PLAN_CHUNK_SIZE]
+        plans[offset:offset + len(chunk)] = plan_chunk(chunk, start_date)
+    return plans
@@ -0,0 +1,179 @@
+import json
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from tracing import traced
+
+# Defaults, overridable through the Lambda environment
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 512
+
+def make_cache_key(model_id: str, prompt: str, params: Dict[str, Any]) -> str:
+    """Content-addressed key over the model id, rendered prompt and generation parameters"""
+    payload = json.dumps(
+        {'model': model_id, 'prompt': prompt, 'params': params},
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LRUCache:
+    """In-process LRU tier; lives in module scope so it survives warm invocations"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class DynamoDBCacheStore:
+    """Shared persistent tier backed by a DynamoDB table with TTL enabled on `expiresAt`"""
+
+    def __init__(self, table: Any):
+        self.table = table
+
+    def get(self, key: str) -> Optional[tuple]:
+        response = self.table.get_item(Key={'cacheKey': key})
+        item = response.get('Item')
+        if not item:
+            return None
+        # DynamoDB TTL deletion is lazy, so expiry is checked on read as well
+        expires_at = float(item['expiresAt'])
+        if expires_at <= time.time():
+            return None
+        return item['response'], expires_at
+
+    def put(self, key: str, value: str, expires_at: float) -> None:
+        self.table.put_item(Item={
+            'cacheKey': key,
+            'response': value,
+            'expiresAt': int(expires_at)
+        })
+
+class SQLiteCacheStore:
+    """Local stand-in for the persistent tier (file or :memory:), used for local runs and tests"""
+
+    def __init__(self, path: str = ':memory:'):
+        import sqlite3
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache '
+                '(cache_key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, expires_at FROM response_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0], row[1]
+
+    def put(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO response_cache (cache_key, response, expires_at) VALUES (?, ?, ?)',
+                (key, value, expires_at)
+            )
+            self._conn.commit()
+
+class ResponseCache:
+    """Two-tier model response cache: in-process LRU in front of an optional shared store"""
+
+    def __init__(self, memory: LRUCache, store: Any = None, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.memory = memory
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.counters = {'memoryHits': 0, 'storeHits': 0, 'misses': 0, 'storeErrors': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memoryHits')
+            return value
+
+        if self.store is not None:
+            try:
+                entry = self.store.get(key)
+            except Exception:
+                # The shared tier is best-effort; an outage must not fail generation
+                entry = None
+                self._count('storeErrors')
+            if entry is not None:
+                value, expires_at = entry
+                self.memory.put(key, value, expires_at)
+                self._count('storeHits')
+                return value
+
+        self._count('misses')
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.put(key, value, expires_at)
+        if self.store is not None:
+            try:
+                self.store.put(key, value, expires_at)
+            except Exception:
+                self._count('storeErrors')
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and hit rate since container start"""
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['memoryHits'] + stats['storeHits'] + stats['misses']
+        stats['hitRate'] = round((stats['memoryHits'] + stats['storeHits']) / lookups, 4) if lookups else 0.0
+        stats['memoryEntries'] = len(self.memory)
+        return stats
+
+def build_response_cache() -> Optional[ResponseCache]:
+    """Build the cache from environment configuration; returns None when disabled"""
+    if os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return None
+
+    ttl_seconds = int(os.environ.get('RESPONSE_CACHE_TTL', DEFAULT_TTL_SECONDS))
+    memory = LRUCache(int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)))
+
+    store = None
+    table_name = os.environ.get('RESPONSE_CACHE_TABLE')
+    local_path = os.environ.get('RESPONSE_CACHE_PATH')
+    if table_name:
+        import boto3
+        store = DynamoDBCacheStore(traced(boto3.resource('dynamodb').Table(table_name), 'dynamodb', table=table_name))
+    elif local_path:
+        store = SQLiteCacheStore(local_path)
+
+    return ResponseCache(memory, store, ttl_seconds)
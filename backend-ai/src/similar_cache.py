@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import random
+import re
+import string
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+from generation_profiles import PROFILES
+from tracing import count
+
+# Defaults, overridable through the Lambda environment
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_TTL_SECONDS = 24 * 3600
+# MinHash signatures of NUM_PERMUTATIONS values, indexed as BANDS bands of ROWS values; two prompts
+# with similarity 0.8 share a band with probability ~0.9999, at 0.3 with ~0.12
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_CHARS = 4
+# Shorter entity values could match inside ordinary words, so prompts carrying them are not indexed
+MIN_ENTITY_CHARS = 3
+LATENCY_SAMPLES = 1024
+
+_PRIME = (1 << 61) - 1
+# Fixed seed, so every container computes the same signatures
+_rng = random.Random(61)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+_NON_WORD = re.compile(r'[\W_]+')
+_SUFFIX = '_suffix'
+
+def template_pattern(template: str) -> 're.Pattern[str]':
+    """Regex that splits a prompt rendered from `template` into its slot values and any appended text"""
+    parts: List[str] = []
+    seen = set()
+    for literal, field, _, _ in string.Formatter().parse(template):
+        parts.append(re.escape(literal))
+        if field is None:
+            continue
+        parts.append(f'(?P={field})' if field in seen else f'(?P<{field}>.*?)')
+        seen.add(field)
+    return re.compile(''.join(parts) + f'(?P<{_SUFFIX}>.*)', re.DOTALL)
+
+def shingles(slots: Dict[str, str]) -> set:
+    """Character shingles of the normalized slot values, tagged with the slot name"""
+    result = set()
+    for name, value in slots.items():
+        text = ' ' + _NON_WORD.sub(' ', value.lower()).strip() + ' '
+        if len(text) <= SHINGLE_CHARS:
+            result.add(f'{name}:{text}')
+        result.update(f'{name}:{text[i:i + SHINGLE_CHARS]}' for i in range(len(text) - SHINGLE_CHARS + 1))
+    return result
+
+def minhash(features: set) -> Tuple[int, ...]:
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'big') for f in features]
+    if not hashes:
+        return (_PRIME,) * NUM_PERMUTATIONS
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(1 for a, b in zip(left, right) if a == b) / NUM_PERMUTATIONS
+
+def _placeholder(name: str, compact: bool) -> str:
+    return f"\x00{name}{'#' if compact else ''}\x00"
+
+def _compact(value: str) -> str:
+    return ''.join(value.split())
+
+def abstract_entities(text: str, entities: Dict[str, str]) -> str:
+    """Replace entity values (and their space-less hashtag form) in a completion with placeholders"""
+    for name, value in entities.items():
+        for variant, compact in ((value, False), (_compact(value), True)):
+            if compact and variant == value:
+                continue
+            text = re.sub(r'(?<!\w)' + re.escape(variant) + r'(?!\w)', _placeholder(name, compact), text)
+    return text
+
+def restore_entities(text: str, entities: Dict[str, str]) -> str:
+    for name, value in entities.items():
+        text = text.replace(_placeholder(name, False), value).replace(_placeholder(name, True), _compact(value))
+    return text
+
+class SimilarPromptCache:
+    """In-process near-duplicate completion cache for prompts rendered from profiled templates.
+
+    A prompt is split back into its template's slot values. Slots named in the
+    profile's `entitySlots` (the business name) are abstracted out of the stored
+    completion and filled back in with the requester's values on a hit; the
+    `similarSlots` (goal, audience) are compared by MinHash over character
+    shingles; every other slot, the appended instructions, the model and the
+    generation parameters must match exactly. A lookup returns the most similar
+    live entry at or above `threshold`. Entries are kept LRU up to `max_entries`.
+    """
+
+    def __init__(self, templates: Dict[str, str], threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.patterns = [(name, template_pattern(template)) for name, template in templates.items()
+                         if PROFILES.get(name, {}).get('similarSlots')]
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # entry id -> (bucket, signature, completion with entity placeholders, expires_at)
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        # (bucket, band, band values) -> entry ids
+        self._bands: Dict[tuple, set] = {}
+        self._next_id = 0
+        self.counters = {'lookups': 0, 'hits': 0, 'misses': 0, 'unindexed': 0, 'evictions': 0}
+        self._latencies: 'deque[float]' = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def decompose(self, prompt: str) -> Optional[Tuple[str, Dict[str, str], str]]:
+        """(profile name, slot values, appended text) for a prompt rendered from an indexed template"""
+        for name, pattern in self.patterns:
+            match = pattern.fullmatch(prompt)
+            if match:
+                slots = match.groupdict()
+                return name, slots, slots.pop(_SUFFIX)
+        return None
+
+    def _index_key(self, model_id: str, params: Dict[str, Any],
+                   prompt: str) -> Optional[Tuple[str, Tuple[int, ...], Dict[str, str]]]:
+        """(exact-match bucket, signature, entity values), or None when the prompt cannot be indexed"""
+        parsed = self.decompose(prompt)
+        if parsed is None:
+            return None
+        name, slots, suffix = parsed
+        profile = PROFILES[name]
+        entities = {slot: slots[slot].strip() for slot in profile.get('entitySlots', []) if slot in slots}
+        others = [value.lower() for slot, value in slots.items() if slot not in entities]
+        for value in entities.values():
+            # A name that also appears in the other inputs ('Bakery' selling bakery goods) can't be
+            # swapped out of the completion safely
+            if len(value) < MIN_ENTITY_CHARS or any(value.lower() in other for other in others):
+                return None
+        similar = profile['similarSlots']
+        exact = sorted((slot, value) for slot, value in slots.items() if slot not in entities and slot not in similar)
+        bucket = hashlib.sha256(json.dumps([model_id, params, name, exact, suffix], sort_keys=True,
+                                           default=str).encode('utf-8')).hexdigest()
+        return bucket, minhash(shingles({slot: slots.get(slot, '') for slot in similar})), entities
+
+    @staticmethod
+    def _band_keys(bucket: str, signature: Tuple[int, ...]) -> List[tuple]:
+        return [(bucket, band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def get(self, model_id: str, params: Dict[str, Any], prompt: str) -> Optional[str]:
+        started = time.perf_counter()
+        key = self._index_key(model_id, params, prompt)
+        if key is None:
+            with self._lock:
+                self.counters['unindexed'] += 1
+            return None
+        bucket, signature, entities = key
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(bucket, signature):
+                candidates.update(self._bands.get(band_key, ()))
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                _, entry_signature, _, expires_at = self._entries[entry_id]
+                score = similarity(signature, entry_signature)
+                if expires_at > now and score > best_score:
+                    best_id, best_score = entry_id, score
+            text = None
+            if best_id is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_id)
+                text = self._entries[best_id][2]
+            self.counters['lookups'] += 1
+            self.counters['hits' if text is not None else 'misses'] += 1
+            self._latencies.append((time.perf_counter() - started) * 1000)
+        # Per-request EMF counters; the hit rate is SimilarCacheHits / (SimilarCacheHits + SimilarCacheMisses)
+        count('SimilarCacheHits' if text is not None else 'SimilarCacheMisses', 1)
+        return restore_entities(text, entities) if text is not None else None
+
+    def put(self, model_id: str, params: Dict[str, Any], prompt: str, text: str) -> None:
+        key = self._index_key(model_id, params, prompt)
+        if key is None:
+            return
+        bucket, signature, entities = key
+        stored = abstract_entities(text, entities)
+        evicted = 0
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (bucket, signature, stored, time.time() + self.ttl_seconds)
+            for band_key in self._band_keys(bucket, signature):
+                self._bands.setdefault(band_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict()
+                evicted += 1
+        if evicted:
+            count('SimilarCacheEvictions', evicted)
+
+    def _evict(self) -> None:
+        entry_id, (bucket, signature, _, _) = self._entries.popitem(last=False)
+        for band_key in self._band_keys(bucket, signature):
+            ids = self._bands.get(band_key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._bands[band_key]
+        self.counters['evictions'] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, hit rate over indexed lookups and lookup latency since container start"""
+        with self._lock:
+            stats = dict(self.counters)
+            latencies = sorted(self._latencies)
+            stats['entries'] = len(self._entries)
+        stats['hitRate'] = round(stats['hits'] / stats['lookups'], 4) if stats['lookups'] else 0.0
+        for label, fraction in (('lookupMsP50', 0.5), ('lookupMsP95', 0.95)):
+            stats[label] = round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))], 3) if latencies else None
+        return stats
+
+def build_similar_cache(templates: Dict[str, str]) -> Optional[SimilarPromptCache]:
+    """Build the near-duplicate cache from environment configuration; None when it or the response cache is disabled"""
+    for name in ('RESPONSE_CACHE_ENABLED', 'SIMILAR_CACHE_ENABLED'):
+        if os.environ.get(name, 'true').lower() in ('0', 'false', 'no'):
+            return None
+    return SimilarPromptCache(
+        templates,
+        threshold=float(os.environ.get('SIMILAR_CACHE_THRESHOLD', DEFAULT_THRESHOLD)),
+        max_entries=int(os.environ.get('SIMILAR_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+        ttl_seconds=int(os.environ.get('RESPONSE_CACHE_TTL', DEFAULT_TTL_SECONDS))
+    )
@@ -0,0 +1,287 @@
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from tracing import traced
+
+# Defaults, overridable through the Lambda environment
+DEFAULT_LINGER_MS = 50
+DEFAULT_MAX_PENDING = 10000
+# Longest the post-invoke flush waits for an invocation's queued writes
+DEFAULT_FLUSH_MS = 1000
+# Lambda allows an internal extension about this long between SIGTERM and shutdown
+SHUTDOWN_FLUSH_SECONDS = 0.3
+EXTENSION_NAME = 'write-behind-flush'
+# BatchWriteItem accepts at most 25 puts per call
+BATCH_SIZE = 25
+MAX_ATTEMPTS = 5
+BASE_RETRY_DELAY = 0.05
+# DynamoDB rejects items over 400 KB; leave room for attribute names and overhead
+MAX_ITEM_BYTES = 380 * 1024
+
+class WriteBehindWriter:
+    """Buffers DynamoDB puts and writes them from a background thread with BatchWriteItem.
+
+    put() only records the item in memory, so storing a result never adds a
+    DynamoDB round trip to the request that produced it. A daemon thread waits
+    up to `linger_seconds` for a full batch, then writes up to 25 items per
+    call (across tables) and retries unprocessed items with exponential backoff
+    and jitter, giving up after `max_attempts`. Puts to a key that is still
+    buffered replace the buffered item, so only the latest version is written
+    (BatchWriteItem also rejects two puts to one key in a call). Once
+    `max_pending` items are buffered, further puts are dropped and counted.
+
+    Buffered writes only progress while the process runs, and Lambda freezes
+    the container once an invocation ends, so on Lambda PostInvokeFlush
+    calls flush() with a bounded wait after each response is sent. flush()
+    skips the linger, so the wait is one BatchWriteItem round trip. A
+    long-running host (the self-hosted server) leaves the writes in the
+    background.
+
+    An item DynamoDB rejects as invalid fails the whole call. The batch is
+    then written item by item, so only that item is dropped; it is never
+    retried.
+    """
+
+    def __init__(self, dynamodb: Any, linger_seconds: float = DEFAULT_LINGER_MS / 1000,
+                 max_pending: int = DEFAULT_MAX_PENDING, max_attempts: int = MAX_ATTEMPTS):
+        self.dynamodb = dynamodb
+        self.linger_seconds = linger_seconds
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        # (table name, key) -> (item, attempts so far)
+        self._pending: 'OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], int]]' = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._changed = threading.Condition()
+        self._key_names: Dict[str, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        # Callers waiting in flush(); while there are any, batches don't linger
+        self._urgent = 0
+        self.counters = {'queued': 0, 'coalesced': 0, 'written': 0, 'batches': 0, 'retried': 0,
+                         'dropped': 0, 'oversized': 0}
+
+    def put(self, table_name: str, key_name: str, item: Dict[str, Any], size: Optional[int] = None) -> bool:
+        """Queue `item` for `table_name`, whose hash key is `key_name`; False when it was dropped
+        (buffer full, or `size` in bytes over the item limit)"""
+        if size is not None and size > MAX_ITEM_BYTES:
+            with self._changed:
+                self.counters['oversized'] += 1
+            return False
+        with self._changed:
+            self._key_names[table_name] = key_name
+            slot = (table_name, str(item[key_name]))
+            if slot in self._pending:
+                self.counters['coalesced'] += 1
+                del self._pending[slot]
+            elif len(self._pending) >= self.max_pending:
+                self.counters['dropped'] += 1
+                return False
+            self._pending[slot] = (item, 0)
+            self.counters['queued'] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+            self._changed.notify_all()
+        return True
+
+    def pending(self, table_name: str, key: str) -> Optional[Dict[str, Any]]:
+        """The buffered or in-flight item for a key, so readers see writes that haven't landed yet"""
+        with self._changed:
+            entry = self._pending.get((table_name, key))
+            if entry is not None:
+                return entry[0]
+            return self._inflight.get((table_name, key))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued put is written or given up on; False if `timeout` ran out first"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._changed:
+            self._urgent += 1
+            self._changed.notify_all()
+            try:
+                while self._pending or self._inflight:
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._changed.wait(remaining)
+            finally:
+                self._urgent -= 1
+        return True
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._changed:
+            return {**self.counters, 'pending': len(self._pending) + len(self._inflight)}
+
+    def _next_batch(self) -> List[Tuple[Tuple[str, str], Dict[str, Any], int]]:
+        with self._changed:
+            while not self._pending:
+                self._changed.wait()
+            linger_until = time.monotonic() + self.linger_seconds
+            while len(self._pending) < BATCH_SIZE and not self._urgent:
+                remaining = linger_until - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            batch = []
+            while self._pending and len(batch) < BATCH_SIZE:
+                slot, (item, attempts) = self._pending.popitem(last=False)
+                self._inflight[slot] = item
+                batch.append((slot, item, attempts))
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                failed, error = self._write(batch), None
+            except Exception as e:
+                if len(batch) > 1 and is_validation_error(e):
+                    # One invalid item fails the whole call; written singly, only that item is lost
+                    for entry in batch:
+                        self._write_single(entry)
+                    continue
+                # Throttling or a transient error: the whole batch is retried
+                failed, error = {slot for slot, _, _ in batch}, e
+            retry_attempts = max((attempts for slot, _, attempts in batch if slot in failed), default=0)
+            self._settle(batch, failed, error)
+            if failed and not is_validation_error(error):
+                time.sleep(random.uniform(0, BASE_RETRY_DELAY * (2 ** retry_attempts)))
+
+    def _write(self, batch: List[Tuple[Tuple[str, str], Dict[str, Any], int]]) -> set:
+        """BatchWriteItem for a batch; returns the slots DynamoDB left unprocessed"""
+        request: Dict[str, List[Dict[str, Any]]] = {}
+        for (table_name, _), item, _ in batch:
+            request.setdefault(table_name, []).append({'PutRequest': {'Item': item}})
+        response = self.dynamodb.batch_write_item(RequestItems=request)
+        # Unprocessed items come back as copies, so they are matched by key
+        return {(table_name, str(entry['PutRequest']['Item'][self._key_names[table_name]]))
+                for table_name, entries in (response.get('UnprocessedItems') or {}).items() for entry in entries}
+
+    def _write_single(self, entry: Tuple[Tuple[str, str], Dict[str, Any], int]) -> None:
+        try:
+            failed, error = self._write([entry]), None
+        except Exception as e:
+            failed, error = {entry[0]}, e
+        self._settle([entry], failed, error)
+
+    def _settle(self, batch: List[Tuple[Tuple[str, str], Dict[str, Any], int]], failed: set,
+                error: Optional[Exception]) -> None:
+        """Record a batch's outcome: requeue unprocessed items unless a newer put replaced them"""
+        with self._changed:
+            self.counters['batches'] += 1
+            for slot, item, attempts in batch:
+                if self._inflight.get(slot) is item:
+                    del self._inflight[slot]
+                if slot not in failed:
+                    self.counters['written'] += 1
+                elif slot in self._pending:
+                    # A newer version of the item is already queued
+                    continue
+                elif attempts + 1 < self.max_attempts and not is_validation_error(error):
+                    self._pending[slot] = (item, attempts + 1)
+                    self._pending.move_to_end(slot, last=False)
+                    self.counters['retried'] += 1
+                else:
+                    self.counters['dropped'] += 1
+                    print(json.dumps({'event': 'write_behind_dropped', 'table': slot[0], 'key': slot[1],
+                                      'error': str(error) if error else 'unprocessed'}))
+            self._changed.notify_all()
+
+class PostInvokeFlush:
+    """Lambda internal extension that flushes queued writes after each response is sent.
+
+    Lambda returns the handler's response right away but freezes the container
+    only once every registered extension has asked for its next event. This
+    one registers for INVOKE events; for each, it waits for the handler to call
+    done(), runs `flush` with a bounded wait, and only then asks for the next
+    event, so the flush adds to billed duration rather than to latency. With
+    an extension registered, Lambda also sends the runtime SIGTERM before
+    shutting the container down, and the handler flushes what is left.
+    """
+
+    def __init__(self, runtime_api: str, flush: Callable[[float], None], timeout: float):
+        self.base_url = f'http://{runtime_api}/2020-01-01/extension'
+        self.flush = flush
+        self.timeout = timeout
+        self._extension_id: Optional[str] = None
+        self._done = threading.Event()
+
+    def register(self) -> None:
+        """Register during init (module import), before the runtime asks for its first invocation"""
+        # Installed first: once registered, Lambda waits on this extension every invocation
+        signal.signal(signal.SIGTERM, self._shutdown)
+        request = urllib.request.Request(f'{self.base_url}/register', method='POST',
+                                         data=json.dumps({'events': ['INVOKE']}).encode('utf-8'),
+                                         headers={'Lambda-Extension-Name': EXTENSION_NAME})
+        with urllib.request.urlopen(request, timeout=2) as response:
+            self._extension_id = response.headers['Lambda-Extension-Identifier']
+        threading.Thread(target=self._run, name=EXTENSION_NAME, daemon=True).start()
+
+    def done(self) -> None:
+        """Called by the handler as it returns; the flush starts once the response is on its way"""
+        self._done.set()
+
+    def _next_event(self) -> Dict[str, Any]:
+        request = urllib.request.Request(f'{self.base_url}/event/next',
+                                         headers={'Lambda-Extension-Identifier': self._extension_id})
+        # Blocks (frozen) until the next invocation starts
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self._next_event()
+            except Exception as e:
+                print(json.dumps({'event': 'write_behind_extension_error', 'error': str(e)}))
+                time.sleep(0.1)
+                continue
+            self._done.wait()
+            self._done.clear()
+            try:
+                self.flush(self.timeout)
+            except Exception as e:
+                print(json.dumps({'event': 'write_behind_extension_error', 'error': str(e)}))
+
+    def _shutdown(self, signum: int, frame: Any) -> None:
+        self.flush(SHUTDOWN_FLUSH_SECONDS)
+        sys.exit(0)
+
+def build_post_invoke_flush(flush: Callable[[float], None], timeout: float) -> Optional[PostInvokeFlush]:
+    """Register the post-invoke flush extension; None outside Lambda, with write-behind off, with a zero
+    flush wait, or when registration fails (handlers then flush before returning)"""
+    runtime_api = os.environ.get('AWS_LAMBDA_RUNTIME_API')
+    if not runtime_api or timeout <= 0 or os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    extension = PostInvokeFlush(runtime_api, flush, timeout)
+    try:
+        extension.register()
+    except Exception as e:
+        print(json.dumps({'event': 'write_behind_extension_error', 'error': str(e)}))
+        return None
+    return extension
+
+def is_validation_error(error: Optional[Exception]) -> bool:
+    """Whether DynamoDB rejected the request as invalid (retrying it can't succeed)"""
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') == 'ValidationException'
+
+def build_write_behind() -> Optional[WriteBehindWriter]:
+    """Build the shared writer from environment configuration; None when WRITE_BEHIND_ENABLED is false"""
+    if os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    import boto3
+    return WriteBehindWriter(
+        traced(boto3.resource('dynamodb'), 'dynamodb'),
+        linger_seconds=int(os.environ.get('WRITE_BEHIND_LINGER_MS', DEFAULT_LINGER_MS)) / 1000,
+        max_pending=int(os.environ.get('WRITE_BEHIND_MAX_PENDING', DEFAULT_MAX_PENDING))
+    )
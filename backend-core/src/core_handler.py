@@ -1,62 +1,127 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import json
 import os
-import boto3
+import base64
+import random
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any
+from decimal import Decimal
+from typing import Dict, Any, Optional, List, Iterator, Callable, Tuple
+from http_api import Router, build_pipeline, respond, error_response, parse_body, request_header
+from tracing import propagate, span, traced
+
+# Cold-start instrumentation: per-component init times, reported once per container
+COLD_START_PROFILE = os.environ.get('COLD_START_PROFILE', '').lower() in ('1', 'true', 'yes')
+cold_start_timings: Dict[str, float] = {}
+_first_request = True
+
+# AWS clients and table handles are created on first use and memoized per container,
+# so routes that touch one table (or none) don't pay for the rest
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.RLock()
+
+def get_client(name: str, factory: Callable[[], Any]) -> Any:
+    """Return the memoized client for `name`, creating it with `factory` on first use"""
+    if name not in _clients:
+        with _clients_lock:
+            if name not in _clients:
+                started = time.perf_counter()
+                client = factory()
+                if COLD_START_PROFILE:
+                    cold_start_timings[name] = round((time.perf_counter() - started) * 1000, 2)
+                _clients[name] = client
+    return _clients[name]
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
+def get_boto3() -> Any:
+    """Deferred boto3 import; it dominates cold-start import time"""
+    def factory():
+        import boto3
+        return boto3
+    return get_client('boto3', factory)
 
-# Table references
-business_table = dynamodb.Table(os.environ['BUSINESS_TABLE'])
-campaigns_table = dynamodb.Table(os.environ['CAMPAIGNS_TABLE'])
-items_table = dynamodb.Table(os.environ['ITEMS_TABLE'])
-comparisons_table = dynamodb.Table(os.environ['COMPARISONS_TABLE'])
-chat_sessions_table = dynamodb.Table(os.environ['CHAT_SESSIONS_TABLE'])
-chat_messages_table = dynamodb.Table(os.environ['CHAT_MESSAGES_TABLE'])
+def get_dynamodb() -> Any:
+    """Shared DynamoDB resource"""
+    return get_client('dynamodb', lambda: traced(get_boto3().resource('dynamodb'), 'dynamodb'))
+
+def get_s3_client() -> Any:
+    """Shared S3 client"""
+    return get_client('s3', lambda: traced(get_boto3().client('s3'), 's3'))
+
+def get_table(env_name: str) -> Any:
+    """Table handle for the table named by environment variable `env_name` (e.g. ITEMS_TABLE)"""
+    table_name = os.environ[env_name]
+    return get_client(env_name, lambda: traced(get_dynamodb().Table(table_name), 'dynamodb', table=table_name))
 
 UPLOADS_BUCKET = os.environ['UPLOADS_BUCKET']
 
+# Listing limits for GET /items and GET /comparisons
+ITEMS_DEFAULT_PAGE_SIZE = 25
+ITEMS_MAX_PAGE_SIZE = 100
+
+# GET /businesses/{businessId}/overview: section -> (table env var, key, projected attributes)
+OVERVIEW_SECTIONS = {
+    'campaigns': ('CAMPAIGNS_TABLE', 'campaignId', ['goal', 'targetAudience', 'budget', 'status', 'createdAt']),
+    'comparisons': ('COMPARISONS_TABLE', 'comparisonId',
+                    ['campaignId', 'competitorId', 'competitorName', 'scores', 'createdAt']),
+    'chatSessions': ('CHAT_SESSIONS_TABLE', 'sessionId', ['summarizedThrough', 'updatedAt']),
+}
+OVERVIEW_DEFAULT_LIMIT = 10
+OVERVIEW_MAX_LIMIT = 50
+
+# Pool for the independent table reads of one request; each section reads its own Table object
+query_executor = ThreadPoolExecutor(max_workers=len(OVERVIEW_SECTIONS) + 1)
+
+# Upload limits; S3 requires parts of 5 MiB (except the last) to 5 GiB and at most 10,000 parts
+PRESIGN_EXPIRES_SECONDS = 3600
+MAX_PRESIGN_BATCH_FILES = 100
+MULTIPART_DEFAULT_PART_SIZE = 16 * 1024 * 1024
+MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+MULTIPART_MAX_PART_SIZE = 5 * 1024 ** 3
+MULTIPART_MAX_PARTS = 10000
+MULTIPART_MAX_FILE_SIZE = 5 * 1024 ** 4
+# Part URLs presigned per response, which keeps responses well under the Lambda payload limit
+MULTIPART_MAX_PRESIGNED_PARTS = 1000
+
+# Bulk write limits for /campaigns/batch and /items/batch
+BATCH_WRITE_CHUNK_SIZE = 25
+MAX_BATCH_RECORDS = 5000
+BATCH_WRITE_MAX_RETRIES = 6
+BATCH_WRITE_BASE_DELAY = 0.05
+
+IMPORT_DURATION_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 2)
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Main Lambda handler with routing"""
-    
-    headers = {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': '*',
-        'Access-Control-Allow-Methods': '*',
-        'Content-Type': 'application/json'
-    }
+    """Main Lambda handler; reports cold-start timings on the first request when profiling"""
+    global _first_request
+    if not (COLD_START_PROFILE and _first_request):
+        return pipeline(event, context)
     
-    try:
-        method = event['requestContext']['http']['method']
-        path = event['requestContext']['http']['path']
-        
-        if method == 'OPTIONS':
-            return {'statusCode': 200, 'headers': headers, 'body': ''}
-        
-        # Route requests
-        if path == '/signup' and method == 'POST':
-            return handle_signup(event, headers)
-        elif path == '/campaigns' and method == 'POST':
-            return handle_create_campaign(event, headers)
-        elif path == '/items' and method == 'GET':
-            return handle_get_items(event, headers)
-        elif path == '/items' and method == 'POST':
-            return handle_create_item(event, headers)
-        elif path == '/uploads/presign' and method == 'POST':
-            return handle_presigned_upload(event, headers)
-        else:
-            return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'success': False, 'error': 'Endpoint not found'})}
-            
-    except Exception as e:
-        return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+    _first_request = False
+    started = time.perf_counter()
+    response = pipeline(event, context)
+    report_cold_start(event, round((time.perf_counter() - started) * 1000, 2))
+    return response
+
+def report_cold_start(event: Dict[str, Any], first_request_ms: float) -> None:
+    """Log import and first-request init timings as one JSON line"""
+    http = event.get('requestContext', {}).get('http', {})
+    print(json.dumps({
+        'metric': 'cold_start',
+        'handler': 'core',
+        'route': f"{http.get('method')} {http.get('path')}",
+        'importMs': IMPORT_DURATION_MS,
+        'firstRequestMs': first_request_ms,
+        'components': cold_start_timings
+    }))
 
-def handle_signup(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_signup(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Handle business signup"""
     try:
-        body = json.loads(event['body'])
+        body = parse_body(event)
         
         business = {
             'businessId': str(uuid.uuid4()),
@@ -72,83 +137,509 @@ def handle_signup(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, A
         if 'logo' in body:
             business['logo'] = body['logo']
         
-        business_table.put_item(Item=business)
+        get_table('BUSINESS_TABLE').put_item(Item=business)
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': business})}
+        return respond(200, {'success': True, 'data': business})
         
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(400, str(e))
 
-def handle_create_campaign(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+def build_campaign(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a campaign record from request fields"""
+    return {
+        'campaignId': str(uuid.uuid4()),
+        'businessId': body['businessId'],
+        'goal': body['goal'],
+        'targetAudience': body['targetAudience'],
+        'budget': body['budget'],
+        'status': body.get('status', 'draft'),
+        'createdAt': datetime.utcnow().isoformat()
+    }
+
+def handle_create_campaign(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Handle campaign creation"""
     try:
-        body = json.loads(event['body'])
-        
-        campaign = {
-            'campaignId': str(uuid.uuid4()),
-            'businessId': body['businessId'],
-            'goal': body['goal'],
-            'targetAudience': body['targetAudience'],
-            'budget': body['budget'],
-            'status': body.get('status', 'draft'),
-            'createdAt': datetime.utcnow().isoformat()
+        body = parse_body(event)
+        
+        campaign = build_campaign(body)
+        
+        get_table('CAMPAIGNS_TABLE').put_item(Item=campaign)
+        
+        return respond(200, {'success': True, 'data': campaign})
+        
+    except Exception as e:
+        return error_response(400, str(e))
+
+def projection_args(fields: List[str]) -> Dict[str, Any]:
+    """ProjectionExpression arguments; placeholders avoid clashes with reserved words such as `status`"""
+    attribute_names = {f'#f{i}': name for i, name in enumerate(fields)}
+    return {'ProjectionExpression': ', '.join(attribute_names), 'ExpressionAttributeNames': attribute_names}
+
+def query_business_section(section: str, business_id: str, limit: int) -> Dict[str, Any]:
+    """One page of a business's records in a section's table, through its BusinessIndex GSI"""
+    from boto3.dynamodb.conditions import Key
+    env_name, key_name, fields = OVERVIEW_SECTIONS[section]
+    response = get_table(env_name).query(
+        IndexName='BusinessIndex',
+        KeyConditionExpression=Key('businessId').eq(business_id),
+        Limit=limit,
+        **projection_args([key_name, 'businessId'] + fields)
+    )
+    return {'items': response.get('Items', []), 'nextCursor': encode_cursor(response.get('LastEvaluatedKey'))}
+
+def handle_get_business_overview(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Business profile plus its campaigns, comparisons and chat sessions in one response.
+
+    The GetItem and the section queries run concurrently, so the request takes
+    about as long as the slowest of them. `sections` selects a subset and
+    `limit` caps each section (default 10, max 50); nextCursor is set on
+    sections with more records.
+    """
+    try:
+        business_id = event['pathParameters']['businessId']
+        params = event.get('queryStringParameters') or {}
+        sections = [name.strip() for name in params.get('sections', ','.join(OVERVIEW_SECTIONS)).split(',') if name.strip()]
+        unknown = [name for name in sections if name not in OVERVIEW_SECTIONS]
+        if unknown:
+            raise ValueError(f"Unknown section: {', '.join(unknown)}")
+        try:
+            limit = int(params.get('limit') or OVERVIEW_DEFAULT_LIMIT)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        limit = max(1, min(limit, OVERVIEW_MAX_LIMIT))
+        
+        business_future = query_executor.submit(
+            propagate(lambda: get_table('BUSINESS_TABLE').get_item(Key={'businessId': business_id}).get('Item'))
+        )
+        section_futures = {
+            name: query_executor.submit(propagate(query_business_section), name, business_id, limit)
+            for name in sections
         }
         
-        campaigns_table.put_item(Item=campaign)
+        business = business_future.result()
+        if business is None:
+            return error_response(404, 'Business not found')
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': campaign})}
+        return respond(200, {
+            'success': True,
+            'data': {'business': business, **{name: future.result() for name, future in section_futures.items()}}
+        })
         
+    except ValueError as e:
+        return error_response(400, str(e))
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(500, str(e))
+
+def encode_cursor(last_evaluated_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Encode a DynamoDB LastEvaluatedKey as an opaque URL-safe cursor"""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
 
-def handle_get_items(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Handle get all items"""
+def decode_cursor(cursor: Optional[str], key_names: Tuple[str, ...] = ('pk',),
+                  **expected: Any) -> Optional[Dict[str, Any]]:
+    """Decode an opaque cursor back into an ExclusiveStartKey. It must hold exactly `key_names` (the table
+    key for a scan, plus the index key for a query) with the `expected` values, so a cursor from another
+    listing is rejected here instead of failing in DynamoDB"""
+    if not cursor:
+        return None
     try:
-        response = items_table.scan()
-        items = response.get('Items', [])
+        padded = cursor + '=' * (-len(cursor) % 4)
+        start_key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(start_key, dict):
+        raise ValueError('Invalid cursor')
+    if set(start_key) != set(key_names) or any(start_key[name] != value for name, value in expected.items()):
+        raise ValueError('cursor belongs to a different listing')
+    return start_key
+
+def parse_page_size(value: Optional[str]) -> int:
+    """Clamp the requested page size to the server-side limits"""
+    if value is None or value == '':
+        return ITEMS_DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, ITEMS_MAX_PAGE_SIZE))
+
+def build_projection(fields: Optional[str]) -> Dict[str, Any]:
+    """Build ProjectionExpression arguments from a comma-separated field list"""
+    if not fields:
+        return {}
+    names = [f.strip() for f in fields.split(',') if f.strip()]
+    # The key attributes are always returned so the cursor stays valid
+    for key_attr in ('pk', 'businessId'):
+        if key_attr not in names:
+            names.append(key_attr)
+    attribute_names = {f'#f{i}': name for i, name in enumerate(names)}
+    return {
+        'ProjectionExpression': ', '.join(attribute_names.keys()),
+        'ExpressionAttributeNames': attribute_names
+    }
+
+def handle_get_items(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Handle paginated item listing, scoped to a business when businessId is given"""
+    try:
+        params = event.get('queryStringParameters') or {}
+        business_id = params.get('businessId')
+        
+        request = {'Limit': parse_page_size(params.get('limit'))}
+        request.update(build_projection(params.get('fields')))
+        if business_id:
+            start_key = decode_cursor(params.get('cursor'), ('pk', 'businessId'), businessId=business_id)
+        else:
+            start_key = decode_cursor(params.get('cursor'))
+        if start_key:
+            request['ExclusiveStartKey'] = start_key
+        
+        if business_id:
+            from boto3.dynamodb.conditions import Key
+            response = get_table('ITEMS_TABLE').query(
+                IndexName='BusinessIndex',
+                KeyConditionExpression=Key('businessId').eq(business_id),
+                **request
+            )
+        else:
+            response = get_table('ITEMS_TABLE').scan(**request)
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': items})}
+        return respond(200, {
+            'success': True,
+            'data': response.get('Items', []),
+            'nextCursor': encode_cursor(response.get('LastEvaluatedKey'))
+        })
         
+    except ValueError as e:
+        return error_response(400, str(e))
     except Exception as e:
-        return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(500, str(e))
 
-def handle_create_item(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
-    """Handle create generic item"""
+def handle_get_comparisons(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """List a business's stored comparisons (BusinessIndex), optionally for one campaign"""
     try:
-        body = json.loads(event['body'])
+        params = event.get('queryStringParameters') or {}
+        business_id = params.get('businessId')
+        if not business_id:
+            raise ValueError('businessId is required')
         
-        item = {
-            'pk': str(uuid.uuid4()),
-            **body,
-            'createdAt': datetime.utcnow().isoformat()
+        from boto3.dynamodb.conditions import Attr, Key
+        request = {
+            'IndexName': 'BusinessIndex',
+            'KeyConditionExpression': Key('businessId').eq(business_id),
+            'Limit': parse_page_size(params.get('limit'))
         }
+        if params.get('campaignId'):
+            request['FilterExpression'] = Attr('campaignId').eq(params['campaignId'])
+        start_key = decode_cursor(params.get('cursor'), ('comparisonId', 'businessId'), businessId=business_id)
+        if start_key:
+            request['ExclusiveStartKey'] = start_key
         
-        items_table.put_item(Item=item)
+        response = get_table('COMPARISONS_TABLE').query(**request)
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({'success': True, 'data': item})}
+        return respond(200, {
+            'success': True,
+            'data': response.get('Items', []),
+            'nextCursor': encode_cursor(response.get('LastEvaluatedKey'))
+        })
         
+    except ValueError as e:
+        return error_response(400, str(e))
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
+        return error_response(500, str(e))
 
-def handle_presigned_upload(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+def build_item(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a generic item record from request fields"""
+    if not isinstance(body, dict):
+        raise ValueError('Item must be a JSON object')
+    return {
+        'pk': str(uuid.uuid4()),
+        **body,
+        'createdAt': datetime.utcnow().isoformat()
+    }
+
+def handle_create_item(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Handle create generic item"""
+    try:
+        body = parse_body(event)
+        
+        item = build_item(body)
+        
+        get_table('ITEMS_TABLE').put_item(Item=item)
+        
+        return respond(200, {'success': True, 'data': item})
+        
+    except Exception as e:
+        return error_response(400, str(e))
+
+def iter_batch_records(event: Dict[str, Any]) -> Iterator[Any]:
+    """Yield records from a JSON body (`{"records": [...]}` or a bare list) or an NDJSON body"""
+    raw = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        raw = base64.b64decode(raw).decode('utf-8')
+    
+    content_type = request_header(event, 'content-type') or ''
+    # Numbers are parsed as Decimal because DynamoDB rejects floats
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        for line in raw.splitlines():
+            if line.strip():
+                yield json.loads(line, parse_float=Decimal)
+        return
+    
+    with span('parse_body', bytes=len(raw)):
+        body = json.loads(raw, parse_float=Decimal)
+    records = body.get('records') if isinstance(body, dict) else body
+    if not isinstance(records, list):
+        raise ValueError('Expected a list of records')
+    yield from records
+
+def batch_write_records(table: Any, records: List[Dict[str, Any]], key_name: str) -> Dict[str, str]:
+    """Write records in chunks of 25 via BatchWriteItem; returns {key: error} for records not written.
+
+    A chunk that fails outright (a rejected request) fails only its own records; the
+    chunks before it are already committed and later chunks are still written.
+    """
+    failed = {}
+    for start in range(0, len(records), BATCH_WRITE_CHUNK_SIZE):
+        chunk = records[start:start + BATCH_WRITE_CHUNK_SIZE]
+        pending = {table.name: [{'PutRequest': {'Item': record}} for record in chunk]}
+        
+        try:
+            for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+                response = get_dynamodb().batch_write_item(RequestItems=pending)
+                pending = response.get('UnprocessedItems') or {}
+                if not pending:
+                    break
+                if attempt < BATCH_WRITE_MAX_RETRIES:
+                    # Exponential backoff with full jitter
+                    time.sleep(random.uniform(0, BATCH_WRITE_BASE_DELAY * (2 ** attempt)))
+        except Exception as e:
+            print(json.dumps({'event': 'batch_write_error', 'table': table.name, 'error': str(e)}))
+            for request in pending.get(table.name, []):
+                failed[request['PutRequest']['Item'][key_name]] = 'Write failed; retry this record'
+            continue
+        
+        for request in pending.get(table.name, []):
+            failed[request['PutRequest']['Item'][key_name]] = 'Write throttled; retry this record'
+    return failed
+
+def handle_batch_create(event: Dict[str, Any], table: Any, build_record: Any, key_name: str) -> Dict[str, Any]:
+    """Validate and bulk-write a list of records, reporting success per record"""
+    try:
+        results = []
+        records = []
+        keys = set()
+        for index, body in enumerate(iter_batch_records(event)):
+            if index >= MAX_BATCH_RECORDS:
+                raise ValueError(f'At most {MAX_BATCH_RECORDS} records per batch')
+            try:
+                record = build_record(body)
+            except KeyError as e:
+                results.append({'index': index, 'success': False, 'error': f'Missing field: {e.args[0]}'})
+                continue
+            except Exception as e:
+                results.append({'index': index, 'success': False, 'error': str(e)})
+                continue
+            # BatchWriteItem rejects a whole chunk that names a key twice
+            if record[key_name] in keys:
+                results.append({'index': index, 'success': False, 'error': f'Duplicate {key_name} in batch'})
+                continue
+            keys.add(record[key_name])
+            records.append(record)
+            results.append({'index': index, 'success': True, 'id': record[key_name]})
+        
+        failed = batch_write_records(table, records, key_name)
+        for result in results:
+            if result['success'] and result['id'] in failed:
+                result['success'] = False
+                result['error'] = failed[result['id']]
+        
+        written = sum(1 for result in results if result['success'])
+        return respond(200, {
+            'success': written == len(results),
+            'data': {'written': written, 'failed': len(results) - written, 'results': results}
+        })
+        
+    except Exception as e:
+        return error_response(400, str(e))
+
+def upload_key(file_name: str) -> str:
+    return f"uploads/{uuid.uuid4()}_{file_name}"
+
+def presign_put(file_name: str, file_type: str) -> Dict[str, Any]:
+    """Single-PUT upload URL for a new object under uploads/"""
+    key = upload_key(file_name)
+    upload_url = get_s3_client().generate_presigned_url(
+        'put_object',
+        Params={'Bucket': UPLOADS_BUCKET, 'Key': key, 'ContentType': file_type},
+        ExpiresIn=PRESIGN_EXPIRES_SECONDS
+    )
+    return {'uploadUrl': upload_url, 'key': key}
+
+def handle_presigned_upload(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Handle presigned URL generation for file uploads"""
     try:
-        body = json.loads(event['body'])
-        file_name = body['fileName']
-        file_type = body['fileType']
+        body = parse_body(event)
         
-        key = f"uploads/{uuid.uuid4()}_{file_name}"
+        return respond(200, {
+            'success': True,
+            'data': presign_put(body['fileName'], body['fileType'])
+        })
         
-        upload_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params={'Bucket': UPLOADS_BUCKET, 'Key': key, 'ContentType': file_type},
-            ExpiresIn=3600
-        )
+    except Exception as e:
+        return error_response(400, str(e))
+
+def handle_presigned_upload_batch(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Presign single-PUT uploads for many files in one call (e.g. a gallery)"""
+    try:
+        files = parse_body(event).get('files')
+        if not isinstance(files, list) or not files:
+            raise ValueError('files must be a non-empty list')
+        if len(files) > MAX_PRESIGN_BATCH_FILES:
+            raise ValueError(f'At most {MAX_PRESIGN_BATCH_FILES} files per batch')
+        for index, file in enumerate(files):
+            if not isinstance(file, dict) or not file.get('fileName') or not file.get('fileType'):
+                raise ValueError(f'files[{index}] needs fileName and fileType')
         
-        return {'statusCode': 200, 'headers': headers, 'body': json.dumps({
+        # Presigning is local signing work, so the whole batch costs no S3 round trips
+        return respond(200, {
             'success': True,
-            'data': {'uploadUrl': upload_url, 'key': key}
-        })}
+            'data': [{'fileName': file['fileName'], **presign_put(file['fileName'], file['fileType'])} for file in files]
+        })
         
     except Exception as e:
-        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'success': False, 'error': str(e)})}
\ No newline at end of file
+        return error_response(400, str(e))
+
+def plan_parts(file_size: int, part_size: Optional[int]) -> Tuple[int, int]:
+    """(part size, part count) for a multipart upload. The requested size is clamped to S3's part size
+    limits, then raised to whole MiB so the upload fits in MULTIPART_MAX_PARTS parts.
+    Raises ValueError when the file can't be planned"""
+    if file_size <= 0 or file_size > MULTIPART_MAX_FILE_SIZE:
+        raise ValueError(f'fileSize must be between 1 and {MULTIPART_MAX_FILE_SIZE} bytes')
+    part_size = min(max(int(part_size or MULTIPART_DEFAULT_PART_SIZE), MULTIPART_MIN_PART_SIZE),
+                    MULTIPART_MAX_PART_SIZE)
+    smallest = -(-file_size // MULTIPART_MAX_PARTS)
+    part_size = max(part_size, -(-smallest // (1024 * 1024)) * 1024 * 1024)
+    part_count = -(-file_size // part_size)
+    if part_size > MULTIPART_MAX_PART_SIZE or part_count > MULTIPART_MAX_PARTS:
+        raise ValueError(f'fileSize needs more than {MULTIPART_MAX_PARTS} parts of at most {MULTIPART_MAX_PART_SIZE} bytes')
+    return part_size, part_count
+
+def presign_parts(key: str, upload_id: str, part_numbers: List[int]) -> List[Dict[str, Any]]:
+    s3 = get_s3_client()
+    return [
+        {
+            'partNumber': number,
+            'uploadUrl': s3.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': UPLOADS_BUCKET, 'Key': key, 'UploadId': upload_id, 'PartNumber': number},
+                ExpiresIn=PRESIGN_EXPIRES_SECONDS
+            )
+        }
+        for number in part_numbers
+    ]
+
+def handle_start_multipart_upload(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Start a multipart upload and presign its parts, so the client can upload parts in parallel.
+
+    Up to MULTIPART_MAX_PRESIGNED_PARTS part URLs are returned; larger files fetch
+    the rest from /uploads/multipart/parts.
+    """
+    try:
+        body = parse_body(event)
+        part_size, part_count = plan_parts(int(body['fileSize']), body.get('partSize'))
+        key = upload_key(body['fileName'])
+        
+        upload_id = get_s3_client().create_multipart_upload(
+            Bucket=UPLOADS_BUCKET, Key=key, ContentType=body['fileType']
+        )['UploadId']
+        parts = presign_parts(key, upload_id, list(range(1, min(part_count, MULTIPART_MAX_PRESIGNED_PARTS) + 1)))
+        
+        return respond(200, {
+            'success': True,
+            'data': {'key': key, 'uploadId': upload_id, 'partSize': part_size, 'partCount': part_count, 'parts': parts}
+        })
+        
+    except Exception as e:
+        return error_response(400, str(e))
+
+def multipart_target(body: Dict[str, Any]) -> Tuple[str, str]:
+    """(key, uploadId) of an upload started by this API"""
+    key, upload_id = body.get('key'), body.get('uploadId')
+    if not key or not upload_id:
+        raise ValueError('key and uploadId are required')
+    if not key.startswith('uploads/'):
+        raise ValueError('key must be an upload key')
+    return key, upload_id
+
+def handle_presign_multipart_parts(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Presign more part URLs (or fresh ones after expiry) for an upload in progress"""
+    try:
+        body = parse_body(event)
+        key, upload_id = multipart_target(body)
+        part_numbers = body.get('partNumbers')
+        if not isinstance(part_numbers, list) or not part_numbers:
+            raise ValueError('partNumbers must be a non-empty list')
+        if len(part_numbers) > MULTIPART_MAX_PRESIGNED_PARTS:
+            raise ValueError(f'At most {MULTIPART_MAX_PRESIGNED_PARTS} parts per call')
+        numbers = [int(number) for number in part_numbers]
+        if any(number < 1 or number > MULTIPART_MAX_PARTS for number in numbers):
+            raise ValueError(f'partNumbers must be between 1 and {MULTIPART_MAX_PARTS}')
+        
+        return respond(200, {'success': True, 'data': {'parts': presign_parts(key, upload_id, numbers)}})
+        
+    except Exception as e:
+        return error_response(400, str(e))
+
+def handle_complete_multipart_upload(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Assemble the uploaded parts; `parts` lists {partNumber, eTag} from each part upload's ETag header"""
+    try:
+        body = parse_body(event)
+        key, upload_id = multipart_target(body)
+        parts = body.get('parts')
+        if not isinstance(parts, list) or not parts:
+            raise ValueError('parts must be a non-empty list')
+        
+        completed = sorted(
+            ({'PartNumber': int(part['partNumber']), 'ETag': part['eTag']} for part in parts),
+            key=lambda part: part['PartNumber']
+        )
+        response = get_s3_client().complete_multipart_upload(
+            Bucket=UPLOADS_BUCKET, Key=key, UploadId=upload_id, MultipartUpload={'Parts': completed}
+        )
+        
+        return respond(200, {'success': True, 'data': {'key': key, 'eTag': response.get('ETag')}})
+        
+    except Exception as e:
+        return error_response(400, str(e))
+
+def handle_abort_multipart_upload(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Abort a multipart upload and discard its uploaded parts"""
+    try:
+        key, upload_id = multipart_target(parse_body(event))
+        get_s3_client().abort_multipart_upload(Bucket=UPLOADS_BUCKET, Key=key, UploadId=upload_id)
+        
+        return respond(200, {'success': True, 'data': {'key': key}})
+        
+    except Exception as e:
+        return error_response(400, str(e))
+
+# Route table
+router = Router()
+router.add('POST', '/signup', handle_signup)
+router.add('POST', '/campaigns', handle_create_campaign)
+router.add('POST', '/campaigns/batch', lambda event, context: handle_batch_create(event, get_table('CAMPAIGNS_TABLE'), build_campaign, 'campaignId'))
+router.add('GET', '/items', handle_get_items)
+router.add('POST', '/items', handle_create_item)
+router.add('POST', '/items/batch', lambda event, context: handle_batch_create(event, get_table('ITEMS_TABLE'), build_item, 'pk'))
+router.add('GET', '/businesses/{businessId}/overview', handle_get_business_overview)
+router.add('GET', '/comparisons', handle_get_comparisons)
+router.add('POST', '/uploads/presign', handle_presigned_upload)
+router.add('POST', '/uploads/presign/batch', handle_presigned_upload_batch)
+router.add('POST', '/uploads/multipart', handle_start_multipart_upload)
+router.add('POST', '/uploads/multipart/parts', handle_presign_multipart_parts)
+router.add('POST', '/uploads/multipart/complete', handle_complete_multipart_upload)
+router.add('POST', '/uploads/multipart/abort', handle_abort_multipart_upload)
+
+pipeline = build_pipeline(router)
@@ -0,0 +1,418 @@
+"""Self-hosted HTTP server for the core and AI APIs.
+
+Serves both handlers' routes from one process: an asyncio loop accepts
+keep-alive HTTP/1.1 connections, turns each request into the API Gateway HTTP
+API (payload v2) event the handlers expect, and runs `lambda_handler` on a
+sized thread pool. Requests go to whichever handler's router has a matching
+route. A response whose body is an iterator (the AI handler's server-sent
+events) is written as each part is produced, with chunked transfer encoding.
+`--workers` forks that many processes sharing one listening socket, to scale
+across cores.
+
+    python backend-server/src/server.py --port 8080 --workers 4 --threads 32
+
+See backend-server/README.md for the environment the handlers need.
+"""
+import argparse
+import asyncio
+import base64
+import importlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HANDLER_PATHS = [os.path.join(REPO_ROOT, 'backend-core', 'src'), os.path.join(REPO_ROOT, 'backend-ai', 'src'),
+                 os.path.join(REPO_ROOT, 'backend-shared', 'src')]
+# Handler modules, in the order their routers are tried
+HANDLER_MODULES = ['core_handler', 'ai_handler']
+
+# Defaults, overridable through the environment or the command line
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_THREADS = 32
+DEFAULT_KEEPALIVE_SECONDS = 5
+# The deployed functions' timeout, so handlers budget model calls as they do on Lambda
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 60
+# API Gateway's payload limit
+MAX_BODY_BYTES = 10 * 2 ** 20
+MAX_HEADER_LINE_BYTES = 64 * 1024
+MAX_HEADERS = 100
+LISTEN_BACKLOG = 1024
+SHUTDOWN_FLUSH_SECONDS = 10
+# Methods whose routes an OPTIONS preflight is matched against
+PREFLIGHT_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+class RequestError(Exception):
+    """A malformed or oversized request, answered with `status` and the connection closed"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class LocalContext:
+    """The parts of the Lambda context object the handlers use"""
+
+    function_name = 'local'
+    # Handlers may return an iterator body; each part is sent as it is produced
+    streams_responses = True
+
+    def __init__(self, timeout_seconds: float):
+        self.aws_request_id = uuid.uuid4().hex
+        self.deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+def build_event(method: str, target: str, headers: Dict[str, str], body: bytes, source_ip: str) -> Dict[str, Any]:
+    """API Gateway HTTP API (payload v2) event for one request"""
+    raw_path, _, raw_query = target.partition('?')
+    path = unquote(raw_path)
+    event: Dict[str, Any] = {
+        'version': '2.0',
+        'routeKey': '$default',
+        'rawPath': path,
+        'rawQueryString': raw_query,
+        'headers': headers,
+        'requestContext': {
+            'http': {'method': method, 'path': path, 'protocol': 'HTTP/1.1', 'sourceIp': source_ip,
+                     'userAgent': headers.get('user-agent', '')},
+            'requestId': uuid.uuid4().hex,
+            'routeKey': '$default',
+            'stage': '$default',
+            'timeEpoch': int(time.time() * 1000),
+        },
+        'isBase64Encoded': False,
+    }
+    if raw_query:
+        params: Dict[str, str] = {}
+        for name, value in parse_qsl(raw_query, keep_blank_values=True):
+            # Repeated parameters are comma-joined, as API Gateway does
+            params[name] = f'{params[name]},{value}' if name in params else value
+        event['queryStringParameters'] = params
+    if 'cookie' in headers:
+        event['cookies'] = [cookie.strip() for cookie in headers['cookie'].split(';') if cookie.strip()]
+    if body:
+        try:
+            event['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            event['body'] = base64.b64encode(body).decode('ascii')
+            event['isBase64Encoded'] = True
+    return event
+
+def encode_head(response: Dict[str, Any], keep_alive: bool, length: Optional[int], chunked: bool = False) -> bytes:
+    """Status line and headers; `length` None sends no Content-Length (a chunked or close-delimited body)"""
+    status = int(response.get('statusCode', 200))
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    lines = [f'HTTP/1.1 {status} {reason}']
+    for name, value in (response.get('headers') or {}).items():
+        if name.lower() not in ('content-length', 'connection', 'transfer-encoding', 'date'):
+            lines.append(f'{name}: {value}')
+    lines.extend(f'Set-Cookie: {cookie}' for cookie in response.get('cookies') or [])
+    if chunked:
+        lines.append('Transfer-Encoding: chunked')
+    elif length is not None:
+        lines.append(f'Content-Length: {length}')
+    lines.append(f'Date: {formatdate(usegmt=True)}')
+    lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+def encode_response(response: Dict[str, Any], keep_alive: bool) -> bytes:
+    """HTTP/1.1 response bytes for a handler's API Gateway response"""
+    status = int(response.get('statusCode', 200))
+    body = response.get('body') or ''
+    payload = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf-8')
+    if status == 304 or status < 200 or status == 204:
+        return encode_head(response, keep_alive, None)
+    return encode_head(response, keep_alive, len(payload)) + payload
+
+def is_streamed(response: Dict[str, Any]) -> bool:
+    """Whether the body is an iterator of parts rather than the whole text"""
+    return not isinstance(response.get('body') or '', (str, bytes))
+
+async def read_chunked(reader: asyncio.StreamReader, max_body: int) -> bytes:
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        line = await reader.readline()
+        try:
+            length = int(line.split(b';', 1)[0].strip(), 16)
+        except ValueError:
+            raise RequestError(400, 'Invalid chunk size')
+        if length == 0:
+            # Trailers, up to the blank line
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(chunks)
+        size += length
+        if size > max_body:
+            raise RequestError(413, 'Request body too large')
+        chunks.append(await reader.readexactly(length))
+        await reader.readexactly(2)
+
+async def read_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, idle_seconds: float,
+                       max_body: int) -> Optional[Tuple[str, str, Dict[str, str], bytes, bool, str]]:
+    """(method, target, headers, body, keep-alive, HTTP version) for the next request; None once the client is done"""
+    try:
+        line = await asyncio.wait_for(reader.readline(), idle_seconds)
+    except asyncio.TimeoutError:
+        return None
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise RequestError(400, 'Malformed request line')
+
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADERS + 1):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip()
+        # Repeated headers are comma-joined, as API Gateway does
+        headers[name] = f'{headers[name]},{value}' if name in headers else value
+    else:
+        raise RequestError(431, 'Too many headers')
+
+    connection = headers.get('connection', '').lower()
+    keep_alive = 'keep-alive' in connection if version == 'HTTP/1.0' else 'close' not in connection
+    if headers.get('expect', '').lower() == '100-continue':
+        writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = await read_chunked(reader, max_body)
+    else:
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise RequestError(400, 'Invalid Content-Length')
+        if length > max_body:
+            raise RequestError(413, 'Request body too large')
+        body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, headers, body, keep_alive, version
+
+class HandlerHost:
+    """Routes requests to the imported handler modules and runs them on a thread pool"""
+
+    def __init__(self, modules: List[Any], threads: int, keepalive_seconds: float = DEFAULT_KEEPALIVE_SECONDS,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT_SECONDS, max_body: int = MAX_BODY_BYTES):
+        self.modules = modules
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='handler')
+        self.keepalive_seconds = keepalive_seconds
+        self.request_timeout = request_timeout
+        self.max_body = max_body
+        self.inflight = 0
+
+    def select(self, method: str, path: str) -> Any:
+        """The module whose router has a route for the request; the first module when none does,
+        so unknown paths get its 404"""
+        methods = PREFLIGHT_METHODS if method == 'OPTIONS' else (method,)
+        for module in self.modules:
+            if any(module.router.match(candidate, path)[0] is not None for candidate in methods):
+                return module
+        return self.modules[0]
+
+    def dispatch(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        http = event['requestContext']['http']
+        module = self.select(http['method'], http['path'])
+        return module.lambda_handler(event, LocalContext(self.request_timeout))
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        peer = writer.get_extra_info('peername')
+        source_ip = peer[0] if isinstance(peer, tuple) else ''
+        try:
+            while True:
+                try:
+                    request = await read_request(reader, writer, self.keepalive_seconds, self.max_body)
+                except RequestError as e:
+                    writer.write(encode_response({'statusCode': e.status, 'body': str(e)}, keep_alive=False))
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    # A line longer than the stream limit
+                    writer.write(encode_response({'statusCode': 431, 'body': 'Header line too long'}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive, version = request
+                event = build_event(method, target, headers, body, source_ip)
+                self.inflight += 1
+                try:
+                    try:
+                        response = await loop.run_in_executor(self.executor, self.dispatch, event)
+                    except Exception as e:
+                        # The client gets a generic message; the error itself goes to the log
+                        log_error('handler_error', event, e)
+                        response = {'statusCode': 500, 'headers': {'Content-Type': 'text/plain'},
+                                    'body': 'Internal server error'}
+                    if is_streamed(response):
+                        keep_alive = await self.write_stream(writer, event, response, keep_alive,
+                                                             chunked=version != 'HTTP/1.0')
+                    else:
+                        writer.write(encode_response(response, keep_alive))
+                        await writer.drain()
+                finally:
+                    self.inflight -= 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def write_stream(self, writer: asyncio.StreamWriter, event: Dict[str, Any], response: Dict[str, Any],
+                           keep_alive: bool, chunked: bool) -> bool:
+        """Write an iterator body part by part, flushing each before the next is produced. HTTP/1.0
+        clients get a close-delimited body instead of chunks. Returns whether the connection stays open."""
+        loop = asyncio.get_running_loop()
+        parts = iter(response['body'])
+        keep_alive = keep_alive and chunked
+        writer.write(encode_head(response, keep_alive, None, chunked))
+        try:
+            while True:
+                # Producing a part blocks (it waits on the model), so it runs on the handler pool
+                part = await loop.run_in_executor(self.executor, next, parts, None)
+                if part is None:
+                    break
+                data = part.encode('utf-8') if isinstance(part, str) else part
+                if data:
+                    writer.write(b'%x\r\n%s\r\n' % (len(data), data) if chunked else data)
+                    await writer.drain()
+            if chunked:
+                writer.write(b'0\r\n\r\n')
+                await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # The status line is already sent, so the truncated body is all the client sees
+            log_error('stream_error', event, e)
+            keep_alive = False
+        finally:
+            # Stops a generator the client went away from, running its cleanup
+            close = getattr(parts, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+        return keep_alive
+
+    async def drain(self) -> None:
+        """Wait, up to the request timeout, for requests that are running to be answered"""
+        deadline = time.monotonic() + self.request_timeout
+        while self.inflight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    def flush(self) -> None:
+        """Write out anything the handlers queued behind their responses (AI write-behind artifacts)"""
+        for module in self.modules:
+            writer = getattr(module, '_clients', {}).get('writeBehind')
+            if writer is not None:
+                writer.flush(SHUTDOWN_FLUSH_SECONDS)
+
+def log_error(kind: str, event: Dict[str, Any], error: Exception) -> None:
+    http = event['requestContext']['http']
+    print(json.dumps({'event': kind, 'route': f"{http['method']} {http['path']}",
+                      'error': f'{type(error).__name__}: {error}'}), flush=True)
+
+def configure_aws(threads: int) -> None:
+    """Size every boto3 client's connection pool for the handler threads and keep idle connections open.
+    The handlers create their clients lazily, so this applies as long as it runs before the first request."""
+    import boto3
+    import botocore.session
+    from botocore.config import Config
+    session = botocore.session.get_session()
+    session.set_default_client_config(Config(max_pool_connections=threads, tcp_keepalive=True))
+    boto3.setup_default_session(botocore_session=session)
+
+def load_modules(setup: Optional[str]) -> List[Any]:
+    """Import the handlers, then call the optional `module:function` setup hook with them"""
+    sys.path[:0] = [path for path in HANDLER_PATHS if path not in sys.path]
+    modules = [importlib.import_module(name) for name in HANDLER_MODULES]
+    if setup:
+        module_name, _, function = setup.partition(':')
+        getattr(importlib.import_module(module_name), function)(modules)
+    return modules
+
+async def serve(sock: socket.socket, host: HandlerHost) -> None:
+    server = await asyncio.start_server(host.handle_connection, sock=sock, limit=MAX_HEADER_LINE_BYTES)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    async with server:
+        await stopping.wait()
+        server.close()
+        await host.drain()
+    host.executor.shutdown(wait=True)
+    host.flush()
+
+def run_worker(sock: socket.socket, options: Dict[str, Any]) -> None:
+    """One server process: its own event loop, thread pool and AWS clients"""
+    threads = options['threads']
+    # The AI handler's pool for parallel model calls is shared by every request in the process
+    os.environ.setdefault('MODEL_CALL_WORKERS', str(threads))
+    # The process never freezes, so queued artifact writes finish behind the response (flushed on shutdown)
+    os.environ.setdefault('WRITE_BEHIND_FLUSH_MS', '0')
+    configure_aws(threads)
+    host = HandlerHost(load_modules(options['setup']), threads, options['keepalive'], options['requestTimeout'],
+                       options['maxBody'])
+    asyncio.run(serve(sock, host))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('SERVER_HOST', DEFAULT_HOST))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SERVER_PORT', DEFAULT_PORT)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', 1)),
+                        help='processes sharing the listening socket (0: one per core)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVER_THREADS', DEFAULT_THREADS)),
+                        help='handler threads per process')
+    parser.add_argument('--keepalive', type=float,
+                        default=float(os.environ.get('SERVER_KEEPALIVE_SECONDS', DEFAULT_KEEPALIVE_SECONDS)),
+                        help='seconds an idle connection is kept open')
+    parser.add_argument('--request-timeout', type=float,
+                        default=float(os.environ.get('SERVER_REQUEST_TIMEOUT_SECONDS', DEFAULT_REQUEST_TIMEOUT_SECONDS)),
+                        help="time budget reported to handlers as the Lambda context's remaining time")
+    parser.add_argument('--setup', default=os.environ.get('SERVER_SETUP'),
+                        help='module:function called with the handler modules in each worker before it serves')
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    options = {'threads': args.threads, 'keepalive': args.keepalive, 'requestTimeout': args.request_timeout,
+               'maxBody': int(os.environ.get('SERVER_MAX_BODY_BYTES', MAX_BODY_BYTES)), 'setup': args.setup}
+    sock = socket.create_server((args.host, args.port), backlog=LISTEN_BACKLOG)
+    print(f'Serving on http://{args.host}:{sock.getsockname()[1]} '
+          f'({workers} worker{"s" if workers != 1 else ""} x {args.threads} threads)', flush=True)
+    if workers == 1:
+        run_worker(sock, options)
+        return
+
+    # Workers are forked before any handler is imported, so no client or thread crosses the fork
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=run_worker, args=(sock, options), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    sock.close()
+
+    def stop(signum: int, frame: Any) -> None:
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for process in processes:
+        process.join()
+
+if __name__ == '__main__':
+    main()
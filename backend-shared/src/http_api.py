@@ -0,0 +1,288 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterator
+from tracing import count, span, tracing_middleware
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+Middleware = Callable[[Dict[str, Any], Any, Handler], Dict[str, Any]]
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': '*',
+    'Access-Control-Allow-Methods': '*'
+}
+
+# Smaller bodies are sent as-is; below about a kilobyte the encoding saves less than it costs
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = 6
+# Brotli's default quality (11) is far slower than gzip for little extra saving on JSON
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/csv', 'text/html')
+
+# Serialization
+
+def json_default(value: Any) -> Any:
+    """Encode the non-JSON types DynamoDB and handlers produce"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def stdlib_dumps(payload: Any) -> str:
+    """Serialize with the standard library"""
+    return json.dumps(payload, default=json_default, separators=(',', ':'), ensure_ascii=False)
+
+def orjson_dumps(payload: Any) -> str:
+    """Serialize with orjson; datetimes are handled natively, Decimal and bytes via json_default"""
+    return orjson.dumps(payload, default=json_default).decode('utf-8')
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+_serializer: Callable[[Any], str] = (
+    orjson_dumps if ORJSON_AVAILABLE and os.environ.get('JSON_SERIALIZER', 'auto') != 'stdlib' else stdlib_dumps
+)
+
+def set_serializer(serializer: Callable[[Any], str]) -> None:
+    """Swap the response serializer (e.g. stdlib_dumps for comparison benchmarks)"""
+    global _serializer
+    _serializer = serializer
+
+def dumps(payload: Any) -> str:
+    """Serialize a payload with the configured serializer"""
+    with span('serialize'):
+        return _serializer(payload)
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    """Case-insensitive request header lookup; HTTP API lowercases names, local events may not"""
+    headers = event.get('headers') or {}
+    if name in headers:
+        return headers[name]
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def parse_body(event: Dict[str, Any]) -> Any:
+    """Parse the JSON request body"""
+    with span('parse_body', bytes=len(event.get('body') or '')):
+        return json.loads(event['body'])
+
+# Responses
+
+def respond(status_code: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Build an API Gateway response with a JSON body"""
+    response_headers = {'Content-Type': 'application/json'}
+    if headers:
+        response_headers.update(headers)
+    return {'statusCode': status_code, 'headers': response_headers, 'body': dumps(payload)}
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    """Build the standard `{success: false, error}` response"""
+    return respond(status_code, {'success': False, 'error': message})
+
+def streams_responses(context: Any) -> bool:
+    """Whether the host sends an iterator body part by part (the self-hosted server); Lambda behind
+    API Gateway returns the whole body at once"""
+    return bool(getattr(context, 'streams_responses', False))
+
+def event_stream(frames: Iterator[str], context: Any) -> Dict[str, Any]:
+    """Server-sent events response; the frames stay an iterator for hosts that stream and are joined otherwise"""
+    headers = {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'}
+    return {'statusCode': 200, 'headers': headers, 'body': frames if streams_responses(context) else ''.join(frames)}
+
+# Routing
+
+class Router:
+    """(method, path) dispatch table; `{name}` segments are exposed as event['pathParameters']
+    and the matched pattern as event['routeTemplate']"""
+
+    def __init__(self):
+        self._static: Dict[Tuple[str, str], Handler] = {}
+        self._dynamic: Dict[Tuple[str, int], List[Tuple[List[str], Handler, str]]] = {}
+
+    def add(self, method: str, path: str, handler: Handler) -> None:
+        segments = path.strip('/').split('/')
+        if any(segment.startswith('{') for segment in segments):
+            self._dynamic.setdefault((method, len(segments)), []).append((segments, handler, path))
+        else:
+            self._static[(method, path)] = handler
+
+    def route(self, method: str, path: str) -> Callable[[Handler], Handler]:
+        """Decorator form of add()"""
+        def register(handler: Handler) -> Handler:
+            self.add(method, path, handler)
+            return handler
+        return register
+
+    def match(self, method: str, path: str) -> Tuple[Optional[Handler], Dict[str, str], Optional[str]]:
+        """Handler, path parameters and the registered path pattern for a request"""
+        handler = self._static.get((method, path))
+        if handler is not None:
+            return handler, {}, path
+
+        segments = path.strip('/').split('/')
+        for pattern, handler, template in self._dynamic.get((method, len(segments)), []):
+            params = {}
+            for expected, actual in zip(pattern, segments):
+                if expected.startswith('{'):
+                    params[expected[1:-1]] = actual
+                elif expected != actual:
+                    break
+            else:
+                return handler, params, template
+        return None, {}, None
+
+    def resolve(self, method: str, path: str) -> Tuple[Optional[Handler], Dict[str, str]]:
+        handler, params, _ = self.match(method, path)
+        return handler, params
+
+    def dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        http = event['requestContext']['http']
+        handler, params, template = self.match(http['method'], http['path'])
+        if handler is None:
+            return error_response(404, 'Endpoint not found')
+        event['routeTemplate'] = template
+        if params:
+            event['pathParameters'] = {**(event.get('pathParameters') or {}), **params}
+        return handler(event, context)
+
+# Middleware
+
+def cors_middleware(event: Dict[str, Any], context: Any, next_handler: Handler) -> Dict[str, Any]:
+    """Answer preflight requests and add CORS headers to every response"""
+    if event['requestContext']['http']['method'] == 'OPTIONS':
+        return {'statusCode': 200, 'headers': {**CORS_HEADERS, 'Content-Type': 'application/json'}, 'body': ''}
+    response = next_handler(event, context)
+    response['headers'] = {**CORS_HEADERS, **(response.get('headers') or {})}
+    return response
+
+def error_middleware(event: Dict[str, Any], context: Any, next_handler: Handler) -> Dict[str, Any]:
+    """Turn uncaught exceptions into a 500 response"""
+    try:
+        return next_handler(event, context)
+    except Exception as e:
+        return error_response(500, str(e))
+
+def timing_middleware(event: Dict[str, Any], context: Any, next_handler: Handler) -> Dict[str, Any]:
+    """Report handler time in a Server-Timing header"""
+    started = time.perf_counter()
+    response = next_handler(event, context)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    response.setdefault('headers', {})['Server-Timing'] = f'app;dur={elapsed_ms:.1f}'
+    return response
+
+def entity_tag(body: str) -> str:
+    """Strong ETag over the identity-encoded body"""
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 specifies); a tag sent back for an encoded
+    variant (`"<hash>-gzip"`) matches the identity tag it was derived from"""
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        tag = candidate.strip()
+        tag = tag[2:] if tag.startswith('W/') else tag
+        for encoding in ('br', 'gzip'):
+            if tag.endswith(f'-{encoding}"'):
+                tag = tag[:-len(encoding) - 2] + '"'
+        if tag == opaque:
+            return True
+    return False
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred content coding from an Accept-Encoding header: br (when installed) or gzip, else None"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        weight = 1.0
+        if params.strip().startswith('q='):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        if coding:
+            weights[coding.strip().lower()] = weight
+    supported = (['br'] if BROTLI_AVAILABLE else []) + ['gzip']
+    # Server preference breaks ties between equally weighted codings
+    ranked = sorted(supported, key=lambda c: -weights.get(c, weights.get('*', 0.0)))
+    best = ranked[0]
+    return best if weights.get(best, weights.get('*', 0.0)) > 0 else None
+
+def conditional_get_middleware(event: Dict[str, Any], context: Any, next_handler: Handler) -> Dict[str, Any]:
+    """Tag successful GET responses with a strong ETag and answer a matching If-None-Match with 304"""
+    response = next_handler(event, context)
+    if (event['requestContext']['http']['method'] != 'GET' or response.get('statusCode') != 200
+            or response.get('isBase64Encoded') or not isinstance(response.get('body'), str)):
+        return response
+    headers = {**(response.get('headers') or {})}
+    headers.setdefault('ETag', entity_tag(response['body']))
+    # Clients may keep the body but must revalidate it, which is a 304 when nothing changed
+    headers.setdefault('Cache-Control', 'no-cache')
+    if_none_match = request_header(event, 'if-none-match')
+    if if_none_match and etag_matches(if_none_match, headers['ETag']):
+        count('NotModified', 1)
+        return {'statusCode': 304, 'headers': {k: v for k, v in headers.items() if k != 'Content-Type'}, 'body': ''}
+    return {**response, 'headers': headers}
+
+def compression_middleware(event: Dict[str, Any], context: Any, next_handler: Handler) -> Dict[str, Any]:
+    """Encode large text responses per Accept-Encoding. The HTTP API passes the bytes through
+    when the body is base64 with `isBase64Encoded` set"""
+    response = next_handler(event, context)
+    headers = response.get('headers') or {}
+    body = response.get('body')
+    if (not isinstance(body, str) or response.get('isBase64Encoded') or 'Content-Encoding' in headers
+            or not headers.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return response
+    vary = headers.get('Vary')
+    headers = {**headers, 'Vary': f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'}
+    encoding = negotiate_encoding(request_header(event, 'accept-encoding') or '')
+    if encoding is None:
+        return {**response, 'headers': headers}
+    with span('compress', encoding=encoding, bytes=len(raw)) as compressing:
+        if encoding == 'br':
+            encoded = brotli.compress(raw, quality=BROTLI_QUALITY)
+        else:
+            encoded = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+        compressing.set(encodedBytes=len(encoded))
+    headers['Content-Encoding'] = encoding
+    etag = headers.get('ETag')
+    if etag and etag.endswith('"'):
+        # Each encoding is its own representation, so it gets its own strong tag
+        headers['ETag'] = f'{etag[:-1]}-{encoding}"'
+    return {**response, 'headers': headers, 'body': base64.b64encode(encoded).decode('ascii'), 'isBase64Encoded': True}
+
+DEFAULT_MIDDLEWARE: List[Middleware] = [cors_middleware, tracing_middleware, compression_middleware,
+                                        conditional_get_middleware, error_middleware, timing_middleware]
+
+def build_pipeline(router: Router, middleware: Optional[List[Middleware]] = None) -> Handler:
+    """Compose middleware (outermost first) around the router"""
+    handler: Handler = router.dispatch
+    for layer in reversed(DEFAULT_MIDDLEWARE if middleware is None else middleware):
+        handler = (lambda layer, inner: lambda event, context: layer(event, context, inner))(layer, handler)
+    return handler
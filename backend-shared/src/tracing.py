@@ -0,0 +1,211 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional, List, Callable
+
+# Fraction of requests traced; 0 (the default) turns tracing off entirely
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+# Optional JSON-lines file that receives every sampled trace with its spans
+TRACE_EXPORT_PATH = os.environ.get('TRACE_EXPORT_PATH')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Advisoria')
+SERVICE_NAME = os.environ.get('SERVICE_NAME') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+TRACING_ENABLED = TRACE_SAMPLE_RATE > 0
+
+# EMF metric names for span categories that don't title-case cleanly
+METRIC_PREFIXES = {'dynamodb': 'DynamoDB', 's3': 'S3'}
+
+_current: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+_export_lock = threading.Lock()
+
+class Span:
+    """One timed phase of a request; attributes can be added while it is open"""
+
+    __slots__ = ('name', 'attrs', 'started', 'duration_ms', 'offset_ms')
+
+    def __init__(self, trace: 'Trace', name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.offset_ms = round((self.started - trace.started) * 1000, 3)
+        self.duration_ms = 0.0
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'startMs': self.offset_ms, 'durationMs': self.duration_ms, **self.attrs}
+
+class _SpanContext:
+    __slots__ = ('trace', 'span')
+
+    def __init__(self, trace: 'Trace', name: str, attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span = Span(trace, name, attrs)
+
+    def __enter__(self) -> Span:
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.span.duration_ms = round((time.perf_counter() - self.span.started) * 1000, 3)
+        if exc_type is not None:
+            self.span.attrs['error'] = exc_type.__name__
+        self.trace.add(self.span)
+
+class _NoopSpan:
+    """Returned when the request is not sampled; every operation is a no-op"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    def set(self, **attrs) -> None:
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Trace:
+    """Spans and counters collected for one sampled request (safe to add to from worker threads)"""
+
+    def __init__(self, route: str):
+        self.trace_id = uuid.uuid4().hex
+        self.route = route
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def count(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+def span(name: str, **attrs) -> Any:
+    """Time a block as a span of the current trace: `with span('dynamodb.put_item', table=...) as s:`"""
+    trace = _current.get()
+    if trace is None:
+        return NOOP_SPAN
+    return _SpanContext(trace, name, attrs)
+
+def count(name: str, value: float) -> None:
+    """Add to a per-request counter (e.g. BedrockInputTokens) reported as an EMF metric"""
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, value)
+
+def propagate(fn: Callable) -> Callable:
+    """Carry the current trace into a worker thread (wrap callables passed to executor.submit)"""
+    if _current.get() is None:
+        return fn
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+class TracedClient:
+    """Proxy that records a span for every method call on an AWS client, resource or table"""
+
+    def __init__(self, target: Any, service: str, **attrs):
+        self._target = target
+        self._service = service
+        self._attrs = attrs
+
+    def __getattr__(self, name: str) -> Any:
+        value = getattr(self._target, name)
+        if name.startswith('_') or not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return value(*args, **kwargs)
+            with _SpanContext(trace, f'{self._service}.{name}', dict(self._attrs)):
+                return value(*args, **kwargs)
+        return call
+
+def traced(target: Any, service: str, **attrs) -> Any:
+    """Wrap a client for span recording; returns it untouched when tracing is disabled"""
+    if not TRACING_ENABLED or target is None:
+        return target
+    return TracedClient(target, service, **attrs)
+
+def span_totals(trace: Trace) -> Dict[str, float]:
+    """Milliseconds per span category (the part of the name before the first dot)"""
+    totals: Dict[str, float] = {}
+    for recorded in trace.spans:
+        category = recorded.name.split('.', 1)[0]
+        totals[category] = totals.get(category, 0.0) + recorded.duration_ms
+    return totals
+
+def emf_record(trace: Trace, duration_ms: float, status_code: int) -> Dict[str, Any]:
+    """CloudWatch embedded-metric-format record for one traced request"""
+    metrics = {'RequestMs': round(duration_ms, 3)}
+    for category, total in span_totals(trace).items():
+        prefix = METRIC_PREFIXES.get(category) or ''.join(part.capitalize() for part in category.split('_'))
+        metrics[f'{prefix}Ms'] = round(total, 3)
+    metrics.update(trace.counters)
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Service', 'Route']],
+                'Metrics': [
+                    {'Name': name, 'Unit': 'Milliseconds' if name.endswith('Ms') else 'Count'}
+                    for name in metrics
+                ]
+            }]
+        },
+        'Service': SERVICE_NAME,
+        'Route': trace.route,
+        'StatusCode': status_code,
+        'SampleRate': TRACE_SAMPLE_RATE,
+        'traceId': trace.trace_id,
+        **metrics
+    }
+
+def export_trace(trace: Trace, duration_ms: float, status_code: int) -> None:
+    """Append the trace and its spans to TRACE_EXPORT_PATH as one JSON line"""
+    line = json.dumps({
+        'traceId': trace.trace_id,
+        'service': SERVICE_NAME,
+        'route': trace.route,
+        'statusCode': status_code,
+        'durationMs': round(duration_ms, 3),
+        'counters': trace.counters,
+        'spans': [recorded.to_dict() for recorded in sorted(trace.spans, key=lambda s: s.offset_ms)]
+    }, default=str)
+    with _export_lock:
+        with open(TRACE_EXPORT_PATH, 'a') as f:
+            f.write(line + '\n')
+
+def tracing_middleware(event: Dict[str, Any], context: Any, next_handler: Callable) -> Dict[str, Any]:
+    """Trace a sampled fraction of requests; emits one EMF line per traced request"""
+    if not TRACING_ENABLED or random.random() >= TRACE_SAMPLE_RATE:
+        return next_handler(event, context)
+
+    http = event['requestContext']['http']
+    trace = Trace(http['path'])
+    token = _current.set(trace)
+    status_code = 500
+    try:
+        response = next_handler(event, context)
+        status_code = response.get('statusCode', 200)
+        return response
+    finally:
+        _current.reset(token)
+        # The router records the matched pattern, which keeps path parameters out of the dimension
+        trace.route = f"{http['method']} {event.get('routeTemplate') or http['path']}"
+        duration_ms = (time.perf_counter() - trace.started) * 1000
+        print(json.dumps(emf_record(trace, duration_ms, status_code)))
+        if TRACE_EXPORT_PATH:
+            export_trace(trace, duration_ms, status_code)
@@ -0,0 +1,370 @@
+"""In-memory stand-ins for the DynamoDB resource and S3 client used by the handlers.
+
+They implement the subset of the boto3 API the handlers call, with DynamoDB's
+visible behaviour where it matters for benchmarks and local runs: items are
+copied in and out, numbers come back as Decimal, floats are rejected, key
+conditions (boto3.dynamodb.conditions) select on the table or a GSI, results
+are ordered by sort key, Limit / ExclusiveStartKey paginate and conditional
+writes fail with ConditionalCheckFailedException.
+
+Install them into an imported handler module's client cache:
+
+    install_core_fakes(core_handler)
+"""
+import copy
+import io
+import re
+import threading
+import uuid
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+
+# Table name -> (hash key, range key, {index name: (hash key, range key)}); mirrors the templates
+TABLE_SCHEMAS: Dict[str, Tuple[str, Optional[str], Dict[str, Tuple[str, Optional[str]]]]] = {
+    'Business': ('businessId', None, {}),
+    'Campaigns': ('campaignId', None, {'BusinessIndex': ('businessId', None)}),
+    'Items': ('pk', None, {'BusinessIndex': ('businessId', None)}),
+    'Artifacts': ('pk', None, {}),
+    'Comparisons': ('comparisonId', None, {'BusinessIndex': ('businessId', None)}),
+    'ChatSessions': ('sessionId', None, {'BusinessIndex': ('businessId', None)}),
+    'ChatMessages': ('sessionId', 'ts', {}),
+    'ResponseCache': ('cacheKey', None, {}),
+    'Competitors': ('marketKey', None, {}),
+    'Idempotency': ('idempotencyKey', None, {}),
+    'Jobs': ('jobId', None, {}),
+}
+
+# Environment the handlers expect when running against the fakes
+FAKE_ENV = {
+    'BUSINESS_TABLE': 'Business',
+    'CAMPAIGNS_TABLE': 'Campaigns',
+    'ITEMS_TABLE': 'Items',
+    'ARTIFACTS_TABLE': 'Artifacts',
+    'COMPARISONS_TABLE': 'Comparisons',
+    'CHAT_SESSIONS_TABLE': 'ChatSessions',
+    'CHAT_MESSAGES_TABLE': 'ChatMessages',
+    'COMPETITORS_TABLE': 'Competitors',
+    'IDEMPOTENCY_TABLE': 'Idempotency',
+    'JOBS_TABLE': 'Jobs',
+    'UPLOADS_BUCKET': 'uploads',
+}
+
+def to_dynamo(value: Any) -> Any:
+    """Copy a value the way DynamoDB stores it: ints become Decimal, floats are rejected"""
+    if isinstance(value, bool) or value is None or isinstance(value, (str, bytes, Decimal)):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, dict):
+        return {k: to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {to_dynamo(v) for v in value}
+    raise TypeError(f'Unsupported type "{type(value)}" for value "{value}"')
+
+def _condition_matches(item: Dict[str, Any], condition: Any) -> bool:
+    """Evaluate a boto3.dynamodb.conditions key condition against an item"""
+    expression = condition.get_expression()
+    operator, values = expression['operator'], expression['values']
+    if operator == 'AND':
+        return all(_condition_matches(item, part) for part in values)
+    name = values[0].name
+    if name not in item:
+        return False
+    actual = item[name]
+    if operator == '=':
+        return actual == values[1]
+    if operator == '<':
+        return actual < values[1]
+    if operator == '<=':
+        return actual <= values[1]
+    if operator == '>':
+        return actual > values[1]
+    if operator == '>=':
+        return actual >= values[1]
+    if operator == 'BETWEEN':
+        return values[1] <= actual <= values[2]
+    if operator == 'begins_with':
+        return str(actual).startswith(values[1])
+    raise NotImplementedError(f'Key condition operator {operator}')
+
+_COMPARISONS = {'<': lambda a, b: a < b, '<=': lambda a, b: a <= b, '>': lambda a, b: a > b,
+                '>=': lambda a, b: a >= b, '=': lambda a, b: a == b, '<>': lambda a, b: a != b}
+
+def _clause_matches(item: Dict[str, Any], clause: str, values: Dict[str, Any], names: Dict[str, str]) -> bool:
+    clause = clause.strip()
+    if clause.startswith(('attribute_exists(', 'attribute_not_exists(')):
+        function, _, name = clause.rstrip(')').partition('(')
+        return (names.get(name.strip(), name.strip()) in item) == (function == 'attribute_exists')
+    name, operator, placeholder = clause.split()
+    name = names.get(name, name)
+    return name in item and _COMPARISONS[operator](item[name], values[placeholder])
+
+def _expression_matches(item: Optional[Dict[str, Any]], expression: str, values: Dict[str, Any],
+                        names: Dict[str, str]) -> bool:
+    """Evaluate a string ConditionExpression without parentheses: attribute_exists / attribute_not_exists /
+    `name <op> :value` clauses joined by AND and OR, AND binding tighter as in DynamoDB"""
+    item = item or {}
+    return any(all(_clause_matches(item, clause, values, names) for clause in group.split(' AND '))
+               for group in expression.split(' OR '))
+
+def _condition_failed(operation: str, item: Optional[Dict[str, Any]], return_old: bool) -> Exception:
+    from botocore.exceptions import ClientError
+    response: Dict[str, Any] = {'Error': {'Code': 'ConditionalCheckFailedException',
+                                          'Message': 'The conditional request failed'}}
+    if return_old and item is not None:
+        # Like boto3's resource layer, the old item is not deserialized on the error path
+        from boto3.dynamodb.types import TypeSerializer
+        serializer = TypeSerializer()
+        response['Item'] = {name: serializer.serialize(value) for name, value in item.items()}
+    return ClientError(response, operation)
+
+def _project(item: Dict[str, Any], projection: Optional[str], names: Dict[str, str]) -> Dict[str, Any]:
+    if not projection:
+        return item
+    fields = [names.get(field.strip(), field.strip()) for field in projection.split(',')]
+    return {field: item[field] for field in fields if field in item}
+
+class FakeTable:
+    """One DynamoDB table; thread-safe"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.hash_key, self.range_key, self.indexes = TABLE_SCHEMAS.get(name, ('pk', None, {}))
+        self.items: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, item: Dict[str, Any]) -> Tuple[Any, Any]:
+        if self.hash_key not in item or (self.range_key and self.range_key not in item):
+            raise ValueError('One or more parameter values were invalid: Missing the key')
+        return item[self.hash_key], item.get(self.range_key) if self.range_key else None
+
+    def _count(self, operation: str) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def put_item(self, Item: Dict[str, Any], ConditionExpression: Optional[str] = None,
+                 ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+                 ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                 ReturnValuesOnConditionCheckFailure: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        stored = to_dynamo(Item)
+        with self._lock:
+            self._count('put_item')
+            current = self.items.get(self._key(stored))
+            if ConditionExpression and not _expression_matches(
+                    current, ConditionExpression, to_dynamo(ExpressionAttributeValues or {}),
+                    ExpressionAttributeNames or {}):
+                raise _condition_failed('PutItem', current, ReturnValuesOnConditionCheckFailure == 'ALL_OLD')
+            self.items[self._key(stored)] = stored
+        return {}
+
+    def get_item(self, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._count('get_item')
+            item = self.items.get(self._key(to_dynamo(Key)))
+            return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def delete_item(self, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._count('delete_item')
+            self.items.pop(self._key(to_dynamo(Key)), None)
+        return {}
+
+    def update_item(self, Key: Dict[str, Any], UpdateExpression: str,
+                    ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+                    ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                    ConditionExpression: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """Supports `SET a = :a, #b = if_not_exists(#b, :b)` updates"""
+        values = to_dynamo(ExpressionAttributeValues or {})
+        names = ExpressionAttributeNames or {}
+        action, _, assignments = UpdateExpression.strip().partition(' ')
+        if action.upper() != 'SET':
+            raise NotImplementedError(f'Update action {action}')
+        key = to_dynamo(Key)
+        with self._lock:
+            self._count('update_item')
+            if ConditionExpression and not _expression_matches(self.items.get(self._key(key)), ConditionExpression,
+                                                               values, names):
+                raise _condition_failed('UpdateItem', None, False)
+            item = self.items.setdefault(self._key(key), dict(key))
+            for assignment in re.split(r',(?![^(]*\))', assignments):
+                name, _, placeholder = assignment.partition('=')
+                name, placeholder = names.get(name.strip(), name.strip()), placeholder.strip()
+                default = re.fullmatch(r'if_not_exists\(\s*[#\w]+\s*,\s*(:\w+)\s*\)', placeholder)
+                if default:
+                    item.setdefault(name, values[default.group(1)])
+                else:
+                    item[name] = values[placeholder]
+        return {}
+
+    def _page(self, items: List[Dict[str, Any]], key_names: List[str], Limit: Optional[int],
+              ExclusiveStartKey: Optional[Dict[str, Any]], ProjectionExpression: Optional[str],
+              ExpressionAttributeNames: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        if ExclusiveStartKey:
+            start = to_dynamo(ExclusiveStartKey)
+            for position, item in enumerate(items):
+                if all(item.get(name) == start.get(name) for name in key_names):
+                    items = items[position + 1:]
+                    break
+        page = items[:Limit] if Limit else items
+        response: Dict[str, Any] = {
+            'Items': [_project(copy.deepcopy(item), ProjectionExpression, ExpressionAttributeNames or {})
+                      for item in page],
+            'Count': len(page),
+        }
+        if Limit and len(items) > Limit:
+            last = page[-1]
+            response['LastEvaluatedKey'] = {name: last[name] for name in key_names if name in last}
+        return response
+
+    def query(self, KeyConditionExpression: Any, IndexName: Optional[str] = None, ScanIndexForward: bool = True,
+              Limit: Optional[int] = None, ExclusiveStartKey: Optional[Dict[str, Any]] = None,
+              ProjectionExpression: Optional[str] = None,
+              ExpressionAttributeNames: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, Any]:
+        hash_key, range_key = self.indexes[IndexName] if IndexName else (self.hash_key, self.range_key)
+        with self._lock:
+            self._count('query')
+            items = [item for item in self.items.values() if _condition_matches(item, KeyConditionExpression)]
+        if range_key:
+            items.sort(key=lambda item: item.get(range_key), reverse=not ScanIndexForward)
+        key_names = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        if IndexName:
+            key_names += [name for name in (hash_key, range_key) if name and name not in key_names]
+        return self._page(items, key_names, Limit, ExclusiveStartKey, ProjectionExpression, ExpressionAttributeNames)
+
+    def scan(self, Limit: Optional[int] = None, ExclusiveStartKey: Optional[Dict[str, Any]] = None,
+             ProjectionExpression: Optional[str] = None,
+             ExpressionAttributeNames: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._count('scan')
+            items = list(self.items.values())
+        key_names = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        return self._page(items, key_names, Limit, ExclusiveStartKey, ProjectionExpression, ExpressionAttributeNames)
+
+    def batch_writer(self, **kwargs) -> 'FakeBatchWriter':
+        return FakeBatchWriter(self)
+
+class FakeBatchWriter:
+    def __init__(self, table: FakeTable):
+        self.table = table
+
+    def __enter__(self) -> 'FakeBatchWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def put_item(self, Item: Dict[str, Any]) -> None:
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key: Dict[str, Any]) -> None:
+        self.table.delete_item(Key=Key)
+
+class FakeDynamoDBResource:
+    """boto3.resource('dynamodb') stand-in; tables are created on first reference"""
+
+    def __init__(self):
+        self.tables: Dict[str, FakeTable] = {}
+        self._lock = threading.Lock()
+
+    def Table(self, name: str) -> FakeTable:
+        with self._lock:
+            if name not in self.tables:
+                self.tables[name] = FakeTable(name)
+            return self.tables[name]
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]], **kwargs) -> Dict[str, Any]:
+        if sum(len(requests) for requests in RequestItems.values()) > 25:
+            raise ValueError('Too many items requested for the BatchWriteItem call')
+        for table_name, requests in RequestItems.items():
+            table = self.Table(table_name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    table.put_item(Item=request['PutRequest']['Item'])
+                else:
+                    table.delete_item(Key=request['DeleteRequest']['Key'])
+        return {'UnprocessedItems': {}}
+
+    def batch_get_item(self, RequestItems: Dict[str, Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        if sum(len(request['Keys']) for request in RequestItems.values()) > 100:
+            raise ValueError('Too many items requested for the BatchGetItem call')
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self.Table(table_name)
+            items = (table.get_item(Key=key).get('Item') for key in request['Keys'])
+            responses[table_name] = [item for item in items if item is not None]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+class FakeS3Client:
+    """boto3.client('s3') stand-in: objects in a dict, presigned URLs on a local host"""
+
+    def __init__(self):
+        self.objects: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.multipart: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def generate_presigned_url(self, ClientMethod: str, Params: Dict[str, Any], ExpiresIn: int = 3600,
+                               **kwargs) -> str:
+        extra = ''.join(f'&{name}={value}' for name, value in Params.items() if name not in ('Bucket', 'Key'))
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?X-Amz-Expires={ExpiresIn}{extra}"
+
+    def put_object(self, Bucket: str, Key: str, Body: Any = b'', **kwargs) -> Dict[str, Any]:
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        with self._lock:
+            self.objects[(Bucket, Key)] = {'Body': data, **kwargs}
+        return {'ETag': f'"{hash(data) & 0xffffffff:08x}"'}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.multipart[upload_id] = {'Bucket': Bucket, 'Key': Key, 'Parts': {}, **kwargs}
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: Any = b'',
+                    **kwargs) -> Dict[str, Any]:
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        etag = f'"{hash(data) & 0xffffffff:08x}"'
+        with self._lock:
+            self.multipart[UploadId]['Parts'][PartNumber] = (etag, data)
+        return {'ETag': etag}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any],
+                                  **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            upload = self.multipart.get(UploadId)
+            if upload is None or upload['Key'] != Key:
+                raise KeyError(f'NoSuchUpload: {UploadId}')
+            chunks = []
+            for part in MultipartUpload['Parts']:
+                etag, data = upload['Parts'].get(part['PartNumber'], (None, b''))
+                if etag != part['ETag']:
+                    raise ValueError(f"InvalidPart: {part['PartNumber']}")
+                chunks.append(data)
+            del self.multipart[UploadId]
+            extra = {k: v for k, v in upload.items() if k not in ('Bucket', 'Key', 'Parts')}
+            self.objects[(Bucket, Key)] = {'Body': b''.join(chunks), **extra}
+        return {'Bucket': Bucket, 'Key': Key, 'ETag': f'"{len(chunks)}-parts"'}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self.multipart.pop(UploadId, None)
+        return {}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise KeyError(f'NoSuchKey: {Key}')
+        return {**{k: v for k, v in stored.items() if k != 'Body'}, 'Body': io.BytesIO(stored['Body'])}
+
+def install_core_fakes(module: Any, dynamodb: Optional[FakeDynamoDBResource] = None,
+                       s3: Optional[FakeS3Client] = None) -> Tuple[FakeDynamoDBResource, FakeS3Client]:
+    """Pre-populate a handler's memoized clients so it never builds real AWS clients"""
+    dynamodb = dynamodb or FakeDynamoDBResource()
+    s3 = s3 or FakeS3Client()
+    module._clients['dynamodb'] = dynamodb
+    module._clients['s3'] = s3
+    return dynamodb, s3
@@ -0,0 +1,88 @@
+"""Load test for backend-ai/src/bedrock_client.py against the local fake Bedrock.
+
+Worker threads call the model as fast as they can for a fixed time while the
+fake enforces an account quota (calls above it are throttled) and injects
+latency, random throttles and server errors. The run is repeated with the
+unprotected client (one attempt, no limiter, no breaker) and the resilient one
+and reports successful calls per second, calls that reached the service,
+throttles and fallbacks by reason.
+
+    python bench/bedrock_resilience.py --quota 20 --workers 16 --seconds 5
+    python bench/bedrock_resilience.py --error-rate 1.0   # outage: the circuit opens
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'backend-ai', 'src'))
+
+from bedrock_client import (
+    BedrockUnavailable, CircuitBreaker, FakeBedrockRuntime, ResilientBedrockClient, TokenBucket, error_code
+)
+
+BODY = json.dumps({'messages': [{'role': 'user', 'content': 'Generate 8 creative marketing ideas'}]})
+
+def unprotected_call(fake: FakeBedrockRuntime) -> None:
+    try:
+        fake.invoke_model(modelId='fake', body=BODY)
+    except Exception as e:
+        code = error_code(e)
+        raise BedrockUnavailable('throttled' if code and 'Throttl' in code else 'error', str(e))
+
+def run(call, workers: int, seconds: float) -> Dict[str, Any]:
+    outcomes: Dict[str, int] = {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def worker():
+        while time.monotonic() < stop_at:
+            try:
+                call()
+                outcome = 'ok'
+            except BedrockUnavailable as e:
+                outcome = e.reason
+            with lock:
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quota', type=float, default=20.0, help='simulated account quota, calls/s')
+    parser.add_argument('--rate', type=float, default=30.0, help='client-side starting rate limit, calls/s')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--latency-ms', type=float, default=40.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    def make_fake() -> FakeBedrockRuntime:
+        return FakeBedrockRuntime(throttle_rate=args.throttle_rate, error_rate=args.error_rate,
+                                  latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 2,
+                                  quota_rps=args.quota, seed=7)
+
+    print(f"{'client':<12} {'ok/s':>7} {'service calls':>14}  outcomes")
+
+    fake = make_fake()
+    outcomes = run(lambda: unprotected_call(fake), args.workers, args.seconds)
+    print(f"{'unprotected':<12} {outcomes.get('ok', 0) / args.seconds:>7.1f} {fake.calls:>14}  {outcomes}")
+
+    fake = make_fake()
+    client = ResilientBedrockClient(fake, TokenBucket(args.rate, int(args.rate)), CircuitBreaker(5, 1.0))
+    outcomes = run(lambda: client.invoke_model(modelId='fake', body=BODY), args.workers, args.seconds)
+    print(f"{'resilient':<12} {outcomes.get('ok', 0) / args.seconds:>7.1f} {fake.calls:>14}  {outcomes}")
+    print(f"\nresilient client stats: {client.stats()}")
+
+if __name__ == '__main__':
+    main()
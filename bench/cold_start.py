@@ -0,0 +1,175 @@
+"""Cold-start benchmark for the core and AI Lambda handlers.
+
+Every sample runs in a fresh interpreter: it imports the handler, sends one
+request for a route and reports import time, first-request time and the
+per-component init timings logged by COLD_START_PROFILE. AWS calls go to a
+local stub endpoint (AWS_ENDPOINT_URL), so no account or network is needed,
+only boto3.
+
+Compare against an older revision by pointing --repo at another checkout:
+
+    git worktree add /tmp/advisoria-base <rev>
+    python bench/cold_start.py --repo /tmp/advisoria-base
+    python bench/cold_start.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORE_ENV = {
+    'BUSINESS_TABLE': 'Business',
+    'CAMPAIGNS_TABLE': 'Campaigns',
+    'ITEMS_TABLE': 'Items',
+    'COMPARISONS_TABLE': 'Comparisons',
+    'CHAT_SESSIONS_TABLE': 'ChatSessions',
+    'CHAT_MESSAGES_TABLE': 'ChatMessages',
+    'UPLOADS_BUCKET': 'uploads',
+}
+
+CAMPAIGN = {'businessId': 'b-1', 'goal': 'awareness', 'targetAudience': 'locals', 'budget': 300}
+
+# (handler, method, path, body or query)
+ROUTES = [
+    ('core', 'OPTIONS', '/items', None),
+    ('core', 'POST', '/signup', {'name': 'Bakery', 'industry': 'bakery', 'country': 'SG', 'city': 'Singapore',
+                                 'zipCode': '000000', 'workingHours': {'start': '07:00', 'end': '19:00'}}),
+    ('core', 'POST', '/campaigns', CAMPAIGN),
+    ('core', 'POST', '/campaigns/batch', {'records': [CAMPAIGN] * 30}),
+    ('core', 'GET', '/items', {'businessId': 'b-1'}),
+    ('core', 'POST', '/items', {'businessId': 'b-1', 'kind': 'note'}),
+    ('core', 'POST', '/uploads/presign', {'fileName': 'logo.png', 'fileType': 'image/png'}),
+    ('ai', 'OPTIONS', '/ideas/generate', None),
+    ('ai', 'POST', '/ideas/generate', {'businessName': 'Bakery', 'industry': 'bakery'}),
+    ('ai', 'POST', '/creatives/generate', {'businessName': 'Bakery', 'industry': 'bakery'}),
+    ('ai', 'POST', '/plan/generate', {'businessName': 'Bakery', 'budget': 300}),
+    ('ai', 'GET', '/competitors/generate', {'industry': 'bakery', 'city': 'Singapore'}),
+    ('ai', 'POST', '/chat/complete', {'messages': [{'role': 'user', 'content': 'Hello'}]}),
+]
+
+# Runs inside the child interpreter
+DRIVER = r'''
+import json, sys, time
+src, shared, module_name, event = sys.argv[1], sys.argv[2], sys.argv[3], json.loads(sys.argv[4])
+sys.path[:0] = [src, shared]
+started = time.perf_counter()
+module = __import__(module_name)
+imported = time.perf_counter()
+response = module.lambda_handler(event, None)
+finished = time.perf_counter()
+print('BENCH ' + json.dumps({
+    'importMs': (imported - started) * 1000,
+    'firstRequestMs': (finished - imported) * 1000,
+    'statusCode': response.get('statusCode'),
+}))
+'''
+
+class StubAwsHandler(BaseHTTPRequestHandler):
+    """Answers every AWS API call with an empty JSON document"""
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+def build_event(method: str, path: str, payload: Any) -> Dict[str, Any]:
+    event = {'requestContext': {'http': {'method': method, 'path': path}}, 'headers': {}}
+    if method == 'GET':
+        event['queryStringParameters'] = payload or {}
+    elif payload is not None:
+        event['body'] = json.dumps(payload)
+    return event
+
+def run_sample(repo: str, handler: str, event: Dict[str, Any], env: Dict[str, str]) -> Dict[str, Any]:
+    src = os.path.join(repo, f'backend-{handler}', 'src')
+    shared = os.path.join(repo, 'backend-shared', 'src')
+    module_name = f'{handler}_handler'
+    output = subprocess.run(
+        [sys.executable, '-c', DRIVER, src, shared, module_name, json.dumps(event)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+
+    sample: Dict[str, Any] = {'components': {}}
+    for line in output.splitlines():
+        if line.startswith('BENCH '):
+            sample.update(json.loads(line[len('BENCH '):]))
+        elif '"cold_start"' in line:
+            sample['components'] = json.loads(line).get('components', {})
+    return sample
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    components: Dict[str, List[float]] = {}
+    for sample in samples:
+        for name, value in sample['components'].items():
+            components.setdefault(name, []).append(value)
+    return {
+        'importMs': round(statistics.median(s['importMs'] for s in samples), 1),
+        'firstRequestMs': round(statistics.median(s['firstRequestMs'] for s in samples), 1),
+        'totalMs': round(statistics.median(s['importMs'] + s['firstRequestMs'] for s in samples), 1),
+        'statusCode': samples[-1]['statusCode'],
+        'components': {name: round(statistics.median(values), 1) for name, values in components.items()},
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repo', default=REPO_ROOT, help='checkout to benchmark (default: this one)')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per route')
+    parser.add_argument('--route', help='only routes whose path contains this string')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubAwsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    env = {
+        **os.environ,
+        **CORE_ENV,
+        'AWS_ENDPOINT_URL': f'http://127.0.0.1:{server.server_port}',
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+        'AWS_DEFAULT_REGION': 'ap-southeast-1',
+        'AWS_MAX_ATTEMPTS': '1',
+        'RESPONSE_CACHE_ENABLED': 'false',
+        'COLD_START_PROFILE': 'true',
+    }
+
+    results = []
+    for handler, method, path, payload in ROUTES:
+        if args.route and args.route not in path:
+            continue
+        event = build_event(method, path, payload)
+        samples = [run_sample(args.repo, handler, event, env) for _ in range(args.runs)]
+        results.append({'handler': handler, 'route': f'{method} {path}', **summarize(samples)})
+
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'handler':<6} {'route':<28} {'status':>6} {'import':>8} {'first req':>10} {'total':>8}  components")
+    for r in results:
+        components = ', '.join(f'{k}={v}' for k, v in r['components'].items())
+        print(f"{r['handler']:<6} {r['route']:<28} {r['statusCode']:>6} {r['importMs']:>8} "
+              f"{r['firstRequestMs']:>10} {r['totalMs']:>8}  {components}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Bytes on the wire and client latency for repeat dashboard loads.
+
+A dashboard load is the GETs the web app polls (web/src/lib/fetchers.ts):
+GET /items for a business, GET /businesses/{id}/overview and
+GET /competitors/generate. Both handlers run in this process against the
+in-memory fakes (bench/aws_fakes.py). A --change-rate fraction of loads is
+preceded by an edit to one of the listed items, so the listing sometimes changes.
+
+Each client mode replays the same sequence of loads:
+
+- plain: no Accept-Encoding and no validators (the old client);
+- compressed: `Accept-Encoding: gzip, deflate, br`;
+- revalidated: a browser HTTP cache, which also sends If-None-Match with the
+  stored ETag and reuses its copy on 304.
+
+The report gives bytes sent per load, handler time, and client time estimated
+as handler time plus transfer at --bandwidth-mbps. The data in every decoded
+or revalidated body is checked against a plain response for the same load.
+
+    python bench/conditional_get.py --loads 200 --items 100 --bandwidth-mbps 10
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, 'backend-core', 'src'), os.path.join(REPO_ROOT, 'backend-ai', 'src'),
+                os.path.join(REPO_ROOT, 'backend-shared', 'src')]
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aws_fakes import FAKE_ENV, FakeDynamoDBResource, install_core_fakes
+
+for name, value in FAKE_ENV.items():
+    os.environ.setdefault(name, value)
+
+import ai_handler
+import core_handler
+from bedrock_client import FakeBedrockRuntime, ResilientBedrockClient, TokenBucket
+from cold_start import build_event
+from competitor_store import CompetitorCache, DynamoDBCompetitorStore
+
+BUSINESS_ID = 'b-1'
+# (handler module, path, query)
+DASHBOARD = [
+    (core_handler, '/items', {'businessId': BUSINESS_ID, 'limit': '100'}),
+    (core_handler, f'/businesses/{BUSINESS_ID}/overview', None),
+    (ai_handler, '/competitors/generate', {'businessId': BUSINESS_ID, 'industry': 'bakery', 'city': 'Singapore'}),
+]
+MODES = {
+    'plain': {},
+    'compressed': {'accept-encoding': 'gzip, deflate, br'},
+    'revalidated': {'accept-encoding': 'gzip, deflate, br'},
+}
+
+def seed(dynamodb: FakeDynamoDBResource, items: int) -> None:
+    dynamodb.Table('Business').put_item(Item={'businessId': BUSINESS_ID, 'name': 'Sunrise Bakery', 'industry': 'bakery'})
+    for index in range(10):
+        dynamodb.Table('Campaigns').put_item(Item={'campaignId': f'campaign-{index:03d}', 'businessId': BUSINESS_ID,
+                                                   'goal': 'more weekday walk-ins', 'budget': 300, 'status': 'draft'})
+    for index in range(items):
+        put_item(dynamodb, index, f'Marketing idea {index}')
+
+def put_item(dynamodb: FakeDynamoDBResource, index: int, title: str) -> None:
+    dynamodb.Table('Items').put_item(Item={
+        'pk': f'item-{index:05d}', 'businessId': BUSINESS_ID, 'kind': 'idea', 'title': title,
+        'description': 'Behind-the-scenes content showing the team preparing the day. ' * 2,
+        'platform': 'Instagram', 'createdAt': '2024-01-01T09:00:00'
+    })
+
+def decode(response: Dict[str, Any]) -> Tuple[bytes, str]:
+    """(bytes on the wire, decoded body text)"""
+    body = response.get('body') or ''
+    if not response.get('isBase64Encoded'):
+        return body.encode('utf-8'), body
+    raw = base64.b64decode(body)
+    encoding = response['headers'].get('Content-Encoding')
+    if encoding == 'gzip':
+        return raw, gzip.decompress(raw).decode('utf-8')
+    if encoding == 'br':
+        import brotli
+        return raw, brotli.decompress(raw).decode('utf-8')
+    return raw, raw.decode('utf-8')
+
+def run(mode: str, loads: List[int], items: int, bandwidth_mbps: float) -> Dict[str, Any]:
+    dynamodb = FakeDynamoDBResource()
+    # Tables are memoized per handler; each run starts from fresh fakes
+    core_handler._clients.clear()
+    ai_handler._clients.clear()
+    install_core_fakes(core_handler, dynamodb)
+    install_core_fakes(ai_handler, dynamodb)
+    seed(dynamodb, items)
+    ai_handler._clients['bedrock'] = ResilientBedrockClient(FakeBedrockRuntime(ai_handler.fake_bedrock_reply),
+                                                            TokenBucket(1e6, 10 ** 6))
+    ai_handler._clients['competitorCache'] = CompetitorCache(DynamoDBCompetitorStore(dynamodb.Table('Competitors')))
+
+    # The browser cache: path -> (ETag, body)
+    cache: Dict[str, Tuple[str, str]] = {}
+    wire, handler_ms, client_ms, mismatches, not_modified = [], [], [], 0, 0
+    for number, edited in enumerate(loads):
+        if edited >= 0:
+            put_item(dynamodb, edited, f'Marketing idea {edited} (edited before load {number})')
+        load_bytes, load_ms = 0, 0.0
+        for module, path, query in DASHBOARD:
+            event = build_event('GET', path, query)
+            event['headers'] = dict(MODES[mode])
+            reference_event = build_event('GET', path, query)
+            if mode == 'revalidated' and path in cache:
+                event['headers']['if-none-match'] = cache[path][0]
+            started = time.perf_counter()
+            response = module.lambda_handler(event, None)
+            load_ms += (time.perf_counter() - started) * 1000
+            raw, text = decode(response)
+            load_bytes += len(raw)
+            if response['statusCode'] == 304:
+                not_modified += 1
+                text = cache[path][1]
+            elif mode == 'revalidated':
+                cache[path] = (response['headers']['ETag'], text)
+            reference = module.lambda_handler(reference_event, None)
+            # meta.cache on competitors says whether that call hit the cache, so only data is compared
+            mismatches += json.loads(text)['data'] != json.loads(reference['body'])['data']
+        wire.append(load_bytes)
+        handler_ms.append(load_ms)
+        client_ms.append(load_ms + load_bytes * 8 / (bandwidth_mbps * 1e6) * 1000)
+    return {
+        'bytes': statistics.fmean(wire),
+        'handlerMs': statistics.fmean(handler_ms),
+        'clientMs': statistics.fmean(client_ms),
+        'notModified': not_modified / (len(loads) * len(DASHBOARD)),
+        'mismatches': mismatches,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loads', type=int, default=200)
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--change-rate', type=float, default=0.1)
+    parser.add_argument('--bandwidth-mbps', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Per load, the index of the item edited before it, or -1
+    loads = [-1] + [rng.randrange(args.items) if rng.random() < args.change_rate else -1 for _ in range(args.loads - 1)]
+    print(f"{'client':<12}{'bytes/load':>12}{'handler ms':>12}{'client ms':>11}{'304s':>7}{'mismatches':>12}")
+    for mode in MODES:
+        result = run(mode, loads, args.items, args.bandwidth_mbps)
+        print(f"{mode:<12}{result['bytes']:>12.0f}{result['handlerMs']:>12.2f}{result['clientMs']:>11.2f}"
+              f"{result['notModified'] * 100:>6.0f}%{result['mismatches']:>12}")
+
+if __name__ == '__main__':
+    main()
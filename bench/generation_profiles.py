@@ -0,0 +1,145 @@
+"""Latency and output check for the generation profiles (backend-ai/src/generation_profiles.py).
+
+Drives the AI handler against FakeBedrockRuntime with a responder that answers
+in the requested format but, for a fraction of calls (--ramble-rate), keeps
+going past it: more numbered ideas, more posters and competitors, closing remarks. That is
+how real completions run long. Generation is paced at --tokens-per-second, so
+latency follows output length the way it does on Bedrock. Each route runs
+twice, once with profiles and once with every call on the old flat 2000-token
+limit, and the report gives p50/p95 latency, output tokens per call and whether
+the structured output still parsed (8 ideas, a script, a score per competitor,
+no fallbacks).
+
+    python bench/generation_profiles.py --requests 40 --tokens-per-second 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, Any, List, Callable
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, 'backend-ai', 'src'), os.path.join(REPO_ROOT, 'backend-shared', 'src')]
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import ai_handler
+import generation_profiles
+from aws_fakes import install_core_fakes
+from bedrock_client import FakeBedrockRuntime, ResilientBedrockClient, TokenBucket
+from cold_start import build_event
+
+BUSINESS = {'businessName': 'Sunrise Bakery', 'industry': 'bakery', 'city': 'Singapore', 'budget': 300,
+            'goal': 'more weekday walk-ins', 'targetAudience': 'office workers nearby'}
+COMPETITORS = [{'id': f'comp-{i}', 'name': f'Rival {i}', 'platform': 'Instagram', 'adContent': 'Fresh bread daily'}
+               for i in range(8)]
+FILLER = ('These suggestions can be combined and adapted as the campaign runs; track engagement weekly, '
+          'keep the tone consistent with the brand, and revisit the budget split after the first fortnight. ')
+
+# (label, method, path, body, check on the parsed response body)
+ROUTES = [
+    ('ideas', 'POST', '/ideas/generate', BUSINESS,
+     lambda r: len(r['data']) == 8 and not r['meta']['fallback']),
+    ('ideas json', 'POST', '/ideas/generate', {**BUSINESS, 'format': 'json'},
+     lambda r: len(r['data']) == 8 and not r['meta']['fallback']),
+    ('creatives', 'POST', '/creatives/generate', BUSINESS,
+     lambda r: bool(r['data']['videoScript']) and not r['meta']['fallback']),
+    ('competitors', 'GET', '/competitors/generate', {'industry': 'bakery', 'city': 'Singapore'},
+     lambda r: len(r['data']) == 4 and not r['meta']['fallback']),
+    ('compare:batch', 'POST', '/compare:batch', {**BUSINESS, 'businessId': 'b-1', 'campaignId': 'c-1',
+                                                 'adContent': 'Warm croissants at 7am', 'competitors': COMPETITORS},
+     lambda r: len(r['data']) == 8 and not r['meta']['fallback']),
+    ('chat', 'POST', '/chat/complete', {**BUSINESS, 'messages': [{'role': 'user', 'content': 'Any quick wins?'}]},
+     lambda r: bool(r['data']['text']) and not r['meta']['fallback']),
+]
+
+def rambling_responder(rate: float, seed: int) -> Callable[[Dict[str, Any]], str]:
+    """Stub answers; a `rate` fraction of them run on past the requested format"""
+    rng = random.Random(seed)
+
+    def respond(body: Dict[str, Any]) -> str:
+        text = ai_handler.fake_bedrock_reply(body)
+        if rng.random() >= rate:
+            return text
+        prompt = body['messages'][-1]['content']
+        if 'marketing ideas' in prompt and not text.lstrip().startswith(('[', '{')):
+            text += ''.join(f'\n{n}. Extra Idea {n} - {FILLER}' for n in range(9, 25))
+        elif 'poster concepts' in prompt:
+            text += ''.join(f'\nPoster {n}: {FILLER}' for n in range(3, 12))
+        elif 'competitor ads' in prompt:
+            text += ''.join(f'\nCompetitor {n}: Extra Co - "More" - Facebook - $100 budget - {FILLER}'
+                            for n in range(5, 20))
+        return text + '\n\n' + FILLER * 40
+
+    return respond
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def run(route: tuple, args: argparse.Namespace, fake: FakeBedrockRuntime) -> Dict[str, Any]:
+    label, method, path, payload, check = route
+    latencies, tokens, passed = [], [], 0
+    for _ in range(args.requests):
+        event = build_event(method, path, payload)
+        output_before = fake_output_tokens(fake)
+        started = time.perf_counter()
+        response = ai_handler.lambda_handler(event, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        tokens.append(fake_output_tokens(fake) - output_before)
+        try:
+            passed += bool(response['statusCode'] == 200 and check(json.loads(response['body'])))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return {'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95),
+            'tokens': sum(tokens) / len(tokens), 'ok': passed / args.requests}
+
+def fake_output_tokens(fake: FakeBedrockRuntime) -> int:
+    return fake.output_tokens
+
+class CountingFake(FakeBedrockRuntime):
+    """FakeBedrockRuntime that totals the output tokens it returned"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_tokens = 0
+
+    def _usage(self, body: str, text: str) -> Dict[str, int]:
+        usage = FakeBedrockRuntime._usage(body, text)
+        with self._lock:
+            self.output_tokens += usage['output_tokens']
+        return usage
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--tokens-per-second', type=float, default=2000.0)
+    parser.add_argument('--ramble-rate', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    install_core_fakes(ai_handler)
+    ai_handler._clients['responseCache'] = None
+    ai_handler._clients['competitorCache'] = None
+    ai_handler._clients['chatMemory'] = None
+    ai_handler._clients['comparisonStore'] = None
+    ai_handler._clients['artifactStore'] = None
+    profiled = ai_handler.generation_params
+
+    print(f"{'route':<15}{'mode':<12}{'p50 ms':>9}{'p95 ms':>9}{'out tok':>9}{'parsed':>8}")
+    for route in ROUTES:
+        for mode in ('flat 2000', 'profiles'):
+            # Same seed per mode, so both see the same sequence of rambling answers
+            fake = CountingFake(rambling_responder(args.ramble_rate, args.seed), tokens_per_second=args.tokens_per_second)
+            ai_handler._clients['bedrock'] = ResilientBedrockClient(fake, TokenBucket(1e6, 10 ** 6))
+            ai_handler.generation_params = (
+                profiled if mode == 'profiles' else lambda *a, **k: generation_profiles.default_generation()
+            )
+            result = run(route, args, fake)
+            print(f"{route[0]:<15}{mode:<12}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['tokens']:>9.0f}"
+                  f"{result['ok'] * 100:>7.0f}%")
+    ai_handler.generation_params = profiled
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Micro-benchmark and fixture check for backend-ai/src/idea_parser.py.
+
+Each fixture in bench/fixtures/ideas is a sample IDEA_PROMPT response (stub,
+markdown, bulleted, fenced-JSON and prose-then-JSON styles). For every fixture
+the script checks that:
+
+- the parsed (title, description, platform) records equal expected.json;
+- feeding the text in chunks of 1, 7 and 64 characters gives the same records;
+- JSON fixtures yield nothing until close(), and line fixtures yield every idea
+  but the last as the next one starts, with close() flushing the final one;
+- the final idea is still flushed when the text has no trailing newline.
+
+It then times the streaming parser against the original split-and-rescan
+parser on the same text, fed whole and in small chunks.
+
+    python bench/idea_parser.py --runs 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(REPO_ROOT, 'bench', 'fixtures', 'ideas')
+sys.path.insert(0, os.path.join(REPO_ROOT, 'backend-ai', 'src'))
+
+from idea_parser import IdeaStreamParser, iter_ideas, parse_idea_text
+
+def legacy_parse(ai_response: str) -> List[Dict[str, str]]:
+    """The parser handle_generate_ideas used before idea_parser, kept for comparison"""
+    ideas = []
+    current_idea = {}
+    for line in ai_response.split('\n'):
+        if line.strip() and (line[0].isdigit() or line.startswith('-')):
+            if current_idea:
+                ideas.append(current_idea)
+            current_idea = {'title': line.strip()}
+        elif 'description:' in line.lower() or 'platform:' in line.lower():
+            if 'description:' in line.lower():
+                current_idea['description'] = line.split(':', 1)[1].strip()
+            elif 'platform:' in line.lower():
+                current_idea['platform'] = line.split(':', 1)[1].strip()
+    return ideas
+
+def chunked(text: str, size: int) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def records(ideas: List[Dict[str, str]]) -> List[List[str]]:
+    return [[idea['title'], idea['description'], idea['platform']] for idea in ideas]
+
+def stream(chunks: List[str]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """(ideas yielded while feeding, ideas yielded by close())"""
+    parser = IdeaStreamParser()
+    fed = [idea for chunk in chunks for idea in parser.feed(chunk)]
+    return fed, list(parser.close())
+
+def check_fixture(text: str, want: Dict[str, Any]) -> Dict[str, bool]:
+    expected = want['ideas']
+    checks = {'fields': records(parse_idea_text(text)) == expected}
+    for size in (1, 7, 64):
+        checks[f'chunked {size}'] = records(list(iter_ideas(chunked(text, size)))) == expected
+    fed, closed = stream(chunked(text, 7))
+    if want['mode'] == 'json':
+        checks['json mode'] = not fed and records(closed) == expected
+    else:
+        checks['final flush'] = records(fed) == expected[:-1] and records(closed) == expected[-1:]
+    checks['no trailing newline'] = records(parse_idea_text(text.rstrip('\n'))) == expected
+    return checks
+
+def check_fixtures(fixtures: Dict[str, str], expected: Dict[str, Dict]) -> bool:
+    ok = True
+    for name, text in fixtures.items():
+        checks = check_fixture(text, expected[name])
+        failed = [check for check, passed in checks.items() if not passed]
+        ok = ok and not failed
+        print(f"{'ok  ' if not failed else 'FAIL'} {name:<22} {expected[name]['mode']:<6} "
+              f"{len(expected[name]['ideas'])} ideas" + (f" (failed: {', '.join(failed)})" if failed else ''))
+    return ok
+
+def time_per_call(fn, runs: int) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - started) / runs * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=1000)
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES, 'expected.json')) as f:
+        expected = json.load(f)
+    fixtures = {}
+    for name in expected:
+        with open(os.path.join(FIXTURES, name)) as f:
+            fixtures[name] = f.read()
+
+    ok = check_fixtures(fixtures, expected)
+
+    print(f"\n{'fixture':<22} {'legacy us':>10} {'whole us':>10} {'chunked us':>11}")
+    for name, text in fixtures.items():
+        chunks = chunked(text, 16)
+        legacy = time_per_call(lambda: legacy_parse(text), args.runs)
+        whole = time_per_call(lambda: parse_idea_text(text), args.runs)
+        streamed = time_per_call(lambda: list(iter_ideas(chunks)), args.runs)
+        print(f"{name:<22} {legacy:>10.1f} {whole:>10.1f} {streamed:>11.1f}")
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
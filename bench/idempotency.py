@@ -0,0 +1,92 @@
+"""Correctness check for backend-ai/src/idempotency.py against a real boto3 Table.
+
+The table is a `boto3.resource('dynamodb').Table` whose client is stubbed with
+botocore's Stubber, so claims go through the same resource layer and
+ClientError path as in Lambda: DynamoDB returns the old item of a failed
+conditional put in its wire format ({'S': ...}), which the store has to
+deserialize. The script checks, for one key:
+
+- a retry while the first request runs gets 409 (not 422);
+- a retry after it finished replays the stored response without running the handler;
+- the same key with a different body gets 422;
+- an `Accept: text/event-stream` request does not share a fingerprint with the JSON one.
+
+    python bench/idempotency.py
+"""
+import json
+import os
+import sys
+from typing import Dict, Any, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, 'backend-ai', 'src'), os.path.join(REPO_ROOT, 'backend-shared', 'src')]
+
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+from botocore.stub import ANY, Stubber
+from idempotency import DynamoDBIdempotencyStore, Idempotency, request_fingerprint
+
+TABLE = 'Idempotency'
+KEY = 'POST /ideas/generate#retry-1'
+
+def event(body: Dict[str, Any], accept: str = 'application/json') -> Dict[str, Any]:
+    return {'requestContext': {'http': {'method': 'POST', 'path': '/ideas/generate'}},
+            'headers': {'Idempotency-Key': 'retry-1', 'Accept': accept}, 'body': json.dumps(body)}
+
+def stored_item(record: Dict[str, Any]) -> Dict[str, Any]:
+    """A record as DynamoDB returns it on the wire"""
+    serializer = TypeSerializer()
+    return {name: serializer.serialize(value) for name, value in record.items()}
+
+def add_claim_conflict(stubber: Stubber, record: Dict[str, Any]) -> None:
+    stubber.add_client_error(
+        'put_item', service_error_code='ConditionalCheckFailedException',
+        service_message='The conditional request failed', http_status_code=400,
+        expected_params={'TableName': TABLE, 'Item': ANY, 'ConditionExpression': ANY,
+                         'ExpressionAttributeValues': ANY, 'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'},
+        modeled_fields={'Item': stored_item(record)}
+    )
+
+def main() -> None:
+    table = boto3.resource('dynamodb', region_name='us-east-1', aws_access_key_id='bench',
+                           aws_secret_access_key='bench').Table(TABLE)
+    stubber = Stubber(table.meta.client)
+    idempotency = Idempotency(DynamoDBIdempotencyStore(table))
+    calls: List[int] = []
+
+    def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        calls.append(1)
+        return {'statusCode': 200, 'headers': {'Content-Type': 'application/json'}, 'body': '{"success": true}'}
+
+    body = {'businessName': 'Sunrise Bakery'}
+    fingerprint = request_fingerprint(event(body))
+    completed = {'statusCode': 200, 'headers': {'Content-Type': 'application/json'}, 'body': '{"stored": true}'}
+    add_claim_conflict(stubber, {'idempotencyKey': KEY, 'fingerprint': fingerprint, 'status': 'in_progress',
+                                 'expiresAt': 2 ** 31})
+    add_claim_conflict(stubber, {'idempotencyKey': KEY, 'fingerprint': fingerprint, 'status': 'completed',
+                                 'response': json.dumps(completed), 'expiresAt': 2 ** 31})
+    add_claim_conflict(stubber, {'idempotencyKey': KEY, 'fingerprint': fingerprint, 'status': 'completed',
+                                 'response': json.dumps(completed), 'expiresAt': 2 ** 31})
+
+    with stubber:
+        in_progress = idempotency.handle(event(body), None, handler)
+        replayed = idempotency.handle(event(body), None, handler)
+        mismatched = idempotency.handle(event({**body, 'goal': 'other'}), None, handler)
+        stubber.assert_no_pending_responses()
+
+    checks = {
+        'in-progress retry gets 409': in_progress['statusCode'] == 409,
+        'finished retry is replayed': replayed['statusCode'] == 200 and replayed['body'] == completed['body']
+                                      and replayed['headers'].get('Idempotent-Replayed') == 'true',
+        'different body gets 422': mismatched['statusCode'] == 422,
+        'handler never ran': not calls,
+        'SSE and JSON fingerprints differ': request_fingerprint(event(body, 'text/event-stream')) != fingerprint,
+        'no store errors': idempotency.counters['storeErrors'] == 0,
+    }
+    for name, ok in checks.items():
+        print(f"{'ok' if ok else 'FAIL':<5} {name}")
+    print(json.dumps(idempotency.counters))
+    sys.exit(0 if all(checks.values()) else 1)
+
+if __name__ == '__main__':
+    main()
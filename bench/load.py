@@ -0,0 +1,351 @@
+"""Load and latency suite for the core and AI Lambda handlers.
+
+Each route runs in its own fresh interpreter, which imports the handler,
+installs in-memory fakes for DynamoDB and S3 (bench/aws_fakes.py) and Bedrock
+(FakeBedrockRuntime with configurable latency and token rate), and then sends
+synthetic API Gateway v2 events:
+
+- a warm-up;
+- a timed pass at the given concurrency, which gives throughput and p50/p95/p99
+  latency;
+- a sequential pass under tracemalloc, which gives the peak and retained bytes
+  allocated per request.
+
+The process's peak RSS is reported once both passes have finished. No AWS
+account or network is needed.
+
+    python bench/load.py                                  # every route
+    python bench/load.py --route /items --requests 2000
+    python bench/load.py --save bench/baseline.json       # record a baseline
+    python bench/load.py --compare bench/baseline.json    # fail on regressions
+
+--compare exits non-zero when a route's p95 latency or peak allocation grows
+by more than --threshold (default 25%) over the baseline; latency changes
+under --min-delta-ms (default 1 ms) are treated as noise. Latency baselines
+only compare meaningfully when they were recorded on the same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+from aws_fakes import FAKE_ENV, install_core_fakes
+from cold_start import build_event
+
+CAMPAIGN = {'businessId': 'b-1', 'goal': 'awareness', 'targetAudience': 'locals', 'budget': 300}
+BUSINESS = {'businessName': 'Sunrise Bakery', 'industry': 'bakery', 'city': 'Singapore', 'budget': 300}
+SEEDED_ITEMS = 500
+
+# (handler, method, path, body or query, headers)
+ROUTES = [
+    ('core', 'OPTIONS', '/items', None, {}),
+    ('core', 'POST', '/signup', {'name': 'Bakery', 'industry': 'bakery', 'country': 'SG', 'city': 'Singapore',
+                                 'zipCode': '000000', 'workingHours': {'start': '07:00', 'end': '19:00'}}, {}),
+    ('core', 'POST', '/campaigns', CAMPAIGN, {}),
+    ('core', 'POST', '/campaigns/batch', {'records': [CAMPAIGN] * 100}, {}),
+    ('core', 'GET', '/items', {'businessId': 'b-1', 'limit': '100'}, {}),
+    ('core', 'GET', '/items', {'limit': '25', 'fields': 'pk,title'}, {}),
+    ('core', 'GET', '/items', {'businessId': 'b-1', 'limit': '100'}, {'accept-encoding': 'gzip, deflate, br'}),
+    ('core', 'GET', '/items', {'businessId': 'b-1', 'limit': '100'}, {'if-none-match': '*'}),
+    ('core', 'POST', '/items', {'businessId': 'b-1', 'kind': 'note', 'title': 'Launch post'}, {}),
+    ('core', 'POST', '/items/batch', {'records': [{'businessId': 'b-1', 'kind': 'note'}] * 100}, {}),
+    ('core', 'GET', '/comparisons', {'businessId': 'b-1'}, {}),
+    ('core', 'GET', '/businesses/b-1/overview', None, {}),
+    ('core', 'POST', '/uploads/presign', {'fileName': 'logo.png', 'fileType': 'image/png'}, {}),
+    ('core', 'POST', '/uploads/presign/batch',
+     {'files': [{'fileName': f'photo-{i}.jpg', 'fileType': 'image/jpeg'} for i in range(24)]}, {}),
+    ('core', 'POST', '/uploads/multipart', {'fileName': 'promo.mp4', 'fileType': 'video/mp4', 'fileSize': 500 * 2 ** 20}, {}),
+    ('ai', 'OPTIONS', '/ideas/generate', None, {}),
+    ('ai', 'POST', '/ideas/generate', BUSINESS, {}),
+    ('ai', 'POST', '/ideas/generate', BUSINESS, {'idempotency-key': 'bench-retry'}),
+    ('ai', 'POST', '/ideas/generate', {**BUSINESS, 'stream': True}, {}),
+    ('ai', 'POST', '/ideas/generate:batch', {'campaigns': [BUSINESS] * 10, 'packSize': 1}, {}),
+    ('ai', 'POST', '/creatives/generate', BUSINESS, {}),
+    ('ai', 'POST', '/creatives/generate', BUSINESS, {'prefer': 'respond-async'}),
+    ('ai', 'POST', '/plan/generate', BUSINESS, {}),
+    ('ai', 'POST', '/plan/generate:batch', {'campaigns': [BUSINESS] * 100}, {}),
+    ('ai', 'GET', '/competitors/generate', {'businessId': 'b-1', 'industry': 'bakery', 'city': 'Singapore'}, {}),
+    ('ai', 'GET', '/competitors/generate', {'businessId': 'b-1', 'industry': 'bakery', 'city': 'Singapore'},
+     {'if-none-match': '*'}),
+    ('ai', 'POST', '/compare', {'businessId': 'b-1', 'campaignId': 'c-1', 'competitorId': 'comp-1'}, {}),
+    ('ai', 'POST', '/compare:batch', {**BUSINESS, 'businessId': 'b-1', 'campaignId': 'c-1'}, {}),
+    ('ai', 'POST', '/chat/complete', {**BUSINESS, 'businessId': 'b-1', 'sessionId': 's-1',
+                                      'messages': [{'role': 'user', 'content': 'How do I get more walk-ins?'}]}, {}),
+    ('ai', 'POST', '/chat/complete', {**BUSINESS, 'sessionId': 's-2', 'messages': [{'role': 'user', 'content': 'Hi'}]},
+     {'accept': 'text/event-stream'}),
+    ('ai', 'GET', '/campaigns/c-1/artifacts/ideas', None, {}),
+]
+
+def route_label(route: tuple) -> str:
+    handler, method, path, payload, headers = route
+    label = f'{method} {path}'
+    query = '&'.join(f'{k}={v}' for k, v in (payload or {}).items() if k not in ('businessId', 'industry', 'city'))
+    if method == 'GET' and query:
+        label += '?' + query
+    if (isinstance(payload, dict) and payload.get('stream')) or 'text/event-stream' in headers.get('accept', ''):
+        label += ' (stream)'
+    if 'respond-async' in headers.get('prefer', ''):
+        label += ' (async)'
+    if 'idempotency-key' in headers:
+        label += ' (idempotency key)'
+    if 'accept-encoding' in headers:
+        label += ' (compressed)'
+    if 'if-none-match' in headers:
+        label += ' (not modified)'
+    return label
+
+class FakeContext:
+    """Lambda context with a fixed remaining-time budget"""
+
+    def get_remaining_time_in_millis(self) -> int:
+        return 30000
+
+def load_handler(handler: str, args: argparse.Namespace) -> Any:
+    """Import a handler with fakes installed in its client cache"""
+    sys.path[:0] = [os.path.join(args.repo, f'backend-{handler}', 'src'), os.path.join(args.repo, 'backend-shared', 'src')]
+    module = __import__(f'{handler}_handler')
+    dynamodb, _ = install_core_fakes(module)
+
+    if handler == 'core':
+        dynamodb.Table(FAKE_ENV['BUSINESS_TABLE']).put_item(Item={'businessId': 'b-1', 'name': 'Bakery'})
+        campaigns = dynamodb.Table(FAKE_ENV['CAMPAIGNS_TABLE'])
+        for index in range(20):
+            campaigns.put_item(Item={**CAMPAIGN, 'campaignId': f'campaign-{index:03d}', 'status': 'draft'})
+        items = dynamodb.Table(FAKE_ENV['ITEMS_TABLE'])
+        for index in range(SEEDED_ITEMS):
+            items.put_item(Item={'pk': f'item-{index:05d}', 'businessId': f'b-{index % 5}', 'kind': 'note',
+                                 'title': f'Item {index}', 'createdAt': '2024-01-01T00:00:00'})
+    else:
+        from bedrock_client import FakeBedrockRuntime, ResilientBedrockClient, TokenBucket
+        from chat_memory import ChatMemory, DynamoDBChatStore
+        from competitor_store import CompetitorCache, DynamoDBCompetitorStore
+        from artifacts import DynamoDBArtifactStore
+        from comparisons import DynamoDBComparisonStore
+        from idempotency import DynamoDBIdempotencyStore, Idempotency
+        from jobs import DynamoDBJobStore, JobService, LocalJobQueue
+        from write_behind import WriteBehindWriter
+        fake = FakeBedrockRuntime(module.fake_bedrock_reply, latency_ms=args.model_latency_ms,
+                                  tokens_per_second=args.tokens_per_second or None)
+        # The limiter is opened up so the suite measures the handler, not the client quota
+        module._clients['bedrock'] = ResilientBedrockClient(fake, TokenBucket(1e6, 10 ** 6))
+        module._clients['chatMemory'] = ChatMemory(DynamoDBChatStore(
+            dynamodb.Table(FAKE_ENV['CHAT_SESSIONS_TABLE']), dynamodb.Table(FAKE_ENV['CHAT_MESSAGES_TABLE'])
+        ))
+        writer = module._clients['writeBehind'] = WriteBehindWriter(dynamodb)
+        comparisons = dynamodb.Table(FAKE_ENV['COMPARISONS_TABLE'])
+        module._clients['comparisonStore'] = DynamoDBComparisonStore(comparisons, dynamodb, writer)
+        artifacts = module._clients['artifactStore'] = DynamoDBArtifactStore(dynamodb.Table(FAKE_ENV['ARTIFACTS_TABLE']), writer)
+        artifacts.save('c-1', 'ideas', module.pad_ideas([], {**BUSINESS, 'campaignId': 'c-1'}), 'b-1')
+        writer.flush()
+        module._clients['competitorCache'] = CompetitorCache(
+            DynamoDBCompetitorStore(dynamodb.Table(FAKE_ENV['COMPETITORS_TABLE']))
+        )
+        module._clients['idempotency'] = Idempotency(
+            DynamoDBIdempotencyStore(dynamodb.Table(FAKE_ENV['IDEMPOTENCY_TABLE']))
+        )
+        module._clients['jobs'] = JobService(
+            DynamoDBJobStore(dynamodb.Table(FAKE_ENV['JOBS_TABLE'])), LocalJobQueue(module.run_job_batch)
+        )
+    return module
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_route(index: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Benchmark one route in this process"""
+    route = ROUTES[index]
+    handler, method, path, payload, headers = route
+    module = load_handler(handler, args)
+    context = FakeContext()
+    template = build_event(method, path, payload)
+    template['headers'] = dict(headers)
+    raw_event = json.dumps(template)
+
+    errors = 0
+
+    def send() -> float:
+        nonlocal errors
+        event = json.loads(raw_event)
+        started = time.perf_counter()
+        response = module.lambda_handler(event, context)
+        elapsed = (time.perf_counter() - started) * 1000
+        if not 200 <= response.get('statusCode', 500) < 300 and response.get('statusCode') != 304:
+            errors += 1
+        return elapsed
+
+    for _ in range(args.warmup):
+        send()
+    errors = 0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = sorted(executor.map(lambda _: send(), range(args.requests)))
+    wall = time.perf_counter() - started
+
+    tracemalloc.start()
+    peaks = []
+    retained = []
+    for _ in range(args.alloc_requests):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        send()
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+    tracemalloc.stop()
+
+    return {
+        'handler': handler,
+        'route': route_label(route),
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'errors': errors,
+        'throughputRps': round(args.requests / wall, 1),
+        'meanMs': round(statistics.fmean(latencies), 3),
+        'p50Ms': round(percentile(latencies, 0.50), 3),
+        'p95Ms': round(percentile(latencies, 0.95), 3),
+        'p99Ms': round(percentile(latencies, 0.99), 3),
+        'allocPeakKiB': round(statistics.median(peaks) / 1024, 1) if peaks else None,
+        'retainedKiB': round(statistics.fmean(retained) / 1024, 2) if retained else None,
+        # ru_maxrss is KiB on Linux
+        'peakRssMiB': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def run_child(index: int, args: argparse.Namespace) -> Dict[str, Any]:
+    env = {
+        **os.environ,
+        **FAKE_ENV,
+        'AWS_DEFAULT_REGION': 'ap-southeast-1',
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+        'RESPONSE_CACHE_ENABLED': 'true' if args.cache else 'false',
+    }
+    env.pop('RESPONSE_CACHE_TABLE', None)
+    command = [sys.executable, os.path.abspath(__file__), '--child', str(index)] + forwarded_args(args)
+    output = subprocess.run(command, env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f'{route_label(ROUTES[index])} failed:\n{output.stderr}')
+    for line in output.stdout.splitlines():
+        if line.startswith('LOAD '):
+            return json.loads(line[len('LOAD '):])
+    raise RuntimeError(f'{route_label(ROUTES[index])} produced no result:\n{output.stdout}\n{output.stderr}')
+
+def forwarded_args(args: argparse.Namespace) -> List[str]:
+    forwarded = [
+        '--repo', args.repo, '--requests', str(args.requests), '--concurrency', str(args.concurrency),
+        '--warmup', str(args.warmup), '--alloc-requests', str(args.alloc_requests),
+        '--model-latency-ms', str(args.model_latency_ms), '--tokens-per-second', str(args.tokens_per_second),
+    ]
+    return forwarded + (['--cache'] if args.cache else [])
+
+def git_revision(repo: str) -> Optional[str]:
+    try:
+        return subprocess.run(['git', '-C', repo, 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'handler':<6} {'route':<44} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'alloc KiB':>10} {'kept KiB':>9} {'rss MiB':>8} {'errors':>6}")
+    for r in results:
+        print(f"{r['handler']:<6} {r['route']:<44} {r['throughputRps']:>8} {r['p50Ms']:>8} {r['p95Ms']:>8} "
+              f"{r['p99Ms']:>8} {r['allocPeakKiB']:>10} {r['retainedKiB']:>9} {r['peakRssMiB']:>8} {r['errors']:>6}")
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float, min_delta_ms: float) -> bool:
+    """Print deltas against a saved baseline; True when nothing regressed past the threshold"""
+    previous = {(r['handler'], r['route']): r for r in baseline['results']}
+    meta = baseline.get('meta', {})
+    print(f"\nagainst baseline {meta.get('revision')} ({meta.get('recordedAt')}, {meta.get('machine')})")
+    print(f"{'handler':<6} {'route':<44} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'alloc':>8}")
+
+    def delta(current: float, old: float) -> str:
+        return f'{(current - old) / old * 100:+.0f}%' if old else 'n/a'
+
+    ok = True
+    for r in results:
+        old = previous.get((r['handler'], r['route']))
+        if old is None:
+            print(f"{r['handler']:<6} {r['route']:<44} {'(new route)':>8}")
+            continue
+        regressed = ((r['p95Ms'] > old['p95Ms'] * (1 + threshold) and r['p95Ms'] - old['p95Ms'] > min_delta_ms)
+                     or (old['allocPeakKiB'] and r['allocPeakKiB'] > old['allocPeakKiB'] * (1 + threshold)))
+        ok = ok and not regressed
+        print(f"{r['handler']:<6} {r['route']:<44} {delta(r['throughputRps'], old['throughputRps']):>8} "
+              f"{delta(r['p50Ms'], old['p50Ms']):>8} {delta(r['p95Ms'], old['p95Ms']):>8} "
+              f"{delta(r['p99Ms'], old['p99Ms']):>8} {delta(r['allocPeakKiB'], old['allocPeakKiB']):>8}"
+              + ('  REGRESSED' if regressed else ''))
+    return ok
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repo', default=REPO_ROOT, help='checkout to benchmark (default: this one)')
+    parser.add_argument('--route', help='only routes whose label contains this string')
+    parser.add_argument('--requests', type=int, default=300, help='timed requests per route')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='concurrent requests in the timed pass (a Lambda container serves one at a time)')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--alloc-requests', type=int, default=30, help='requests traced for allocations')
+    parser.add_argument('--model-latency-ms', type=float, default=20.0, help='fake Bedrock time to first token')
+    parser.add_argument('--tokens-per-second', type=float, default=5000.0,
+                        help='fake Bedrock output rate (0 returns instantly)')
+    parser.add_argument('--cache', action='store_true', help='leave the in-process response cache on')
+    parser.add_argument('--save', metavar='PATH', help='write results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed p95/allocation growth')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='ignore smaller p95 changes')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print('LOAD ' + json.dumps(run_route(args.child, args)))
+        return
+
+    results = [
+        run_child(index, args)
+        for index, route in enumerate(ROUTES)
+        if not args.route or args.route in route_label(route)
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+    if args.save:
+        settings = {k: v for k, v in vars(args).items() if k not in ('repo', 'save', 'compare', 'json', 'child', 'route')}
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'revision': git_revision(args.repo),
+                    'recordedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'python': platform.python_version(),
+                    'machine': f'{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs',
+                    'settings': settings,
+                },
+                'results': results,
+            }, f, indent=2)
+            f.write('\n')
+        print(f'\nbaseline written to {args.save}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold, args.min_delta_ms):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Serialization benchmark for large listing payloads.
+
+Builds a GET /items-style page of DynamoDB items (Decimal numbers, nested maps)
+and times each serializer available in backend-shared/src/http_api.py.
+
+    python bench/serialization.py --items 5000 --runs 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'backend-shared', 'src'))
+
+import http_api
+
+def build_listing(count: int) -> dict:
+    items = [
+        {
+            'pk': f'item-{i:06d}',
+            'businessId': f'business-{i % 50}',
+            'kind': 'idea',
+            'title': f'Marketing idea {i}',
+            'description': 'Behind-the-scenes content showing the team preparing the day. ' * 3,
+            'budget': Decimal(str(100 + i % 900)),
+            'score': Decimal('8.25'),
+            'tags': ['local', 'instagram', 'weekend'],
+            'schedule': {'start': '09:00', 'end': '17:00', 'days': [1, 2, 3, 4, 5]},
+            'createdAt': '2024-01-01T09:00:00',
+        }
+        for i in range(count)
+    ]
+    return {'success': True, 'data': items, 'nextCursor': None}
+
+def time_serializer(serializer, payload, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        body = serializer(payload)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples, len(body)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    payload = build_listing(args.items)
+    serializers = [('stdlib', http_api.stdlib_dumps)]
+    if http_api.ORJSON_AVAILABLE:
+        serializers.append(('orjson', http_api.orjson_dumps))
+
+    print(f"{'serializer':<10} {'items':>6} {'bytes':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, serializer in serializers:
+        samples, size = time_serializer(serializer, payload, args.runs)
+        samples.sort()
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f"{name:<10} {args.items:>6} {size:>10} {statistics.median(samples):>8.2f} {p95:>8.2f}")
+
+if __name__ == '__main__':
+    main()
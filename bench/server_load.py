@@ -0,0 +1,169 @@
+"""Throughput of the self-hosted server (backend-server/src/server.py) against the local stand-ins.
+
+For each --configs entry (WORKERSxTHREADS) the server is started in a
+subprocess whose workers install the same fakes as bench/load.py: in-memory
+DynamoDB and S3 (bench/aws_fakes.py) and FakeBedrockRuntime with
+--model-latency-ms. --connections keep-alive clients then send --requests
+requests, cycling through the bench/load.py routes whose handler and label
+(`core GET /items`) contain --route, and the report gives throughput, latency percentiles and errors.
+`1x1` serves one request at a time, as a Lambda container does.
+
+Client and server share the machine, so on few cores the client's own CPU
+use caps the figures for cheap routes.
+
+    python bench/server_load.py --route ideas/generate --configs 1x1,1x16,2x16 --connections 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.append(BENCH_DIR)
+
+import load
+from aws_fakes import FAKE_ENV
+
+SERVER = os.path.join(REPO_ROOT, 'backend-server', 'src', 'server.py')
+
+def install_fakes(modules: List[Any]) -> None:
+    """Server setup hook (--setup server_load:install_fakes): the bench/load.py fakes in every worker"""
+    args = argparse.Namespace(**json.loads(os.environ['SERVER_LOAD_ARGS']))
+    for module in modules:
+        load.load_handler(module.__name__.split('_')[0], args)
+
+def encode_request(route: tuple) -> bytes:
+    _, method, path, payload, headers = route
+    event = load.build_event(method, path, payload)
+    query = urlencode(event.get('queryStringParameters') or {})
+    body = (event.get('body') or '').encode('utf-8')
+    lines = [f"{method} {path}{'?' + query if query else ''} HTTP/1.1", 'Host: localhost',
+             'Content-Type: application/json', f'Content-Length: {len(body)}']
+    lines.extend(f'{name}: {value}' for name, value in headers.items())
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+async def drive(port: int, requests: List[bytes], total: int, connections: int) -> Tuple[List[float], int, float]:
+    """Send `total` requests over `connections` keep-alive connections; (latencies ms, errors, seconds)"""
+    latencies: List[float] = []
+    errors = 0
+    next_request = 0
+
+    async def client() -> None:
+        nonlocal errors, next_request
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while next_request < total:
+                request = requests[next_request % len(requests)]
+                next_request += 1
+                started = time.perf_counter()
+                writer.write(request)
+                status = await read_response(reader)
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += not (200 <= status < 300 or status == 304)
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    return latencies, errors, time.perf_counter() - started
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited:\n{process.stderr.read()}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('server did not start')
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def run_config(workers: int, threads: int, requests: List[bytes], args: argparse.Namespace) -> Dict[str, Any]:
+    port = free_port()
+    env = {
+        **os.environ,
+        **FAKE_ENV,
+        'AWS_DEFAULT_REGION': 'ap-southeast-1',
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+        'RESPONSE_CACHE_ENABLED': 'false',
+        'PYTHONPATH': BENCH_DIR,
+        'SERVER_LOAD_ARGS': json.dumps({'repo': REPO_ROOT, 'model_latency_ms': args.model_latency_ms,
+                                        'tokens_per_second': args.tokens_per_second}),
+    }
+    env.pop('RESPONSE_CACHE_TABLE', None)
+    command = [sys.executable, SERVER, '--port', str(port), '--workers', str(workers), '--threads', str(threads),
+               '--setup', 'server_load:install_fakes']
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        wait_for_port(port, process)
+        # Warm-up: every worker imports and initializes its clients on its first requests
+        asyncio.run(drive(port, requests, args.connections * 4, args.connections))
+        latencies, errors, seconds = asyncio.run(drive(port, requests, args.requests, args.connections))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    latencies.sort()
+    return {
+        'config': f'{workers}x{threads}',
+        'throughputRps': round(len(latencies) / seconds, 1),
+        'meanMs': round(statistics.fmean(latencies), 2),
+        'p50Ms': round(load.percentile(latencies, 0.50), 2),
+        'p95Ms': round(load.percentile(latencies, 0.95), 2),
+        'p99Ms': round(load.percentile(latencies, 0.99), 2),
+        'errors': errors,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--route', default='POST /ideas/generate',
+                        help="load.py routes whose 'handler label' (e.g. 'core GET /items') contains this")
+    parser.add_argument('--configs', default='1x1,1x8,1x32', help='comma-separated WORKERSxTHREADS')
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--model-latency-ms', type=float, default=20.0, help='fake Bedrock time to first token')
+    parser.add_argument('--tokens-per-second', type=float, default=5000.0,
+                        help='fake Bedrock output rate (0 returns instantly)')
+    args = parser.parse_args()
+
+    routes = [route for route in load.ROUTES if args.route in f'{route[0]} {load.route_label(route)}']
+    if not routes:
+        parser.error(f'no route matches {args.route!r}')
+    requests = [encode_request(route) for route in routes]
+    print(f"routes: {', '.join(f'{route[0]} {load.route_label(route)}' for route in routes)}")
+    print(f"{'config':<8}{'rps':>9}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for config in args.configs.split(','):
+        workers, threads = (int(part) for part in config.lower().split('x'))
+        r = run_config(workers, threads, requests, args)
+        print(f"{r['config']:<8}{r['throughputRps']:>9}{r['meanMs']:>9}{r['p50Ms']:>9}{r['p95Ms']:>9}"
+              f"{r['p99Ms']:>9}{r['errors']:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Hit-rate check for the near-duplicate prompt cache (backend-ai/src/similar_cache.py).
+
+Simulates a long tail of SMB tenants: each has its own business name, an
+industry, city and budget tier drawn from a small set, and a goal and audience
+written in its own words (paraphrased from a few common intents: reordered or
+dropped filler words, casing, punctuation, typos). Tenants request ideas and
+creatives a few times each. The same request stream runs through the AI
+handler with only the exact response cache and then with the near-duplicate
+cache behind it, and the report gives model calls, hit rates, lookup latency,
+whether every response still parsed, and how many responses mention another
+tenant's business name (entity re-substitution failures).
+
+    python bench/similar_cache.py --tenants 3000 --requests 6000 --threshold 0.8
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+from typing import Dict, Any, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, 'backend-ai', 'src'), os.path.join(REPO_ROOT, 'backend-shared', 'src')]
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import ai_handler
+from aws_fakes import install_core_fakes
+from bedrock_client import FakeBedrockRuntime, ResilientBedrockClient, TokenBucket
+from cold_start import build_event
+from response_cache import LRUCache, ResponseCache
+from similar_cache import SimilarPromptCache
+
+INDUSTRIES = ['bakery', 'cafe', 'gym', 'hair salon', 'florist']
+CITIES = ['Singapore', 'Kuala Lumpur', 'Jakarta']
+BUDGETS = [200, 300, 500]
+NAME_PARTS = (['Sunrise', 'Golden', 'Urban', 'Little', 'Corner', 'Happy', 'Green', 'Royal', 'Blue', 'Maple',
+               'Harbour', 'Lucky', 'Silver', 'Bright', 'Orchid', 'Cosy'],
+              ['Oven', 'House', 'Studio', 'Lab', 'Co', 'Works', 'Spot', 'Garden', 'Den', 'Hub', 'Nook', 'Place'])
+GOALS = ['more weekday walk-ins', 'increase brand awareness in the neighbourhood', 'grow online orders',
+         'get more repeat customers', 'promote our new seasonal menu', 'fill quiet afternoon slots']
+AUDIENCES = ['office workers nearby', 'young families in the area', 'university students',
+             'local residents aged 25-45', 'tourists and visitors']
+FILLERS = ['more', 'our', 'the', 'local', 'new']
+
+def paraphrase(text: str, rng: random.Random) -> str:
+    """How one tenant might phrase a common intent"""
+    words = text.split()
+    roll = rng.random()
+    if roll < 0.25 and len(words) > 2:
+        words.pop(rng.randrange(len(words)))
+    elif roll < 0.45:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(FILLERS))
+    elif roll < 0.55:
+        i = rng.randrange(len(words))
+        if len(words[i]) > 3:
+            j = rng.randrange(len(words[i]) - 1)
+            words[i] = words[i][:j] + words[i][j + 1] + words[i][j] + words[i][j + 2:]
+    text = ' '.join(words)
+    if rng.random() < 0.3:
+        text = text.capitalize()
+    if rng.random() < 0.2:
+        text += rng.choice(['.', '!', ' please'])
+    return text
+
+def make_tenants(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    tenants, names = [], set()
+    while len(tenants) < count:
+        industry = rng.choice(INDUSTRIES)
+        name = f"{rng.choice(NAME_PARTS[0])} {rng.choice(NAME_PARTS[1])} {industry.title()}"
+        if name in names:
+            name = f'{name} {len(tenants)}'
+        names.add(name)
+        tenants.append({'businessName': name, 'industry': industry, 'city': rng.choice(CITIES),
+                        'budget': rng.choice(BUDGETS), 'goal': paraphrase(rng.choice(GOALS), rng),
+                        'targetAudience': paraphrase(rng.choice(AUDIENCES), rng)})
+    return tenants
+
+def named_responder(body: Dict[str, Any]) -> str:
+    """Stub answers that mention the business by name, as real completions do"""
+    prompt = body['messages'][-1]['content']
+    match = re.search(r'business named (.*?) in |concepts for (.*?) \(|script for (.*?) \(', prompt)
+    name = next((group for group in match.groups() if group), None) if match else None
+    text = ai_handler.fake_bedrock_reply(body)
+    if name and 'marketing ideas' in prompt:
+        return '\n'.join(f'{n}. {name} Special {n} - Bring people into {name} this week. '
+                         f'#{name.replace(" ", "")} Platform: Instagram' for n in range(1, 9))
+    if name:
+        return text.replace('[Business Name]', name) + f'\nTagline: {name} - see you soon!'
+    return text
+
+def run(requests: List[Dict[str, Any]], tenants: List[Dict[str, Any]], similar: bool,
+        threshold: float) -> Dict[str, Any]:
+    fake = FakeBedrockRuntime(named_responder)
+    ai_handler._clients['bedrock'] = ResilientBedrockClient(fake, TokenBucket(1e6, 10 ** 6))
+    response_cache = ResponseCache(LRUCache(4096))
+    ai_handler._clients['responseCache'] = response_cache
+    similar_cache = SimilarPromptCache(ai_handler.PROMPTS, threshold=threshold) if similar else None
+    ai_handler._clients['similarCache'] = similar_cache
+
+    names = [tenant['businessName'] for tenant in tenants]
+    parsed, leaks = 0, 0
+    for request in requests:
+        tenant = tenants[request['tenant']]
+        event = build_event('POST', request['path'], tenant)
+        response = ai_handler.lambda_handler(event, None)
+        body = json.loads(response['body'])
+        data = body.get('data')
+        if request['path'] == '/ideas/generate':
+            ok = len(data) == 8 and tenant['businessName'] in data[0]['title']
+        else:
+            ok = tenant['businessName'] in data['videoScript']
+        parsed += bool(response['statusCode'] == 200 and ok and not body['meta']['fallback'])
+        text = json.dumps(data)
+        leaks += any(name in text for name in names if name != tenant['businessName']
+                     and name not in tenant['businessName'])
+    stats = response_cache.stats()
+    lookups = stats['memoryHits'] + stats['storeHits'] + stats['misses']
+    result = {
+        'modelCalls': fake.calls,
+        'exactHitRate': stats['hitRate'],
+        'hitRate': 1 - fake.calls / lookups if lookups else 0.0,
+        'parsed': parsed / len(requests),
+        'leaks': leaks,
+    }
+    if similar_cache is not None:
+        result['similar'] = similar_cache.stats()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', type=int, default=3000)
+    parser.add_argument('--requests', type=int, default=6000)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tenants = make_tenants(args.tenants, rng)
+    requests = [{'tenant': rng.randrange(len(tenants)), 'path': rng.choice(['/ideas/generate', '/creatives/generate'])}
+                for _ in range(args.requests)]
+    install_core_fakes(ai_handler)
+
+    for label, similar in (('exact only', False), ('exact + similar', True)):
+        result = run(requests, tenants, similar, args.threshold)
+        print(f"{label:<16} model calls {result['modelCalls']:>5}  hit rate {result['hitRate']:.1%}  "
+              f"(exact {result['exactHitRate']:.1%})  parsed {result['parsed']:.1%}  leaked names {result['leaks']}")
+        if 'similar' in result:
+            print(f"{'':<16} similar cache {json.dumps(result['similar'])}")
+
+if __name__ == '__main__':
+    main()
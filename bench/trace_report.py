@@ -0,0 +1,55 @@
+"""Summarize spans exported with TRACE_EXPORT_PATH.
+
+For every route: request count and p50/p95 request time, then per span name
+the call count per request, p50/p95 duration and share of total request time.
+Spans that ran concurrently (e.g. parallel Bedrock calls) can add up to more
+than 100%.
+
+    TRACE_SAMPLE_RATE=1 TRACE_EXPORT_PATH=/tmp/spans.jsonl python bench/load.py --route ideas
+    python bench/trace_report.py /tmp/spans.jsonl
+"""
+import argparse
+import json
+import statistics
+from typing import Dict, Any, List
+
+def quantile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='JSON-lines file written by the tracing exporter')
+    parser.add_argument('--route', help='only routes containing this string')
+    args = parser.parse_args()
+
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    with open(args.path) as f:
+        for line in f:
+            trace = json.loads(line)
+            if not args.route or args.route in trace['route']:
+                traces.setdefault(f"{trace['service']} {trace['route']}", []).append(trace)
+
+    for route, route_traces in sorted(traces.items()):
+        durations = [trace['durationMs'] for trace in route_traces]
+        total = sum(durations)
+        print(f"\n{route}: {len(route_traces)} requests, p50 {quantile(durations, 0.5):.2f} ms, "
+              f"p95 {quantile(durations, 0.95):.2f} ms")
+
+        spans: Dict[str, List[float]] = {}
+        counters: Dict[str, List[float]] = {}
+        for trace in route_traces:
+            for recorded in trace['spans']:
+                spans.setdefault(recorded['name'], []).append(recorded['durationMs'])
+            for name, value in trace.get('counters', {}).items():
+                counters.setdefault(name, []).append(value)
+
+        print(f"  {'span':<42} {'per req':>8} {'p50 ms':>9} {'p95 ms':>9} {'share':>7}")
+        for name, values in sorted(spans.items(), key=lambda item: -sum(item[1])):
+            print(f"  {name:<42} {len(values) / len(route_traces):>8.2f} {quantile(values, 0.5):>9.3f} "
+                  f"{quantile(values, 0.95):>9.3f} {sum(values) / total * 100:>6.1f}%")
+        for name, values in sorted(counters.items()):
+            print(f"  {name:<42} mean {statistics.fmean(values):.1f} per request")
+
+if __name__ == '__main__':
+    main()
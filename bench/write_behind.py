@@ -0,0 +1,224 @@
+"""Request latency and DynamoDB calls for storing generated artifacts.
+
+Runs a stream of generation requests (ideas, creatives, plans) for
+--campaigns campaigns through the AI handler against the in-memory fakes
+(bench/aws_fakes.py), with every DynamoDB call delayed by --dynamodb-ms, in
+five modes:
+
+- none: nothing is stored (the old behaviour);
+- sync: each artifact is a PutItem on the request path (WRITE_BEHIND_ENABLED=false);
+- post-invoke: artifacts are queued and flushed in one BatchWriteItem by the
+  PostInvokeFlush extension after the response, as on Lambda. The extension
+  talks to a fake Lambda Extensions API, and the bench, playing Lambda, starts
+  the next invocation only once the extension asks for its next event;
+- before-return: as post-invoke, but the handler flushes before it returns
+  (the fallback when the extension can't register);
+- background: queued writes are never waited for, as on the self-hosted server
+  (WRITE_BEHIND_FLUSH_MS=0).
+
+The report gives handler latency, the time spent after it before the
+container could freeze (billed, not seen by the client), DynamoDB write calls
+per request and, after the writer is flushed, whether
+GET /campaigns/{id}/artifacts/{type} returns each campaign's last response,
+and how long that read takes.
+
+    python bench/write_behind.py --campaigns 200 --requests 2000 --dynamodb-ms 8
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, 'backend-ai', 'src'), os.path.join(REPO_ROOT, 'backend-shared', 'src')]
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import ai_handler
+from artifacts import DynamoDBArtifactStore
+from aws_fakes import FAKE_ENV, FakeDynamoDBResource, install_core_fakes
+from bedrock_client import FakeBedrockRuntime, ResilientBedrockClient, TokenBucket
+from cold_start import build_event
+from write_behind import PostInvokeFlush, WriteBehindWriter
+
+PATHS = {'ideas': '/ideas/generate', 'creatives': '/creatives/generate', 'plan': '/plan/generate'}
+GOALS = ['more weekday walk-ins', 'grow online orders', 'get more repeat customers', 'fill quiet afternoons']
+
+class SlowTable:
+    """Table proxy that adds a fixed delay to every call"""
+
+    def __init__(self, table: Any, delay: float, calls: Dict[str, int]):
+        self._table, self._delay, self._calls = table, delay, calls
+        self.name = table.name
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self._table, name)
+
+        def call(*args, **kwargs):
+            self._calls[name] = self._calls.get(name, 0) + 1
+            time.sleep(self._delay)
+            return method(*args, **kwargs)
+        return call
+
+class SlowDynamoDB:
+    """Resource proxy with the same delay on batch_write_item and on tables it hands out"""
+
+    def __init__(self, dynamodb: FakeDynamoDBResource, delay: float):
+        self._dynamodb, self._delay = dynamodb, delay
+        self.calls: Dict[str, int] = {}
+
+    def Table(self, name: str) -> SlowTable:
+        return SlowTable(self._dynamodb.Table(name), self._delay, self.calls)
+
+    def batch_write_item(self, **kwargs) -> Dict[str, Any]:
+        self.calls['batch_write_item'] = self.calls.get('batch_write_item', 0) + 1
+        time.sleep(self._delay)
+        return self._dynamodb.batch_write_item(**kwargs)
+
+class FakeExtensionsAPI(ThreadingHTTPServer):
+    """The Lambda Extensions API: `ready` is set while the extension waits for its next event,
+    and invoke() hands it one"""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ExtensionsHandler)
+        self.events: 'queue.Queue[Dict[str, Any]]' = queue.Queue()
+        self.ready = threading.Event()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def invoke(self) -> None:
+        """Wait for the previous invocation's extension work, then start the next invocation"""
+        self.ready.wait()
+        self.ready.clear()
+        self.events.put({'eventType': 'INVOKE'})
+
+class ExtensionsHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply({}, {'Lambda-Extension-Identifier': 'bench-extension'})
+
+    def do_GET(self) -> None:
+        self.server.ready.set()
+        self._reply(self.server.events.get(), {})
+
+    def _reply(self, payload: Dict[str, Any], headers: Dict[str, str]) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        for name, value in {**headers, 'Content-Length': str(len(body))}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run(mode: str, requests: List[Dict[str, Any]], delay: float,
+        extensions: Optional[FakeExtensionsAPI] = None) -> Dict[str, Any]:
+    ai_handler._clients.clear()
+    dynamodb = SlowDynamoDB(FakeDynamoDBResource(), delay)
+    install_core_fakes(ai_handler, dynamodb)
+    ai_handler._clients['bedrock'] = ResilientBedrockClient(FakeBedrockRuntime(ai_handler.fake_bedrock_reply),
+                                                            TokenBucket(1e6, 10 ** 6))
+    # Each request is distinct, so the response caches don't hide the handler's own work
+    ai_handler._clients['responseCache'] = None
+    ai_handler._clients['similarCache'] = None
+    writer: Optional[WriteBehindWriter] = WriteBehindWriter(dynamodb) if mode not in ('none', 'sync') else None
+    ai_handler._clients['writeBehind'] = writer
+    ai_handler.WRITE_BEHIND_FLUSH_SECONDS = 0 if mode == 'background' else 1.0
+    ai_handler.post_invoke_flush = None
+    if extensions is not None:
+        ai_handler.post_invoke_flush = PostInvokeFlush(f'127.0.0.1:{extensions.server_port}',
+                                                       ai_handler.flush_write_behind, 1.0)
+        ai_handler.post_invoke_flush.register()
+    artifacts = dynamodb.Table(FAKE_ENV['ARTIFACTS_TABLE'])
+    ai_handler._clients['artifactStore'] = DynamoDBArtifactStore(artifacts, writer) if mode != 'none' else None
+
+    latencies: List[float] = []
+    after: List[float] = []
+    unflushed = 0
+    last: Dict[tuple, Any] = {}
+    for request in requests:
+        event = build_event('POST', PATHS[request['type']], request['body'])
+        if extensions is not None:
+            extensions.invoke()
+        started = time.perf_counter()
+        response = ai_handler.lambda_handler(event, None)
+        returned = time.perf_counter()
+        if extensions is not None:
+            # Lambda freezes the container once the extension asks for its next event
+            extensions.ready.wait()
+            unflushed += len(writer) > 0
+        after.append((time.perf_counter() - returned) * 1000)
+        latencies.append((returned - started) * 1000)
+        last[(request['body']['campaignId'], request['type'])] = json.loads(response['body'])['data']
+    if extensions is not None:
+        # The reads below are this bench's own calls, not invocations the extension is told about
+        ai_handler.post_invoke_flush = None
+    writes = sum(count for name, count in dynamodb.calls.items() if name in ('put_item', 'batch_write_item'))
+    if writer is not None:
+        writer.flush()
+    result = {
+        'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95), 'afterMs': statistics.fmean(after),
+        'writes': writes / len(requests), 'stored': None, 'readMs': None,
+    }
+    if extensions is not None:
+        result['unflushed'] = unflushed
+    if mode == 'none':
+        return result
+
+    read_ms, matched = [], 0
+    for (campaign_id, artifact_type), data in last.items():
+        event = build_event('GET', f'/campaigns/{campaign_id}/artifacts/{artifact_type}', None)
+        started = time.perf_counter()
+        response = ai_handler.lambda_handler(event, None)
+        read_ms.append((time.perf_counter() - started) * 1000)
+        matched += response['statusCode'] == 200 and json.loads(response['body'])['data']['data'] == data
+    result['stored'] = matched / len(last)
+    result['readMs'] = statistics.fmean(read_ms)
+    if writer is not None:
+        result['writer'] = writer.stats()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--campaigns', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--dynamodb-ms', type=float, default=8.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    requests = []
+    for number in range(args.requests):
+        campaign = rng.randrange(args.campaigns)
+        requests.append({'type': rng.choice(list(PATHS)), 'body': {
+            'campaignId': f'campaign-{campaign:04d}', 'businessId': f'b-{campaign % 20}',
+            'businessName': f'Shop {campaign}', 'industry': 'bakery', 'city': 'Singapore',
+            # Varied per request so no two generations are alike
+            'goal': f'{rng.choice(GOALS)} ({number})', 'budget': rng.choice([200, 300, 500]),
+        }})
+
+    extensions = FakeExtensionsAPI()
+    print(f"{'mode':<14}{'p50 ms':>9}{'p95 ms':>9}{'after ms':>10}{'writes/req':>12}{'stored':>9}{'read ms':>9}")
+    for mode in ('none', 'sync', 'post-invoke', 'before-return', 'background'):
+        result = run(mode, requests, args.dynamodb_ms / 1000, extensions if mode == 'post-invoke' else None)
+        stored = f"{result['stored']:.1%}" if result['stored'] is not None else '-'
+        read = f"{result['readMs']:.3f}" if result['readMs'] is not None else '-'
+        print(f"{mode:<14}{result['p50']:>9.3f}{result['p95']:>9.3f}{result['afterMs']:>10.3f}"
+              f"{result['writes']:>12.3f}{stored:>9}{read:>9}")
+        if 'writer' in result:
+            print(f"{'':<14}writer {json.dumps(result['writer'])}")
+        if 'unflushed' in result:
+            print(f"{'':<14}invocations frozen with writes still queued: {result['unflushed']}")
+
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,13 @@ export async function safeFetch<T>(primaryUrl: string, fallbackPath: string): Pr
   // Try API first if configured
   if (!config.useMocks) {
     try {
+      // Revalidate with the stored ETag on every poll (an unchanged resource comes back as a
+      // body-less 304 that the browser serves from its cache). Only safelisted headers, so
+      // the GET needs no CORS preflight.
       const response = await fetch(primaryUrl, {
         method: 'GET',
-        headers: { 'Content-Type': 'application/json' },
+        cache: 'no-cache',
+        headers: { Accept: 'application/json' },
       });
       
       if (response.ok) {